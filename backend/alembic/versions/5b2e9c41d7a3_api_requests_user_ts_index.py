@@ -0,0 +1,33 @@
+"""api_requests user_id + request_timestamp index
+
+Revision ID: 5b2e9c41d7a3
+Revises: 35786e69cad8
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2e9c41d7a3'
+down_revision: Union[str, Sequence[str], None] = '35786e69cad8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_api_requests_user_ts',
+        'api_requests',
+        ['user_id', sa.text('request_timestamp DESC')],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_api_requests_user_ts', table_name='api_requests')
@@ -0,0 +1,56 @@
+"""usage stats covering indexes
+
+Revision ID: 8d41f0a6c2b9
+Revises: 5b2e9c41d7a3
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41f0a6c2b9'
+down_revision: Union[str, Sequence[str], None] = '5b2e9c41d7a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_api_usage_user_date',
+            'api_usage',
+            ['user_id', sa.text('usage_date DESC')],
+            unique=False,
+            postgresql_concurrently=True,
+            postgresql_include=['request_count', 'input_tokens', 'output_tokens', 'embedding_tokens'],
+        )
+        # Replace the plain (user_id, request_timestamp) index with a covering one
+        op.drop_index('ix_api_requests_user_ts', table_name='api_requests', postgresql_concurrently=True)
+        op.create_index(
+            'ix_api_requests_user_ts',
+            'api_requests',
+            ['user_id', sa.text('request_timestamp DESC')],
+            unique=False,
+            postgresql_concurrently=True,
+            postgresql_include=['total_tokens', 'input_tokens', 'output_tokens', 'embedding_tokens', 'success'],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_api_requests_user_ts', table_name='api_requests', postgresql_concurrently=True)
+        op.create_index(
+            'ix_api_requests_user_ts',
+            'api_requests',
+            ['user_id', sa.text('request_timestamp DESC')],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_api_usage_user_date', table_name='api_usage', postgresql_concurrently=True)
@@ -0,0 +1,52 @@
+"""api_requests BRIN index on request_timestamp
+
+Revision ID: c3f7a92e5d18
+Revises: 8d41f0a6c2b9
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f7a92e5d18'
+down_revision: Union[str, Sequence[str], None] = '8d41f0a6c2b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_api_requests_ts_brin',
+            'api_requests',
+            ['request_timestamp'],
+            unique=False,
+            postgresql_concurrently=True,
+            postgresql_using='brin',
+            postgresql_with={'pages_per_range': 32},
+        )
+        # The BRIN index replaces the B-tree that index=True used to create
+        op.drop_index(
+            'ix_api_requests_request_timestamp',
+            table_name='api_requests',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_api_requests_request_timestamp',
+            'api_requests',
+            ['request_timestamp'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_api_requests_ts_brin', table_name='api_requests', postgresql_concurrently=True)
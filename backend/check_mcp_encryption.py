@@ -70,7 +70,7 @@ def check_mcp_encryption():
             else:
                 # Check if encrypted
                 if is_encrypted(server.api_key):
-                    print(f"  API Key: ✅ ENCRYPTED (starts with 'gAAAAAB')")
+                    print(f"  API Key: ✅ ENCRYPTED")
                     encrypted_count += 1
                     
                     # Try to decrypt to verify it works
@@ -8,6 +8,7 @@ from sqlalchemy import and_, not_
 from fastapi import FastAPI
 from src.core import get_db_context, DB_AVAILABLE, init_db, LLMConfig
 from src.core.models import User, EmbeddingConfig, MCPServer
+from src.core.database import warm_up_pool
 from src.core.env_validation import validate_and_exit_on_error
 # from src.core.auth import get_password_hash # Removed
 from src.mcp import MCP_SERVERS
@@ -159,6 +160,25 @@ async def mcp_lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️  Failed to initialize database: {e}")
 
+    # Pre-warm the DB connection pool used by retrieval so the first agent
+    # request doesn't pay connection setup cost
+    if DB_AVAILABLE:
+        warmed = await asyncio.to_thread(warm_up_pool)
+        if warmed:
+            print(f"✓ Database pool warmed ({warmed} connection(s))")
+
+    # Build the default ReAct agent (LLM client, agent graph, tool schemas) in the
+    # background, so it is usually ready by the first request without the server
+    # waiting on the RAG/LLM imports to start accepting connections
+    from src.services.react_agent import warm_up_react_agent
+
+    def _report_warm_up(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is None and task.result() is not None:
+            print("✓ ReAct agent warmed up")
+
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up_react_agent))
+    warm_up_task.add_done_callback(_report_warm_up)
+
     # Set up exception handler to suppress MCP cleanup errors
     try:
         loop = asyncio.get_running_loop()
@@ -174,3 +194,7 @@ async def mcp_lifespan(app: FastAPI):
                 await stack.enter_async_context(server.session_manager.run())
         yield
 
+    # Write out per-request usage rows still waiting in the buffer
+    from src.services.usage_tracker import UsageTracker
+    UsageTracker.flush_request_buffer()
+
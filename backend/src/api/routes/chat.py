@@ -102,11 +102,11 @@ async def chat(
                 {"user_id": user_id, "ip_address": ip_address, "current_count": current_count, "limit": limit, "is_default_llm": is_default_llm}
             )
             # Build helpful error message
-            error_msg = f"Daily request limit exceeded. You have used {current_count}/{limit} requests today."
+            error_msg = f"Daily request limit exceeded. You have used {current_count}/{limit} requests in the last 24 hours."
             if user_id is None:
                 error_msg += " Please create an account or log in to get 100 requests per day, or add your own API key for unlimited requests."
             else:
-                error_msg += " Please add your own API key for unlimited requests or try again tomorrow."
+                error_msg += " Please add your own API key for unlimited requests or try again later."
             raise HTTPException(status_code=429, detail=error_msg)
 
         app_logger.info(
@@ -251,11 +251,11 @@ async def chat_stream(
                 "Daily rate limit exceeded (streaming)",
                 {"user_id": user_id, "ip_address": ip_address, "current_count": current_count, "limit": limit, "is_default_llm": is_default_llm}
             )
-            error_msg = f"Daily request limit exceeded. You have used {current_count}/{limit} requests today."
+            error_msg = f"Daily request limit exceeded. You have used {current_count}/{limit} requests in the last 24 hours."
             if user_id is None:
                 error_msg += " Please create an account or log in to get 100 requests per day, or add your own API key for unlimited requests."
             else:
-                error_msg += " Please add your own API key for unlimited requests or try again tomorrow."
+                error_msg += " Please add your own API key for unlimited requests or try again later."
             yield f"data: {json.dumps({'chunk': '', 'done': True, 'error': error_msg})}\n\n"
             return
 
@@ -7,6 +7,7 @@ from typing import Optional, List
 from sqlalchemy.orm import Session
 from src.core import get_db, User, CustomRAGTool, DocumentCollection, DB_AVAILABLE
 from src.core.auth import get_current_active_user
+from src.services.tools import invalidate_custom_rag_tools
 
 router = APIRouter()
 
@@ -69,6 +70,7 @@ async def create_custom_rag_tool(
     
     db.add(custom_tool)
     db.commit()
+    invalidate_custom_rag_tools(current_user.id)
     db.refresh(custom_tool)
     
     return custom_tool.to_dict()
@@ -156,6 +158,7 @@ async def update_custom_rag_tool(
     tool.enabled = tool_request.enabled
     
     db.commit()
+    invalidate_custom_rag_tools(current_user.id)
     db.refresh(tool)
     
     return tool.to_dict()
@@ -181,6 +184,7 @@ async def delete_custom_rag_tool(
     
     db.delete(tool)
     db.commit()
+    invalidate_custom_rag_tools(current_user.id)
     
     return {"message": "Tool deleted successfully"}
 
@@ -205,6 +209,7 @@ async def toggle_custom_rag_tool(
     
     tool.enabled = not tool.enabled
     db.commit()
+    invalidate_custom_rag_tools(current_user.id)
     db.refresh(tool)
     
     return tool.to_dict()
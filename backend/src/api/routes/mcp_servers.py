@@ -9,6 +9,7 @@ from src.core.auth import get_current_active_user, get_current_user
 from ..models import MCPServerRequest
 from ..exceptions import UnauthorizedError, ValidationError, APIException
 from src.utils.mcp_connection_test import test_mcp_connection
+from src.utils.validators import normalize_mcp_url
 from src.utils.logger import app_logger
 
 router = APIRouter()
@@ -124,17 +125,7 @@ async def add_mcp_server(
             normalized_url = server.url.strip()
         else:
             # For http/sse, normalize URL
-            normalized_url = server.url.rstrip('/')
-            if connection_type == "sse":
-                if normalized_url.endswith('/mcp'):
-                    normalized_url = normalized_url[:-4] + '/sse'
-                elif not normalized_url.endswith('/sse'):
-                    normalized_url = normalized_url.rstrip('/') + '/sse'
-            else:  # http
-                if normalized_url.endswith('/sse'):
-                    normalized_url = normalized_url[:-4]
-                if not normalized_url.endswith('/mcp'):
-                    normalized_url = normalized_url.rstrip('/') + '/mcp'
+            normalized_url = normalize_mcp_url(server.url, connection_type)
 
         # Check if server already exists for this user
         existing = db.query(MCPServer).filter(
@@ -309,17 +300,7 @@ async def update_mcp_server(
             normalized_url = server.url.strip()
         else:
             # For http/sse, normalize URL
-            normalized_url = server.url.rstrip('/')
-            if connection_type == "sse":
-                if normalized_url.endswith('/mcp'):
-                    normalized_url = normalized_url[:-4] + '/sse'
-                elif not normalized_url.endswith('/sse'):
-                    normalized_url = normalized_url.rstrip('/') + '/sse'
-            else:  # http
-                if normalized_url.endswith('/sse'):
-                    normalized_url = normalized_url[:-4]
-                if not normalized_url.endswith('/mcp'):
-                    normalized_url = normalized_url.rstrip('/') + '/mcp'
+            normalized_url = normalize_mcp_url(server.url, connection_type)
 
         # Test connection before updating (only if URL, connection_type, API key, or headers changed)
         url_changed = mcp_server.url != normalized_url
@@ -397,17 +378,7 @@ async def test_mcp_server_connection(
         if connection_type == "stdio":
             normalized_url = server.url.strip()
         else:
-            normalized_url = server.url.rstrip('/')
-            if connection_type == "sse":
-                if normalized_url.endswith('/mcp'):
-                    normalized_url = normalized_url[:-4] + '/sse'
-                elif not normalized_url.endswith('/sse'):
-                    normalized_url = normalized_url.rstrip('/') + '/sse'
-            else:  # http
-                if normalized_url.endswith('/sse'):
-                    normalized_url = normalized_url[:-4]
-                if not normalized_url.endswith('/mcp'):
-                    normalized_url = normalized_url.rstrip('/') + '/mcp'
+            normalized_url = normalize_mcp_url(server.url, connection_type)
 
         # Test connection
         connection_ok, connection_message = await test_mcp_connection(
@@ -415,7 +386,8 @@ async def test_mcp_server_connection(
             connection_type=connection_type,
             api_key=server.api_key if server.api_key else None,
             headers=server.headers if server.headers else None,
-            timeout=5.0
+            timeout=5.0,
+            force_refresh=True  # Explicit test: always probe the server now
         )
 
         return {
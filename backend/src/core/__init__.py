@@ -1,7 +1,7 @@
 """
 Core domain models and database configuration
 """
-from .database import Base, get_db, get_db_context, init_db, DB_AVAILABLE
+from .database import Base, SessionLocal, get_db, get_db_context, init_db, DB_AVAILABLE
 from .models import User, LLMConfig, MCPServer, Conversation, Message, DocumentCollection, CustomRAGTool, AppointmentRequest, UserGlobalConfigPreference, UserAppeal
 from .config import Config
 from .constants import (
@@ -27,6 +27,7 @@ from .auth import (
 
 __all__ = [
     "Base",
+    "SessionLocal",
     "get_db",
     "get_db_context",
     "init_db",
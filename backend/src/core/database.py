@@ -50,8 +50,9 @@ if DB_AVAILABLE and PSYCOPG2_AVAILABLE:
         engine = create_engine(
             DATABASE_URL,
             pool_pre_ping=True,  # Verify connections before using
-            pool_size=10,
-            max_overflow=20,
+            pool_size=20,
+            max_overflow=40,
+            pool_recycle=1800,  # Replace connections before server/proxy idle timeouts drop them
             echo=False  # Set to True for SQL query logging
         )
         
@@ -111,6 +112,32 @@ def get_db_context():
         db.close()
 
 
+def warm_up_pool(connections: Optional[int] = None) -> int:
+    """
+    Open connections up front so the first requests don't pay connection setup.
+    Connections are returned to the pool (not closed) and reused afterwards.
+    Returns the number of connections that were established.
+    """
+    if not DB_AVAILABLE or not engine:
+        return 0
+    
+    if connections is None:
+        connections = engine.pool.size() if hasattr(engine.pool, "size") else 1
+    
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        print(f"⚠️  Database pool warm-up stopped early: {e}")
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+
 def init_db():
     """
     Initialize database tables.
@@ -2,7 +2,7 @@
 Database models for LLM config, MCP servers, and Users
 """
 from typing import Optional
-from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -530,6 +530,11 @@ if Base is not None:
             UniqueConstraint('user_id', 'usage_date', name='uq_api_usage_user_date'),
             UniqueConstraint('ip_address', 'usage_date', name='uq_api_usage_ip_date'),
             UniqueConstraint('guest_email', 'usage_date', name='uq_api_usage_guest_email_date'),
+            # Covering index for the per-user usage stats / daily limit lookups
+            Index(
+                'ix_api_usage_user_date', user_id, usage_date.desc(),
+                postgresql_include=['request_count', 'input_tokens', 'output_tokens', 'embedding_tokens'],
+            ),
         )
 
         def to_dict(self) -> dict:
@@ -559,7 +564,7 @@ if Base is not None:
         id = Column(Integer, primary_key=True, index=True)
         user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True)  # Nullable for anonymous users
         guest_email = Column(String(255), nullable=True, index=True)  # Email for guest users
-        request_timestamp = Column(DateTime(timezone=True), nullable=False, index=True)  # Exact timestamp of the request
+        request_timestamp = Column(DateTime(timezone=True), nullable=False)  # Exact timestamp of the request
         llm_provider = Column(String(50), nullable=True)  # Which LLM provider was used
         llm_model = Column(String(100), nullable=True)  # Which model was used
         input_tokens = Column(Integer, default=0, nullable=False)  # Input tokens for this request
@@ -574,6 +579,21 @@ if Base is not None:
         # Relationship
         user = relationship("User", backref="api_requests")
 
+        # Per-user time-window scans (usage stats grouped by time bucket)
+        __table_args__ = (
+            Index(
+                'ix_api_requests_user_ts', user_id, request_timestamp.desc(),
+                postgresql_include=['total_tokens', 'input_tokens', 'output_tokens', 'embedding_tokens', 'success'],
+            ),
+            # System-wide time-range scans; rows arrive in timestamp order, so a BRIN
+            # index stays tiny where a B-tree on this write-heavy column would bloat
+            Index(
+                'ix_api_requests_ts_brin', request_timestamp,
+                postgresql_using='brin',
+                postgresql_with={'pages_per_range': 32},
+            ),
+        )
+
         def to_dict(self) -> dict:
             """Convert model to dictionary"""
             return {
@@ -1,30 +1,42 @@
 """
 Business logic services layer
+
+Exports are resolved on first access (PEP 562), so importing one service
+module doesn't pull in the others (the RAG stack loads FAISS and
+sentence-transformers, the LLM factory every provider client).
 """
-from .history import history_manager, ConversationHistoryManager
-from .db_history import db_history_manager, DatabaseConversationHistoryManager
-from .rag import rag_system
-from .llm_factory import create_llm_from_config
-from .mcp_client import MCPClientManager
-from .chat_service import ChatService
-from .advanced_rag import advanced_rag_system
-from .react_agent import create_react_agent, ReActAgent
-from .human_in_loop import human_in_loop
-from .document_processor import document_processor
+from importlib import import_module
+from typing import Any
+
+# Exported name -> submodule that defines it
+_EXPORTS = {
+    "history_manager": ".history",
+    "ConversationHistoryManager": ".history",
+    "db_history_manager": ".db_history",
+    "DatabaseConversationHistoryManager": ".db_history",
+    "rag_system": ".rag",
+    "create_llm_from_config": ".llm_factory",
+    "MCPClientManager": ".mcp_client",
+    "ChatService": ".chat_service",
+    "advanced_rag_system": ".advanced_rag",
+    "create_react_agent": ".react_agent",
+    "ReActAgent": ".react_agent",
+    "human_in_loop": ".human_in_loop",
+    "document_processor": ".document_processor",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module_name, __name__), name)
+    # Cache on the package so later lookups skip __getattr__
+    globals()[name] = value
+    return value
 
-__all__ = [
-    "history_manager",
-    "ConversationHistoryManager",
-    "db_history_manager",
-    "DatabaseConversationHistoryManager",
-    "rag_system",
-    "create_llm_from_config",
-    "MCPClientManager",
-    "ChatService",
-    "advanced_rag_system",
-    "create_react_agent",
-    "ReActAgent",
-    "human_in_loop",
-    "document_processor",
-]
 
+def __dir__():
+    return sorted([*globals(), *_EXPORTS])
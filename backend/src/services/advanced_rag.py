@@ -3,15 +3,16 @@ Advanced RAG system with dynamic retrieval, re-ranking, hybrid search, and persi
 """
 import os
 import json
+import asyncio
 import base64
 import pickle
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple, Any
 import numpy as np
 
 try:
     from langchain_community.vectorstores import FAISS
-    from langchain_openai import OpenAIEmbeddings
     from langchain_core.documents import Document as LangchainDocument
     FAISS_AVAILABLE = True
 except ImportError:
@@ -35,6 +36,45 @@ except ImportError:
 from src.core import Config, DB_AVAILABLE
 from src.core.database import get_db_context
 from src.core.models import Document, DocumentChunk, DocumentCollection
+from src.services.llm_factory import get_embeddings
+from src.services.semantic_cache import SemanticCache
+from src.utils.cache import Cache
+
+
+# Formatted retrieval results of the RAG tools, keyed by retrieval_cache_key().
+# Cleared whenever a user's document set changes.
+RETRIEVAL_CACHE_TTL_SECONDS = 300
+retrieval_cache = Cache(default_ttl_seconds=RETRIEVAL_CACHE_TTL_SECONDS)
+# Same results matched by paraphrased queries, scoped per tool/user/collection.
+# Off by default: two different questions can embed close enough to share results.
+RETRIEVAL_SEMANTIC_MATCH = os.getenv("RETRIEVAL_SEMANTIC_MATCH", "false").lower() == "true"
+RETRIEVAL_SEMANTIC_THRESHOLD = float(os.getenv("RETRIEVAL_SEMANTIC_THRESHOLD", "0.98"))
+retrieval_semantic_cache = SemanticCache(
+    threshold=RETRIEVAL_SEMANTIC_THRESHOLD,
+    ttl_seconds=RETRIEVAL_CACHE_TTL_SECONDS,
+    match_similar=RETRIEVAL_SEMANTIC_MATCH
+)
+
+
+RERANKER_MODEL_NAME = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+
+
+@lru_cache(maxsize=1)
+def get_reranker(model_name: str = RERANKER_MODEL_NAME) -> Optional[Any]:
+    """Load the cross-encoder once per process; None if it can't be loaded"""
+    try:
+        # Use a lightweight cross-encoder for re-ranking
+        reranker = CrossEncoder(model_name)
+        print("✓ Re-ranker initialized")
+        return reranker
+    except Exception as e:
+        print(f"⚠️  Failed to initialize re-ranker: {e}")
+        return None
+
+
+def retrieval_cache_key(namespace: str, user_id: int, collection_id: Optional[int], query: str) -> tuple:
+    """Cache key for a tool's formatted retrieval output (query is case/whitespace-normalized)"""
+    return (namespace, user_id, collection_id, " ".join(query.lower().split()))
 
 
 class AdvancedRAGSystem:
@@ -60,17 +100,10 @@ class AdvancedRAGSystem:
         if not openai_api_key:
             raise ValueError("OPENAI_API_KEY is required for embeddings")
 
-        self.embeddings = OpenAIEmbeddings(api_key=openai_api_key) if FAISS_AVAILABLE else None
+        self.embeddings = get_embeddings(openai_api_key) if FAISS_AVAILABLE else None
 
-        # Initialize re-ranker (optional)
-        self.reranker = None
-        if RERANKER_AVAILABLE:
-            try:
-                # Use a lightweight cross-encoder for re-ranking
-                self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-                print("✓ Re-ranker initialized")
-            except Exception as e:
-                print(f"⚠️  Failed to initialize re-ranker: {e}")
+        # Initialize re-ranker (optional, shared by every instance)
+        self.reranker = get_reranker() if RERANKER_AVAILABLE else None
 
         # Per-user vector stores (loaded on demand)
         self.vectorstores: Dict[int, Any] = {}
@@ -205,6 +238,8 @@ class AdvancedRAGSystem:
 
             # Rebuild BM25 index
             self._build_bm25_index(user_id)
+            retrieval_cache.clear()
+            retrieval_semantic_cache.clear()
 
             print(f"✓ Added {len(documents)} chunks to vectorstore")
             return True
@@ -235,7 +270,8 @@ class AdvancedRAGSystem:
         k: Optional[int] = None,
         use_reranking: bool = True,
         use_hybrid: bool = True,
-        collection_id: Optional[int] = None
+        collection_id: Optional[int] = None,
+        query_vector: Optional[List[float]] = None
     ) -> List[Dict[str, Any]]:
         """
         Retrieve relevant documents using advanced techniques
@@ -247,6 +283,7 @@ class AdvancedRAGSystem:
             use_reranking: Whether to use re-ranking
             use_hybrid: Whether to use hybrid search (vector + BM25)
             collection_id: Optional collection ID to filter
+            query_vector: Query embedding if the caller already has one (skips re-embedding)
 
         Returns:
             List of relevant chunks with scores
@@ -265,18 +302,132 @@ class AdvancedRAGSystem:
                 if collection_id:
                     search_kwargs["filter"] = {"collection_id": collection_id}
 
-                vector_docs = vectorstore.similarity_search_with_score(query, **search_kwargs)
+                if query_vector is not None:
+                    vector_docs = vectorstore.similarity_search_with_score_by_vector(list(query_vector), **search_kwargs)
+                else:
+                    vector_docs = vectorstore.similarity_search_with_score(query, **search_kwargs)
+                results = self._vector_results(vector_docs)
+            except Exception as e:
+                print(f"⚠️  Vector search failed: {e}")
+
+        return self._merge_and_rerank(query, user_id, k, results, use_reranking, use_hybrid, collection_id)
+
+    async def aretrieve(
+        self,
+        query: str,
+        user_id: int,
+        k: Optional[int] = None,
+        use_reranking: bool = True,
+        use_hybrid: bool = True,
+        collection_id: Optional[int] = None,
+        query_vector: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Async variant of retrieve().
+
+        The query embedding goes through the embeddings client's async HTTP
+        pool; the BM25 lookup (pooled DB session) and cross-encoder re-ranking
+        are CPU/blocking work and run in a worker thread so the event loop is
+        never blocked.
+        """
+        if k is None:
+            k = self._calculate_dynamic_k(query)
+
+        results = []
+
+        vectorstore = self.vectorstores.get(user_id)
+        if vectorstore is None:
+            vectorstore = await asyncio.to_thread(self._load_vectorstore, user_id)
+        if vectorstore:
+            try:
+                search_kwargs = {"k": k * 2 if use_hybrid or use_reranking else k}
+                if collection_id:
+                    search_kwargs["filter"] = {"collection_id": collection_id}
 
-                for doc, score in vector_docs:
-                    results.append({
-                        "content": doc.page_content,
-                        "metadata": doc.metadata,
-                        "score": float(score),
-                        "source": "vector"
-                    })
+                if query_vector is not None:
+                    vector_docs = await vectorstore.asimilarity_search_with_score_by_vector(
+                        list(query_vector), **search_kwargs
+                    )
+                else:
+                    vector_docs = await vectorstore.asimilarity_search_with_score(query, **search_kwargs)
+                results = self._vector_results(vector_docs)
             except Exception as e:
                 print(f"⚠️  Vector search failed: {e}")
 
+        return await asyncio.to_thread(
+            self._merge_and_rerank, query, user_id, k, results, use_reranking, use_hybrid, collection_id
+        )
+
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        user_id: int,
+        k: Optional[int] = None,
+        use_reranking: bool = True,
+        use_hybrid: bool = True,
+        collection_id: Optional[int] = None,
+        query_vectors: Optional[List[Optional[List[float]]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve for several queries against the same user/collection at once.
+
+        All queries are embedded in a single embeddings request and searched by
+        vector, instead of one embedding round trip per query. Queries whose
+        embedding is already given in query_vectors are not embedded again.
+
+        Returns:
+            One result list per query, in the same order as queries
+        """
+        ks = [k if k is not None else self._calculate_dynamic_k(query) for query in queries]
+        vector_results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+
+        vectorstore = self._load_vectorstore(user_id)
+        if vectorstore and queries:
+            try:
+                query_vectors = list(query_vectors) if query_vectors else [None] * len(queries)
+                missing = [i for i, vector in enumerate(query_vectors) if vector is None]
+                if missing:
+                    embedded = self.embeddings.embed_documents([queries[i] for i in missing])
+                    for i, vector in zip(missing, embedded):
+                        query_vectors[i] = vector
+                for i, (query_vector, query_k) in enumerate(zip(query_vectors, ks)):
+                    search_kwargs = {"k": query_k * 2 if use_hybrid or use_reranking else query_k}
+                    if collection_id:
+                        search_kwargs["filter"] = {"collection_id": collection_id}
+                    vector_docs = vectorstore.similarity_search_with_score_by_vector(list(query_vector), **search_kwargs)
+                    vector_results[i] = self._vector_results(vector_docs)
+            except Exception as e:
+                print(f"⚠️  Batched vector search failed: {e}")
+
+        return [
+            self._merge_and_rerank(query, user_id, query_k, results, use_reranking, use_hybrid, collection_id)
+            for query, query_k, results in zip(queries, ks, vector_results)
+        ]
+
+    @staticmethod
+    def _vector_results(vector_docs) -> List[Dict[str, Any]]:
+        """Convert (document, score) pairs from the vector store into result dicts"""
+        return [
+            {
+                "content": doc.page_content,
+                "metadata": doc.metadata,
+                "score": float(score),
+                "source": "vector"
+            }
+            for doc, score in vector_docs
+        ]
+
+    def _merge_and_rerank(
+        self,
+        query: str,
+        user_id: int,
+        k: int,
+        results: List[Dict[str, Any]],
+        use_reranking: bool,
+        use_hybrid: bool,
+        collection_id: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        """Merge vector results with BM25 hits, re-rank, and return the top k"""
         # Hybrid search: combine with BM25
         if use_hybrid and BM25_AVAILABLE:
             bm25_index = self._build_bm25_index(user_id)
@@ -430,6 +581,8 @@ class AdvancedRAGSystem:
                         del self.bm25_indexes[user_id]
                     if user_id in self.chunk_texts:
                         del self.chunk_texts[user_id]
+                    retrieval_cache.clear()
+                    retrieval_semantic_cache.clear()
                     return True
 
                 # Rebuild vectorstore
@@ -464,6 +617,8 @@ class AdvancedRAGSystem:
 
                 # Rebuild BM25 index
                 self._build_bm25_index(user_id)
+                retrieval_cache.clear()
+                retrieval_semantic_cache.clear()
 
                 return True
         except Exception as e:
@@ -488,6 +643,12 @@ def get_advanced_rag_system():
             class DummyAdvancedRAGSystem:
                 def retrieve(self, *args, **kwargs):
                     raise ValueError("OPENAI_API_KEY is required for embeddings. Please set OPENAI_API_KEY environment variable.")
+
+                async def aretrieve(self, *args, **kwargs):
+                    return self.retrieve(*args, **kwargs)
+
+                def retrieve_batch(self, *args, **kwargs):
+                    return self.retrieve(*args, **kwargs)
             _advanced_rag_system_instance = DummyAdvancedRAGSystem()
     return _advanced_rag_system_instance
 
@@ -501,5 +662,11 @@ except ValueError as e:
     class DummyAdvancedRAGSystem:
         def retrieve(self, *args, **kwargs):
             raise ValueError("OPENAI_API_KEY is required for embeddings. Please set OPENAI_API_KEY environment variable.")
+
+        async def aretrieve(self, *args, **kwargs):
+            return self.retrieve(*args, **kwargs)
+
+        def retrieve_batch(self, *args, **kwargs):
+            return self.retrieve(*args, **kwargs)
     advanced_rag_system = DummyAdvancedRAGSystem()
 
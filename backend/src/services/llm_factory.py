@@ -1,13 +1,24 @@
 """
 LLM Factory - Creates LLM instances based on configuration
 """
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_core.callbacks import AsyncCallbackManager, CallbackManager
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage
-from typing import Optional, List, Any, AsyncIterator
-from pydantic import Field
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, AIMessageChunk, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, LLMResult
+from langchain_core.runnables import Runnable, ensure_config
+from typing import Optional, List, Any, AsyncIterator, Dict
+import asyncio
+import copy
+from functools import lru_cache
+import hashlib
+import json
 import os
 
+import httpx
+
+from src.utils.cache import Cache
+
 # Try to import ChatOllama from langchain_ollama (preferred) or fallback to langchain_community
 try:
     from langchain_ollama import ChatOllama
@@ -42,45 +53,218 @@ except ImportError:
             ChatGoogleGenerativeAI = None
 
 
-class MessageNormalizingLLM(BaseChatModel):
+def _build_human_message(message: HumanMessage, content: str) -> HumanMessage:
+    return HumanMessage(content=content)
+
+
+def _build_ai_message(message: AIMessage, content: str) -> AIMessage:
+    kwargs = {'content': content}
+    # Preserve tool_calls and response_metadata only when set, so the model defaults apply otherwise
+    if message.tool_calls:
+        kwargs['tool_calls'] = message.tool_calls
+    if message.response_metadata:
+        kwargs['response_metadata'] = message.response_metadata
+    return AIMessage(**kwargs)
+
+
+def _build_system_message(message: SystemMessage, content: str) -> SystemMessage:
+    return SystemMessage(content=content)
+
+
+def _build_tool_message(message: ToolMessage, content: str) -> ToolMessage:
+    # Preserve tool_call_id for ToolMessage (required field, always present)
+    return ToolMessage(content=content, tool_call_id=message.tool_call_id)
+
+
+# Type -> factory table for rebuilding messages with normalized content.
+# Subclasses (e.g. AIMessageChunk) are resolved through their MRO on first sight and memoized;
+# types with no known base map to None and use the generic path.
+_MESSAGE_FACTORIES = {
+    HumanMessage: _build_human_message,
+    AIMessage: _build_ai_message,
+    SystemMessage: _build_system_message,
+    ToolMessage: _build_tool_message,
+}
+
+
+def _get_message_factory(msg_class: type):
+    """Look up the message factory for a class, caching subclass resolution"""
+    try:
+        return _MESSAGE_FACTORIES[msg_class]
+    except KeyError:
+        factory = None
+        for base in msg_class.__mro__[1:]:
+            factory = _MESSAGE_FACTORIES.get(base)
+            if factory is not None:
+                break
+        _MESSAGE_FACTORIES[msg_class] = factory
+        return factory
+
+
+# Common Gemini model names for validation hints
+GEMINI_COMMON_MODELS = (
+    "gemini-1.5-pro", "gemini-1.5-flash", "gemini-pro",
+    "gemini-2.0-flash-exp", "gemini-2.5-flash", "gemini-2.5-flash-lite",
+    "gemini-2.5-pro"
+)
+GEMINI_COMMON_MODELS_STR = ", ".join(GEMINI_COMMON_MODELS)
+
+
+# Input kinds accepted by MessageNormalizingLLM entry points
+_INPUT_LIST = "list"
+_INPUT_DICT = "dict"
+_INPUT_OBJECT = "object"
+_INPUT_OTHER = "other"
+
+# Input type -> kind, resolved on first sight of each type
+_INPUT_KINDS = {list: _INPUT_LIST, dict: _INPUT_DICT, str: _INPUT_OTHER}
+
+
+def _input_kind(input: Any) -> str:
+    """Classify an LLM input by its type, caching the result per type"""
+    input_type = type(input)
+    kind = _INPUT_KINDS.get(input_type)
+    if kind is None:
+        if isinstance(input, list):
+            kind = _INPUT_LIST
+        elif isinstance(input, dict):
+            kind = _INPUT_DICT
+        elif hasattr(input, 'messages'):
+            kind = _INPUT_OBJECT
+        else:
+            kind = _INPUT_OTHER
+        _INPUT_KINDS[input_type] = kind
+    return kind
+
+
+# Shared HTTP clients for OpenAI-compatible providers, keyed by base URL.
+# Auth is sent per request, so one pool per endpoint is reused across API keys and LLM instances.
+OPENAI_DEFAULT_BASE_URL = "https://api.openai.com/v1"
+_HTTP_CLIENT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+_http_clients: dict = {}
+
+
+class _LoopLocalAsyncClient(httpx.AsyncClient):
     """
-    Wrapper LLM that normalizes message contents to strings before sending to the underlying LLM.
-    This ensures that list/dict content is converted to strings to prevent API errors.
+    AsyncClient that sends each request through a pool owned by the running
+    event loop. Pooled connections belong to the loop that opened them, so a
+    single pool shared across asyncio.run calls fails once that loop closes.
+    Pools of closed loops are dropped whenever a new loop gets one.
     """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._client_kwargs = kwargs
+        self._loop_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        loop = asyncio.get_running_loop()
+        client = self._loop_clients.get(loop)
+        if client is None:
+            # Connections of a closed loop can't be reused (or closed) anymore
+            self._loop_clients = {
+                other: other_client for other, other_client in self._loop_clients.items()
+                if not other.is_closed()
+            }
+            client = self._loop_clients[loop] = httpx.AsyncClient(**self._client_kwargs)
+        return await client.send(request, **kwargs)
+
+
+def _get_http_clients(base_url: Optional[str]) -> tuple:
+    """Return the shared (sync, async) httpx clients for an API base URL"""
+    key = (base_url or OPENAI_DEFAULT_BASE_URL).rstrip("/")
+    clients = _http_clients.get(key)
+    if clients is None:
+        clients = (
+            httpx.Client(limits=_HTTP_CLIENT_LIMITS),
+            _LoopLocalAsyncClient(limits=_HTTP_CLIENT_LIMITS),
+        )
+        _http_clients[key] = clients
+    return clients
+
+
+def _http_client_kwargs(base_url: Optional[str]) -> dict:
+    """ChatOpenAI kwargs that attach the shared HTTP clients for base_url"""
+    http_client, http_async_client = _get_http_clients(base_url)
+    return {"http_client": http_client, "http_async_client": http_async_client}
+
+
+@lru_cache(maxsize=8)
+def get_embeddings(api_key: str) -> OpenAIEmbeddings:
+    """
+    Process-wide OpenAIEmbeddings instance for an API key.
     
-    # Declare llm as a class variable with Field for Pydantic
-    llm: BaseChatModel = Field(..., description="The underlying LLM to wrap")
-    
-    # Pydantic v2 config
-    model_config = {"arbitrary_types_allowed": True}
+    Shared by the RAG systems so they use one embeddings client (and the shared
+    HTTP connection pool) instead of each building their own.
+    """
+    return OpenAIEmbeddings(api_key=api_key, **_http_client_kwargs(OPENAI_DEFAULT_BASE_URL))
+
+
+# Shared response cache for configs that opt in with "cache_responses"; stored LLM
+# configs have no such field, so LLM_RESPONSE_CACHE=true turns it on for all of them
+RESPONSE_CACHE_ENABLED = os.getenv("LLM_RESPONSE_CACHE", "false").lower() == "true"
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("LLM_RESPONSE_CACHE_TTL", "300"))
+_response_cache = Cache(default_ttl_seconds=RESPONSE_CACHE_TTL_SECONDS)
+
+
+def response_cache_enabled(config: dict) -> bool:
+    """Whether an LLM config opts in to response caching (defaults to LLM_RESPONSE_CACHE)"""
+    return bool(config.get("cache_responses", RESPONSE_CACHE_ENABLED))
+
+
+def _get_response_cache(config: dict) -> Optional[Cache]:
+    """Return the shared response cache if the config enables it"""
+    return _response_cache if response_cache_enabled(config) else None
+
+
+def _response_cache_namespace(config: dict) -> str:
+    """Digest of the provider, endpoint and credentials, so responses never cross providers or accounts"""
+    payload = [
+        config.get("type", "deepseek").lower(),
+        config.get("api_base") or config.get("base_url"),
+        config.get("api_key"),
+    ]
+    return hashlib.sha256(json.dumps(payload, default=str).encode("utf-8")).hexdigest()
+
+
+class MessageNormalizingLLM(Runnable):
+    """
+    Wrapper LLM that normalizes message contents to strings before sending to the underlying LLM.
+    This ensures that list/dict content is converted to strings to prevent API errors.
     
-    def __init__(self, llm: BaseChatModel, **kwargs):
-        # Use model_construct as a class method to create instance without validation
-        # This is the proper way to create Pydantic v2 models with complex fields
-        try:
-            # Try using model_construct class method (Pydantic v2)
-            instance = MessageNormalizingLLM.model_construct(llm=llm, **kwargs)
-            # Copy all attributes from the constructed instance to self
-            for key, value in instance.__dict__.items():
-                object.__setattr__(self, key, value)
-        except (AttributeError, TypeError):
-            # Fallback: set llm directly and try to initialize parent
-            object.__setattr__(self, 'llm', llm)
-            try:
-                super().__init__(**kwargs)
-            except Exception:
-                # If parent init fails, the object is still usable with llm set
-                pass
+    This is a plain Runnable (not a pydantic BaseChatModel) so that construction - which
+    happens on every bind_tools call - skips model validation. Anything not overridden here
+    is delegated to the underlying LLM via __getattr__.
+    """
     
-    @property
-    def _llm_type(self) -> str:
-        return f"normalized_{self.llm._llm_type}"
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        root_llm: Optional[BaseChatModel] = None,
+        response_cache: Optional[Cache] = None,
+        cache_namespace: Optional[str] = None,
+    ):
+        # The underlying LLM to wrap
+        self.llm = llm
+        # Original LLM before bind_tools (None when llm is already the original)
+        self.root_llm = root_llm
+        # Optional exact-match response cache (see RESPONSE_CACHE_TTL_SECONDS)
+        self.response_cache = response_cache
+        # Provider/endpoint/credentials digest that prefixes every cache key
+        self.cache_namespace = cache_namespace
     
     def _normalize_message_content(self, content: Any) -> str:
         """Normalize message content to string"""
         if isinstance(content, str):
             return content
         elif isinstance(content, list):
+            # Fast path: a single text part (the common multimodal shape)
+            if len(content) == 1:
+                item = content[0]
+                if isinstance(item, str):
+                    return item
+                if isinstance(item, dict) and "text" in item:
+                    return item["text"]
             result = ""
             for item in content:
                 if isinstance(item, dict):
@@ -113,46 +297,31 @@ class MessageNormalizingLLM(BaseChatModel):
         
         # Create a new message of the same type with normalized content
         try:
-            if isinstance(message, HumanMessage):
-                return HumanMessage(content=normalized_content)
-            elif isinstance(message, AIMessage):
-                new_msg = AIMessage(content=normalized_content)
-                # Preserve tool_calls if they exist
-                if hasattr(message, 'tool_calls') and message.tool_calls:
-                    new_msg.tool_calls = message.tool_calls
-                # Preserve response_metadata if it exists
-                if hasattr(message, 'response_metadata'):
-                    new_msg.response_metadata = message.response_metadata
-                return new_msg
-            elif isinstance(message, SystemMessage):
-                return SystemMessage(content=normalized_content)
-            elif isinstance(message, ToolMessage):
-                # Preserve tool_call_id for ToolMessage
-                tool_call_id = getattr(message, 'tool_call_id', None)
-                new_msg = ToolMessage(content=normalized_content, tool_call_id=tool_call_id)
-                return new_msg
-            else:
-                # For other message types, try to create a new instance
-                msg_class = type(message)
-                # Try to preserve common attributes
-                kwargs = {'content': normalized_content}
-                if hasattr(message, 'tool_call_id'):
-                    kwargs['tool_call_id'] = message.tool_call_id
-                if hasattr(message, 'name'):
-                    kwargs['name'] = message.name
-                if hasattr(message, 'id'):
-                    kwargs['id'] = message.id
-                
+            factory = _get_message_factory(type(message))
+            if factory is not None:
+                return factory(message, normalized_content)
+
+            # For other message types, try to create a new instance
+            msg_class = type(message)
+            # Try to preserve common attributes
+            kwargs = {'content': normalized_content}
+            if hasattr(message, 'tool_call_id'):
+                kwargs['tool_call_id'] = message.tool_call_id
+            if hasattr(message, 'name'):
+                kwargs['name'] = message.name
+            if hasattr(message, 'id'):
+                kwargs['id'] = message.id
+            
+            try:
+                return msg_class(**kwargs)
+            except Exception:
+                # Fallback: try with just content
                 try:
-                    return msg_class(**kwargs)
-                except:
-                    # Fallback: try with just content
-                    try:
-                        return msg_class(content=normalized_content)
-                    except:
-                        # Last resort: modify in place
-                        message.content = normalized_content
-                        return message
+                    return msg_class(content=normalized_content)
+                except Exception:
+                    # Last resort: modify in place
+                    message.content = normalized_content
+                    return message
         except Exception as e:
             # If normalization fails, log and return original message
             import logging
@@ -160,7 +329,7 @@ class MessageNormalizingLLM(BaseChatModel):
             # Try to at least convert content to string
             try:
                 message.content = str(message.content) if not isinstance(message.content, str) else message.content
-            except:
+            except Exception:
                 pass
             return message
     
@@ -177,172 +346,370 @@ class MessageNormalizingLLM(BaseChatModel):
                 try:
                     if hasattr(msg, 'content') and not isinstance(msg.content, str):
                         msg.content = str(msg.content)
-                except:
+                except Exception:
                     pass
                 normalized.append(msg)
         return normalized
     
-    def invoke(self, input: Any, config: Optional[Any] = None, **kwargs: Any) -> Any:
-        """Invoke the LLM with normalized messages"""
-        if isinstance(input, list):
-            # Normalize messages before invoking
-            normalized_input = self._normalize_messages(input)
-            return self.llm.invoke(normalized_input, config=config, **kwargs)
-        elif isinstance(input, dict) and 'messages' in input:
+    @staticmethod
+    def _copy_with_messages(input: Any, messages: List[BaseMessage]) -> Any:
+        """Shallow-copy an input object, replacing only its messages"""
+        if hasattr(input, 'model_copy'):
+            return input.model_copy(update={'messages': messages})
+        normalized_input = copy.copy(input)
+        normalized_input.messages = messages
+        return normalized_input
+    
+    def _response_cache_key(self, messages: List[BaseMessage], kwargs: dict) -> str:
+        """Build a cache key from the model settings, call kwargs and normalized messages"""
+        payload = [
+            self.cache_namespace,
+            getattr(self.llm, 'model_name', None) or getattr(self.llm, 'model', None),
+            getattr(self.llm, 'temperature', None),
+            getattr(self.llm, 'kwargs', None),  # Tools/options bound via bind_tools
+            kwargs,
+            [
+                (m.type, m.content, getattr(m, 'tool_calls', None), getattr(m, 'tool_call_id', None))
+                for m in messages
+            ],
+        ]
+        raw = json.dumps(payload, default=str, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def _prepare(self, input: Any) -> tuple:
+        """
+        Normalize any messages carried by an input.
+        
+        Returns:
+            (kind, normalized_input) where kind is one of the _INPUT_* constants;
+            inputs without messages are returned unchanged with kind _INPUT_OTHER
+        """
+        kind = _input_kind(input)
+        if kind == _INPUT_LIST:
+            return kind, self._normalize_messages(input)
+        if kind == _INPUT_DICT and 'messages' in input:
             # Input is a dict with messages key
-            normalized_messages = self._normalize_messages(input['messages'])
-            normalized_input = {**input, 'messages': normalized_messages}
-            return self.llm.invoke(normalized_input, config=config, **kwargs)
-        elif hasattr(input, 'messages') and isinstance(input.messages, list):
+            return kind, {**input, 'messages': self._normalize_messages(input['messages'])}
+        if kind == _INPUT_OBJECT and isinstance(input.messages, list):
             # Input is an object with messages attribute - create a copy
-            import copy
-            normalized_input = copy.deepcopy(input) if hasattr(copy, 'deepcopy') else input
-            normalized_messages = self._normalize_messages(input.messages)
-            normalized_input.messages = normalized_messages
+            return kind, self._copy_with_messages(input, self._normalize_messages(input.messages))
+        return _INPUT_OTHER, input
+    
+    def _cached_run_args(self, messages: List[BaseMessage], config: Optional[Any]) -> tuple:
+        """Callback config and on_chat_model_start arguments for replaying a cached response"""
+        config = ensure_config(config)
+        model = self.root_llm or self.llm
+        configure_args = (
+            config.get("callbacks"),
+            getattr(model, "callbacks", None),
+            getattr(model, "verbose", False),
+            config.get("tags"),
+            getattr(model, "tags", None),
+            config.get("metadata"),
+            getattr(model, "metadata", None),
+        )
+        serialized = getattr(model, "_serialized", None) or {"name": type(model).__name__}
+        return configure_args, (serialized, [messages]), {"name": config.get("run_name"), "batch_size": 1}
+    
+    @staticmethod
+    def _cached_result(cached: BaseMessage) -> tuple:
+        """(stream chunk, end result) reporting a cached message as one model run"""
+        chunk = ChatGenerationChunk(message=AIMessageChunk(
+            content=cached.content,
+            tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call.get("id"), "index": index}
+                for index, call in enumerate(getattr(cached, "tool_calls", None) or [])
+            ],
+        ))
+        return chunk, LLMResult(generations=[[ChatGeneration(message=cached)]])
+    
+    def _replay_cached(self, messages: List[BaseMessage], cached: BaseMessage, config: Optional[Any]) -> BaseMessage:
+        """
+        Report a cache hit to the run's callbacks as a model run (start, one token, end),
+        so astream_events consumers see on_chat_model_stream/on_chat_model_end as usual
+        """
+        configure_args, start_args, start_kwargs = self._cached_run_args(messages, config)
+        (run_manager,) = CallbackManager.configure(*configure_args).on_chat_model_start(*start_args, **start_kwargs)
+        chunk, result = self._cached_result(cached)
+        run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+        run_manager.on_llm_end(result)
+        return cached
+    
+    async def _areplay_cached(self, messages: List[BaseMessage], cached: BaseMessage, config: Optional[Any]) -> BaseMessage:
+        """Async variant of _replay_cached()"""
+        configure_args, start_args, start_kwargs = self._cached_run_args(messages, config)
+        (run_manager,) = await AsyncCallbackManager.configure(*configure_args).on_chat_model_start(
+            *start_args, **start_kwargs
+        )
+        chunk, result = self._cached_result(cached)
+        await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+        await run_manager.on_llm_end(result)
+        return cached
+    
+    def invoke(self, input: Any, config: Optional[Any] = None, **kwargs: Any) -> Any:
+        """Invoke the LLM with normalized messages"""
+        kind, normalized_input = self._prepare(input)
+        if kind != _INPUT_LIST or self.response_cache is None:
             return self.llm.invoke(normalized_input, config=config, **kwargs)
-        else:
-            return self.llm.invoke(input, config=config, **kwargs)
+        key = self._response_cache_key(normalized_input, kwargs)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return self._replay_cached(normalized_input, cached, config)
+        result = self.llm.invoke(normalized_input, config=config, **kwargs)
+        self.response_cache.set(key, result)
+        return result
     
     async def ainvoke(self, input: Any, config: Optional[Any] = None, **kwargs: Any) -> Any:
         """Async invoke the LLM with normalized messages"""
-        try:
-            if isinstance(input, list):
-                # Normalize messages before invoking
-                normalized_input = self._normalize_messages(input)
-                return await self.llm.ainvoke(normalized_input, config=config, **kwargs)
-            elif isinstance(input, dict) and 'messages' in input:
-                # Input is a dict with messages key
-                normalized_messages = self._normalize_messages(input['messages'])
-                normalized_input = {**input, 'messages': normalized_messages}
-                return await self.llm.ainvoke(normalized_input, config=config, **kwargs)
-            elif hasattr(input, 'messages') and isinstance(input.messages, list):
-                # Input is an object with messages attribute - create a copy
-                import copy
-                normalized_input = copy.deepcopy(input) if hasattr(copy, 'deepcopy') else input
-                normalized_messages = self._normalize_messages(input.messages)
-                normalized_input.messages = normalized_messages
-                return await self.llm.ainvoke(normalized_input, config=config, **kwargs)
-            else:
-                return await self.llm.ainvoke(input, config=config, **kwargs)
-        except Exception as e:
-            # If ainvoke fails, try to normalize and retry
-            import logging
-            logging.warning(f"Error in ainvoke, attempting message normalization: {e}")
-            if isinstance(input, list):
-                try:
-                    normalized_input = self._normalize_messages(input)
-                    return await self.llm.ainvoke(normalized_input, config=config, **kwargs)
-                except:
-                    raise
-            raise
+        kind, normalized_input = self._prepare(input)
+        if kind != _INPUT_LIST or self.response_cache is None:
+            return await self.llm.ainvoke(normalized_input, config=config, **kwargs)
+        key = self._response_cache_key(normalized_input, kwargs)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return await self._areplay_cached(normalized_input, cached, config)
+        result = await self.llm.ainvoke(normalized_input, config=config, **kwargs)
+        self.response_cache.set(key, result)
+        return result
     
     def stream(self, input: Any, config: Optional[Any] = None, **kwargs: Any) -> Any:
         """Stream the LLM with normalized messages"""
-        if isinstance(input, list):
-            normalized_input = self._normalize_messages(input)
-            return self.llm.stream(normalized_input, config=config, **kwargs)
-        elif isinstance(input, dict) and 'messages' in input:
-            normalized_messages = self._normalize_messages(input['messages'])
-            normalized_input = {**input, 'messages': normalized_messages}
-            return self.llm.stream(normalized_input, config=config, **kwargs)
-        elif hasattr(input, 'messages') and isinstance(input.messages, list):
-            import copy
-            normalized_input = copy.deepcopy(input) if hasattr(copy, 'deepcopy') else input
-            normalized_messages = self._normalize_messages(input.messages)
-            normalized_input.messages = normalized_messages
-            return self.llm.stream(normalized_input, config=config, **kwargs)
-        else:
-            return self.llm.stream(input, config=config, **kwargs)
+        _, normalized_input = self._prepare(input)
+        return self.llm.stream(normalized_input, config=config, **kwargs)
     
     async def astream(self, input: Any, config: Optional[Any] = None, **kwargs: Any) -> AsyncIterator[Any]:
         """Async stream the LLM with normalized messages"""
-        if isinstance(input, list):
-            normalized_input = self._normalize_messages(input)
-            async for chunk in self.llm.astream(normalized_input, config=config, **kwargs):
-                yield chunk
-        elif isinstance(input, dict) and 'messages' in input:
-            normalized_messages = self._normalize_messages(input['messages'])
-            normalized_input = {**input, 'messages': normalized_messages}
-            async for chunk in self.llm.astream(normalized_input, config=config, **kwargs):
-                yield chunk
-        elif hasattr(input, 'messages') and isinstance(input.messages, list):
-            import copy
-            normalized_input = copy.deepcopy(input) if hasattr(copy, 'deepcopy') else input
-            normalized_messages = self._normalize_messages(input.messages)
-            normalized_input.messages = normalized_messages
-            async for chunk in self.llm.astream(normalized_input, config=config, **kwargs):
-                yield chunk
-        else:
-            async for chunk in self.llm.astream(input, config=config, **kwargs):
-                yield chunk
+        _, normalized_input = self._prepare(input)
+        async for chunk in self.llm.astream(normalized_input, config=config, **kwargs):
+            yield chunk
     
     def bind_tools(self, tools: Any, **kwargs: Any) -> Any:
         """Bind tools to the underlying LLM"""
-        bound_llm = self.llm.bind_tools(tools, **kwargs)
+        # Always bind against the original (unbound) LLM so repeated bind_tools calls
+        # replace the tool set instead of stacking bindings and wrapper layers
+        root_llm = self.root_llm or self.llm
+        bound_llm = root_llm.bind_tools(tools, **kwargs)
         # Wrap the bound LLM to ensure messages are still normalized
-        # Check if it's already wrapped to avoid double-wrapping
-        if isinstance(bound_llm, MessageNormalizingLLM):
-            return bound_llm
-        return MessageNormalizingLLM(bound_llm)
-    
-    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[Any] = None, **kwargs: Any) -> Any:
-        """Core generation method - normalize messages before calling underlying LLM"""
-        try:
-            normalized_messages = self._normalize_messages(messages)
-            return self.llm._generate(normalized_messages, stop=stop, run_manager=run_manager, **kwargs)
-        except Exception as e:
-            # If normalization fails, try to normalize each message individually
-            import logging
-            logging.warning(f"Error in _generate normalization: {e}, attempting individual message normalization")
-            try:
-                safe_messages = []
-                for msg in messages:
-                    try:
-                        safe_messages.append(self._normalize_message(msg))
-                    except:
-                        # If individual normalization fails, try to convert content to string
-                        if hasattr(msg, 'content') and not isinstance(msg.content, str):
-                            msg.content = str(msg.content)
-                        safe_messages.append(msg)
-                return self.llm._generate(safe_messages, stop=stop, run_manager=run_manager, **kwargs)
-            except:
-                # Last resort: pass through and let the underlying LLM handle it
-                return self.llm._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
-    
-    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[Any] = None, **kwargs: Any) -> Any:
-        """Async core generation method - normalize messages before calling underlying LLM"""
-        try:
-            normalized_messages = self._normalize_messages(messages)
-            return await self.llm._agenerate(normalized_messages, stop=stop, run_manager=run_manager, **kwargs)
-        except Exception as e:
-            # If normalization fails, try to normalize each message individually
-            import logging
-            logging.warning(f"Error in _agenerate normalization: {e}, attempting individual message normalization")
-            try:
-                safe_messages = []
-                for msg in messages:
-                    try:
-                        safe_messages.append(self._normalize_message(msg))
-                    except:
-                        # If individual normalization fails, try to convert content to string
-                        if hasattr(msg, 'content') and not isinstance(msg.content, str):
-                            msg.content = str(msg.content)
-                        safe_messages.append(msg)
-                return await self.llm._agenerate(safe_messages, stop=stop, run_manager=run_manager, **kwargs)
-            except:
-                # Last resort: pass through and let the underlying LLM handle it
-                return await self.llm._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
-    
-    @property
-    def _identifying_params(self) -> dict:
-        """Return identifying parameters"""
-        return self.llm._identifying_params
+        return MessageNormalizingLLM(
+            bound_llm,
+            root_llm=root_llm,
+            response_cache=self.response_cache,
+            cache_namespace=self.cache_namespace,
+        )
     
     def __getattr__(self, name: str) -> Any:
         """Delegate any other attribute access to the underlying LLM"""
+        if name == 'llm':
+            # Not yet initialized (e.g. during copy); avoid infinite recursion
+            raise AttributeError(name)
         return getattr(self.llm, name)
 
 
+def _build_ollama(config: dict, model: str, streaming: bool, temperature: float):
+    """Local Ollama instance"""
+    if ChatOllama is None:
+        raise ImportError(
+            "ChatOllama is not available. Ensure 'langchain-ollama' is in requirements.txt and redeploy."
+        )
+    
+    base_url = config.get("base_url", "http://localhost:11434")
+    try:
+        return ChatOllama(
+            model=model,
+            base_url=base_url,
+            temperature=temperature,
+            streaming=streaming,
+            timeout=60.0  # Increase timeout for Docker
+        )
+    except Exception as e:
+        raise ValueError(
+            f"Failed to connect to Ollama at {base_url}. "
+            f"Make sure Ollama is running. Error: {str(e)}"
+        )
+
+
+def _build_deepseek(config: dict, model: str, streaming: bool, temperature: float):
+    """DeepSeek API (OpenAI-compatible); also the fallback for unknown types"""
+    api_key = config.get("api_key") or os.getenv("DEEPSEEK_KEY")
+    if not api_key:
+        raise ValueError(
+            "DeepSeek API key is required. "
+            "Please set DEEPSEEK_KEY environment variable or configure it in the database. "
+            "Get an API key from: https://platform.deepseek.com"
+        )
+    
+    # DeepSeek uses OpenAI-compatible API
+    api_base = config.get("api_base") or "https://api.deepseek.com"
+    return ChatOpenAI(
+        model=model or "deepseek-chat",
+        api_key=api_key,
+        base_url=api_base,
+        temperature=temperature,
+        streaming=streaming,
+        **_http_client_kwargs(api_base)
+    )
+
+
+def _build_groq(config: dict, model: str, streaming: bool, temperature: float):
+    """Groq API"""
+    api_key = config.get("api_key") or os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise ValueError("Groq API key is required")
+    
+    # Groq uses OpenAI-compatible API
+    api_base = "https://api.groq.com/openai/v1"
+    return ChatOpenAI(
+        model=model,
+        api_key=api_key,
+        base_url=api_base,
+        temperature=temperature,
+        streaming=streaming,
+        **_http_client_kwargs(api_base)
+    )
+
+
+def _build_gemini(config: dict, model: str, streaming: bool, temperature: float):
+    """Google Gemini API"""
+    if ChatGoogleGenerativeAI is None:
+        raise ImportError(
+            "ChatGoogleGenerativeAI is not available. Ensure 'langchain-google-genai' is in requirements.txt and redeploy."
+        )
+    
+    api_key = config.get("api_key") or os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError(
+            "Google API key is required for Gemini. "
+            "Please set GOOGLE_API_KEY environment variable or configure it in the database. "
+            "Get an API key from: https://aistudio.google.com/app/apikey"
+        )
+    
+    try:
+        # Try to initialize with the model
+        # Note: Some models may require specific API versions
+        return ChatGoogleGenerativeAI(
+            model=model,
+            google_api_key=api_key,
+            temperature=temperature,
+            streaming=streaming
+        )
+    except Exception as e:
+        error_msg = str(e)
+        
+        # Check for NotFound/404 errors - model not available for current API version
+        if "NotFound" in error_msg or "404" in error_msg or "not found" in error_msg.lower():
+            raise ValueError(
+                f"Gemini model '{model}' is not available or not found for the current API version. "
+                f"Try using one of these models instead:\n"
+                f"- gemini-1.5-pro (most stable)\n"
+                f"- gemini-1.5-flash (if available in your region)\n"
+                f"- gemini-pro (legacy)\n"
+                f"- gemini-2.0-flash-exp (experimental)\n\n"
+                f"Error details: {error_msg[:300]}"
+            )
+        # Provide helpful error messages based on error type
+        elif "INVALID_ARGUMENT" in error_msg or "model" in error_msg.lower():
+            raise ValueError(
+                f"Invalid Gemini model name: '{model}'. "
+                f"Please check the model name. Common models: "
+                f"{GEMINI_COMMON_MODELS_STR}. "
+                f"Error details: {error_msg[:300]}"
+            )
+        elif "API_KEY" in error_msg or "authentication" in error_msg.lower() or "API key not valid" in error_msg:
+            raise ValueError(
+                f"Invalid Google API key. Please check your API key. "
+                f"Get a new one from: https://aistudio.google.com/app/apikey. "
+                f"Error: {error_msg}"
+            )
+        elif "RESOURCE_EXHAUSTED" in error_msg or "quota" in error_msg.lower() or "429" in error_msg:
+            raise ValueError(
+                f"Gemini API quota exceeded. Your API key has reached its rate limit or quota. "
+                f"Solutions:\n"
+                f"1. Wait a few minutes and try again\n"
+                f"2. Enable billing in Google Cloud Console: https://console.cloud.google.com/billing\n"
+                f"3. Check your quota limits: https://ai.dev/usage?tab=rate-limit\n"
+                f"4. Try a different model (e.g., gemini-1.5-flash instead of gemini-2.0-flash)\n"
+                f"Error details: {error_msg[:200]}"
+            )
+        else:
+            raise ValueError(
+                f"Failed to initialize Gemini model '{model}': {error_msg}. "
+                f"Please check:\n"
+                f"- API key is valid (from https://aistudio.google.com/app/apikey)\n"
+                f"- Model name is correct (try: gemini-1.5-flash or gemini-1.5-pro)\n"
+                f"- Internet connection is working"
+            )
+
+
+def _build_openai(config: dict, model: str, streaming: bool, temperature: float):
+    """OpenAI API"""
+    # Note: OPENAI_API_KEY from env is ONLY for embeddings (RAG), not for LLM model
+    # The LLM model API key must be set in the database config or use OPENAI_LLM_API_KEY env var
+    api_key = config.get("api_key") or os.getenv("OPENAI_LLM_API_KEY")
+    if not api_key:
+        raise ValueError(
+            "OpenAI API key is required for the LLM model. "
+            "Please set it in the LLM configuration or set OPENAI_LLM_API_KEY environment variable. "
+            "Note: OPENAI_API_KEY environment variable is only used for embeddings (RAG), not for the LLM model."
+        )
+    
+    api_base = config.get("api_base")
+    kwargs = {
+        "model": model,
+        "api_key": api_key,
+        "temperature": temperature,
+        "streaming": streaming
+    }
+    
+    if api_base:
+        kwargs["base_url"] = api_base
+    kwargs.update(_http_client_kwargs(api_base))
+    
+    return ChatOpenAI(**kwargs)
+
+
+def _build_openrouter(config: dict, model: str, streaming: bool, temperature: float):
+    """OpenRouter API (OpenAI-compatible)"""
+    api_key = config.get("api_key") or os.getenv("OPENROUTER_API_KEY")
+    if not api_key:
+        raise ValueError(
+            "OpenRouter API key is required. "
+            "Please set it in the LLM configuration or set OPENROUTER_API_KEY environment variable. "
+            "Get an API key from: https://openrouter.ai/"
+        )
+    
+    # OpenRouter uses OpenAI-compatible API
+    api_base = config.get("api_base") or "https://openrouter.ai/api/v1"
+    
+    # OpenRouter requires HTTP Referer header (passed via default_headers)
+    # Note: ChatOpenAI uses default_headers parameter
+    return ChatOpenAI(
+        model=model,
+        api_key=api_key,
+        base_url=api_base,
+        temperature=temperature,
+        streaming=streaming,
+        **_http_client_kwargs(api_base),
+        default_headers={
+            "HTTP-Referer": config.get("http_referer", "https://dosibridge.com"),
+            "X-Title": config.get("app_name", "DOSIBridge Agent")
+        }
+    )
+
+
+# Provider type -> builder returning the raw (unwrapped) LLM
+_PROVIDERS = {
+    "ollama": _build_ollama,
+    "deepseek": _build_deepseek,
+    "groq": _build_groq,
+    "gemini": _build_gemini,
+    "openai": _build_openai,
+    "openrouter": _build_openrouter,
+}
+
+# Providers whose chat models accept list/dict (multipart) message content natively
+_PROVIDERS_NATIVE_MULTIPART = frozenset({"openai", "gemini", "openrouter"})
+
+
 def create_llm_from_config(config: dict, streaming: bool = False, temperature: float = 0):
     """
     Create an LLM instance based on configuration.
@@ -355,6 +722,8 @@ def create_llm_from_config(config: dict, streaming: bool = False, temperature: f
     - gemini: Google Gemini models (requires api_key and model)
     - openrouter: OpenRouter models (requires api_key and model, uses OpenAI-compatible API)
     
+    Unknown types fall back to DeepSeek.
+    
     Args:
         config: LLM configuration dictionary with keys:
             - type: "openai", "deepseek", "groq", "ollama", "gemini", or "openrouter"
@@ -362,6 +731,10 @@ def create_llm_from_config(config: dict, streaming: bool = False, temperature: f
             - api_key: API key (for openai/deepseek/groq/gemini)
             - base_url: Base URL (for ollama, defaults to http://localhost:11434)
             - api_base: Custom API base URL (optional, for openai/groq/deepseek)
+            - cache_responses: Reuse responses for identical prompts (optional, defaults to
+              the LLM_RESPONSE_CACHE environment variable)
+            - normalize_messages: Set False to skip the message-normalizing wrapper for providers
+              that accept multipart content natively (openai/gemini/openrouter; default True)
         streaming: Whether to enable streaming
         temperature: Temperature for the model
         
@@ -371,217 +744,17 @@ def create_llm_from_config(config: dict, streaming: bool = False, temperature: f
     llm_type = config.get("type", "deepseek").lower()
     model = config.get("model", "deepseek-chat")
     
-    if llm_type == "ollama":
-        # Local Ollama instance
-        if ChatOllama is None:
-            raise ImportError(
-                "ChatOllama is not available. Ensure 'langchain-ollama' is in requirements.txt and redeploy."
-            )
-        
-        base_url = config.get("base_url", "http://localhost:11434")
-        try:
-            llm = ChatOllama(
-                model=model,
-                base_url=base_url,
-                temperature=temperature,
-                streaming=streaming,
-                timeout=60.0  # Increase timeout for Docker
-            )
-            return MessageNormalizingLLM(llm)
-        except Exception as e:
-            raise ValueError(
-                f"Failed to connect to Ollama at {base_url}. "
-                f"Make sure Ollama is running. Error: {str(e)}"
-            )
-    
-    elif llm_type == "deepseek":
-        # DeepSeek API (OpenAI-compatible)
-        api_key = config.get("api_key") or os.getenv("DEEPSEEK_KEY")
-        if not api_key:
-            raise ValueError(
-                "DeepSeek API key is required. "
-                "Please set DEEPSEEK_KEY environment variable or configure it in the database. "
-                "Get an API key from: https://platform.deepseek.com"
-            )
-        
-        # DeepSeek uses OpenAI-compatible API
-        api_base = config.get("api_base") or "https://api.deepseek.com"
-        llm = ChatOpenAI(
-            model=model or "deepseek-chat",
-            api_key=api_key,
-            base_url=api_base,
-            temperature=temperature,
-            streaming=streaming
-        )
-        return MessageNormalizingLLM(llm)
-    
-    elif llm_type == "groq":
-        # Groq API
-        api_key = config.get("api_key") or os.getenv("GROQ_API_KEY")
-        if not api_key:
-            raise ValueError("Groq API key is required")
-        
-        # Groq uses OpenAI-compatible API
-        llm = ChatOpenAI(
-            model=model,
-            api_key=api_key,
-            base_url="https://api.groq.com/openai/v1",
-            temperature=temperature,
-            streaming=streaming
-        )
-        return MessageNormalizingLLM(llm)
-    
-    elif llm_type == "gemini":
-        # Google Gemini API
-        if ChatGoogleGenerativeAI is None:
-            raise ImportError(
-                "ChatGoogleGenerativeAI is not available. Ensure 'langchain-google-genai' is in requirements.txt and redeploy."
-            )
-        
-        api_key = config.get("api_key") or os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError(
-                "Google API key is required for Gemini. "
-                "Please set GOOGLE_API_KEY environment variable or configure it in the database. "
-                "Get an API key from: https://aistudio.google.com/app/apikey"
-            )
-        
-        try:
-            # Common Gemini model names for validation hints
-            common_models = [
-                "gemini-1.5-pro", "gemini-1.5-flash", "gemini-pro",
-                "gemini-2.0-flash-exp", "gemini-2.5-flash", "gemini-2.5-flash-lite",
-                "gemini-2.5-pro"
-            ]
-            
-            # Try to initialize with the model
-            # Note: Some models may require specific API versions
-            llm = ChatGoogleGenerativeAI(
-                model=model,
-                google_api_key=api_key,
-                temperature=temperature,
-                streaming=streaming
-            )
-            
-            return MessageNormalizingLLM(llm)
-        except Exception as e:
-            error_msg = str(e)
-            
-            # Check for NotFound/404 errors - model not available for current API version
-            if "NotFound" in error_msg or "404" in error_msg or "not found" in error_msg.lower():
-                raise ValueError(
-                    f"Gemini model '{model}' is not available or not found for the current API version. "
-                    f"Try using one of these models instead:\n"
-                    f"- gemini-1.5-pro (most stable)\n"
-                    f"- gemini-1.5-flash (if available in your region)\n"
-                    f"- gemini-pro (legacy)\n"
-                    f"- gemini-2.0-flash-exp (experimental)\n\n"
-                    f"Error details: {error_msg[:300]}"
-                )
-            # Provide helpful error messages based on error type
-            elif "INVALID_ARGUMENT" in error_msg or "model" in error_msg.lower():
-                raise ValueError(
-                    f"Invalid Gemini model name: '{model}'. "
-                    f"Please check the model name. Common models: "
-                    f"{', '.join(common_models)}. "
-                    f"Error details: {error_msg[:300]}"
-                )
-            elif "API_KEY" in error_msg or "authentication" in error_msg.lower() or "API key not valid" in error_msg:
-                raise ValueError(
-                    f"Invalid Google API key. Please check your API key. "
-                    f"Get a new one from: https://aistudio.google.com/app/apikey. "
-                    f"Error: {error_msg}"
-                )
-            elif "RESOURCE_EXHAUSTED" in error_msg or "quota" in error_msg.lower() or "429" in error_msg:
-                raise ValueError(
-                    f"Gemini API quota exceeded. Your API key has reached its rate limit or quota. "
-                    f"Solutions:\n"
-                    f"1. Wait a few minutes and try again\n"
-                    f"2. Enable billing in Google Cloud Console: https://console.cloud.google.com/billing\n"
-                    f"3. Check your quota limits: https://ai.dev/usage?tab=rate-limit\n"
-                    f"4. Try a different model (e.g., gemini-1.5-flash instead of gemini-2.0-flash)\n"
-                    f"Error details: {error_msg[:200]}"
-                )
-            else:
-                raise ValueError(
-                    f"Failed to initialize Gemini model '{model}': {error_msg}. "
-                    f"Please check:\n"
-                    f"- API key is valid (from https://aistudio.google.com/app/apikey)\n"
-                    f"- Model name is correct (try: gemini-1.5-flash or gemini-1.5-pro)\n"
-                    f"- Internet connection is working"
-                )
-    
-    elif llm_type == "openai":
-        # OpenAI API
-        # Note: OPENAI_API_KEY from env is ONLY for embeddings (RAG), not for LLM model
-        # The LLM model API key must be set in the database config or use OPENAI_LLM_API_KEY env var
-        api_key = config.get("api_key") or os.getenv("OPENAI_LLM_API_KEY")
-        if not api_key:
-            raise ValueError(
-                "OpenAI API key is required for the LLM model. "
-                "Please set it in the LLM configuration or set OPENAI_LLM_API_KEY environment variable. "
-                "Note: OPENAI_API_KEY environment variable is only used for embeddings (RAG), not for the LLM model."
-            )
-        
-        api_base = config.get("api_base")
-        kwargs = {
-            "model": model,
-            "api_key": api_key,
-            "temperature": temperature,
-            "streaming": streaming
-        }
-        
-        if api_base:
-            kwargs["base_url"] = api_base
-        
-        llm = ChatOpenAI(**kwargs)
-        return MessageNormalizingLLM(llm)
-    
-    elif llm_type == "openrouter":
-        # OpenRouter API (OpenAI-compatible)
-        api_key = config.get("api_key") or os.getenv("OPENROUTER_API_KEY")
-        if not api_key:
-            raise ValueError(
-                "OpenRouter API key is required. "
-                "Please set it in the LLM configuration or set OPENROUTER_API_KEY environment variable. "
-                "Get an API key from: https://openrouter.ai/"
-            )
-        
-        # OpenRouter uses OpenAI-compatible API
-        api_base = config.get("api_base") or "https://openrouter.ai/api/v1"
-        
-        # OpenRouter requires HTTP Referer header (passed via default_headers)
-        # Note: ChatOpenAI uses default_headers parameter
-        llm = ChatOpenAI(
-            model=model,
-            api_key=api_key,
-            base_url=api_base,
-            temperature=temperature,
-            streaming=streaming,
-            default_headers={
-                "HTTP-Referer": config.get("http_referer", "https://dosibridge.com"),
-                "X-Title": config.get("app_name", "DOSIBridge Agent")
-            }
-        )
-        return MessageNormalizingLLM(llm)
-    
-    else:  # Default to DeepSeek
-        # DeepSeek API (default fallback)
-        api_key = config.get("api_key") or os.getenv("DEEPSEEK_KEY")
-        if not api_key:
-            raise ValueError(
-                "DeepSeek API key is required. "
-                "Please set DEEPSEEK_KEY environment variable or configure it in the database. "
-                "Get an API key from: https://platform.deepseek.com"
-            )
-        
-        api_base = config.get("api_base") or "https://api.deepseek.com"
-        llm = ChatOpenAI(
-            model=model or "deepseek-chat",
-            api_key=api_key,
-            base_url=api_base,
-            temperature=temperature,
-            streaming=streaming
-        )
-        return MessageNormalizingLLM(llm)
-
+    build = _PROVIDERS.get(llm_type, _build_deepseek)
+    llm = build(config, model, streaming, temperature)
+    response_cache = _get_response_cache(config)
+    if (
+        llm_type in _PROVIDERS_NATIVE_MULTIPART
+        and not config.get("normalize_messages", True)
+        and response_cache is None
+    ):
+        return llm
+    return MessageNormalizingLLM(
+        llm,
+        response_cache=response_cache,
+        cache_namespace=_response_cache_namespace(config) if response_cache is not None else None,
+    )
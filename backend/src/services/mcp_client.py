@@ -7,6 +7,7 @@ from mcp.client.streamable_http import streamablehttp_client
 from langchain_mcp_adapters.tools import load_mcp_tools
 from typing import List
 from langchain_core.tools import BaseTool
+from src.utils.validators import normalize_mcp_url
 
 # Suppress verbose MCP library errors
 logging.getLogger("mcp").setLevel(logging.WARNING)
@@ -87,17 +88,7 @@ class MCPClientManager:
                 final_url = server_url.strip()
             else:
                 # For http/sse, normalize URL
-                final_url = server_url.rstrip('/')
-                if connection_type == "sse":
-                    if final_url.endswith('/mcp'):
-                        final_url = final_url[:-4] + '/sse'
-                    elif not final_url.endswith('/sse'):
-                        final_url = final_url.rstrip('/') + '/sse'
-                else:  # http
-                    if final_url.endswith('/sse'):
-                        final_url = final_url[:-4]
-                    if not final_url.endswith('/mcp'):
-                        final_url = final_url.rstrip('/') + '/mcp'
+                final_url = normalize_mcp_url(server_url, connection_type)
             
             print(f"Loading tools from {server_name} MCP server ({connection_type}: {final_url})...")
             
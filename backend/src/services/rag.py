@@ -3,21 +3,27 @@ RAG (Retrieval Augmented Generation) system with FAISS vectorstore
 """
 import os
 from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_classic.chains import create_retrieval_chain, create_history_aware_retriever
 from langchain_classic.chains.combine_documents import create_stuff_documents_chain
 
 from .history import history_manager
+from .llm_factory import get_embeddings
 from src.core import Config
+from src.utils.cache import Cache
 
 
 class EnhancedRAGSystem:
     """Enhanced RAG system with better context retrieval and history awareness"""
     
+    # The knowledge base is fixed at startup, so retrieved context stays valid for a long time
+    CONTEXT_CACHE_TTL_SECONDS = 3600
+    
     def __init__(self):
         """Initialize the RAG system with DOSIBridge context"""
+        self._context_cache = Cache(default_ttl_seconds=self.CONTEXT_CACHE_TTL_SECONDS)
         self.texts = [
             "DOSIBridge (Digital Operations Software Innovation) is a technology company focused on AI and automation solutions.",
             "DOSIBridge was founded in 2025 and is an innovative team using AI to enhance digital operations and software solutions.",
@@ -52,7 +58,7 @@ class EnhancedRAGSystem:
                     "Note: This is ONLY for embeddings, not for the LLM model."
                 )
             
-            self.embeddings = OpenAIEmbeddings(api_key=openai_api_key)
+            self.embeddings = get_embeddings(openai_api_key)
             self.vectorstore = FAISS.from_texts(self.texts, embedding=self.embeddings)
             self.retriever = self.vectorstore.as_retriever(search_kwargs={"k": 3})
             self.available = True
@@ -61,17 +67,31 @@ class EnhancedRAGSystem:
             print(f"⚠️  FAISS not available, RAG tool disabled: {e}")
             self.available = False
     
-    def retrieve_context(self, query: str) -> str:
-        """Retrieve relevant context for a query"""
+    def retrieve_context(self, query: str, bypass_cache: bool = False) -> str:
+        """
+        Retrieve relevant context for a query
+        
+        Results are cached by normalized query (case and whitespace insensitive);
+        pass bypass_cache=True to always run the retriever.
+        """
         if not self.available:
             return "RAG system not available."
         
+        cache_key = " ".join(query.lower().split())
+        if not bypass_cache:
+            cached = self._context_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         try:
             docs = self.retriever.invoke(query)
             if docs:
                 contexts = [doc.page_content for doc in docs]
-                return "\n".join(contexts)
-            return "No relevant context found."
+                context = "\n".join(contexts)
+            else:
+                context = "No relevant context found."
+            self._context_cache.set(cache_key, context)
+            return context
         except Exception as e:
             return f"Error retrieving context: {e}"
     
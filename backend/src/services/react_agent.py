@@ -2,15 +2,408 @@
 ReAct (Reasoning and Acting) Agent implementation
 Combines reasoning with tool use for better problem-solving
 """
-from typing import List, Dict, Optional, Any
-from langchain.agents import create_agent
+from typing import ClassVar, List, Dict, Optional, Any, Tuple
+import ast
+import asyncio
+import hashlib
+import io
+import json
+import math
+import operator
+import os
+import re
+from functools import lru_cache
+from types import MappingProxyType
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_core.tools import BaseTool
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, tool
 
-from src.services.advanced_rag import advanced_rag_system
-from src.services.llm_factory import create_llm_from_config
 from src.core import Config
+from src.core.constants import DEFAULT_SESSION_ID
+from src.services.semantic_cache import SemanticCache
+from src.utils.cache import Cache
+
+# langchain.agents, the LLM providers and the RAG stack (FAISS, sentence-transformers)
+# are imported on first use so importing this module stays cheap
+
+def _rag():
+    """The advanced_rag module, imported on first use"""
+    from src.services import advanced_rag
+    return advanced_rag
+
+
+def __getattr__(name: str) -> Any:
+    # PEP 562: keep `react_agent.advanced_rag_system` available without importing it eagerly
+    if name == "advanced_rag_system":
+        return _rag().advanced_rag_system
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# DOSIBridge identity shared by the ReAct system prompts below
+_DOSIBRIDGE_PREAMBLE = (
+    "You are the official AI assistant for dosibridge.com, trained and maintained by the DOSIBridge team.\n\n"
+    "DOSIBridge (Digital Operations Software Innovation) was founded in 2025 and is an innovative team using AI to enhance digital operations and software solutions. "
+    "DOSIBridge builds research systems that drive business growth, development, and engineering excellence.\n\n"
+    "DOSIBridge's mission is to help businesses grow smarter with AI & Automation. "
+    "We specialize in AI, .NET, Python, GoLang, Angular, Next.js, Docker, DevOps, Azure, AWS, and system design.\n\n"
+    "DOSIBridge Team Members:\n"
+    "- Mihadul Islam (CEO & Founder): .NET engineer skilled in Python, AI, automation, Docker, DevOps, Azure, AWS, and system design.\n"
+    "- Abdullah Al Sazib (Co-Founder & CTO): GoLang and Next.js expert passionate about Angular, research, and continuous learning in tech innovation.\n\n"
+    "Your role is to provide accurate, secure, and helpful responses related to DOSIBridge products, services, and workflows.\n\n"
+    "When asked about your identity, respond: 'I am the DOSIBridge AI Agent, developed and trained by the DOSIBridge team to assist with product support, automation guidance, and technical workflows across the DOSIBridge platform.'\n\n"
+    "When asked about DOSIBridge team members, provide detailed information about Mihadul Islam (CEO & Founder) and Abdullah Al Sazib (Co-Founder & CTO).\n\n"
+)
+
+# Default system prompt for ReActAgent.run. Built once so every request sends an identical
+# prefix ahead of the per-request history/query, which lets providers with prefix caching
+# (OpenAI, DeepSeek, Gemini) reuse it; cache_control marks it for providers that need opt-in.
+REACT_SYSTEM_PROMPT = _DOSIBRIDGE_PREAMBLE + (
+    "You use ReAct (Reasoning and Acting). Think step by step, use tools when needed, and provide clear answers.\n"
+    "If a question is outside DOSIBridge's scope, respond professionally and redirect when appropriate.\n"
+    "Do not claim affiliation with any external AI vendor unless explicitly instructed."
+)
+REACT_SYSTEM_MESSAGE = SystemMessage(
+    content=REACT_SYSTEM_PROMPT,
+    additional_kwargs={"cache_control": {"type": "ephemeral"}},
+)
+
+
+# Cache of ReAct answers, scoped (user, collection, system prompt, chat history) and
+# matched by exact or paraphrased query. Shared across agent instances. Every new chat
+# history is a new scope, so the number of scopes is capped (least recently stored go first).
+REACT_RESPONSE_CACHE_MAX_SCOPES = int(os.getenv("REACT_RESPONSE_CACHE_MAX_SCOPES", "512"))
+react_response_cache = SemanticCache(max_scopes=REACT_RESPONSE_CACHE_MAX_SCOPES)
+
+
+class SessionMemory:
+    """
+    Per-session memory of recent retrievals and the last answer.
+    
+    Lets a follow-up question in the same session reuse what was already retrieved
+    instead of calling retrieve_documents again. Entries are keyed by (user_id, session_id)
+    and expire after ttl_seconds of inactivity.
+    """
+    
+    def __init__(self, max_retrievals: int = 3, max_chars_per_retrieval: int = 2000, ttl_seconds: int = 1800):
+        self.max_retrievals = max_retrievals
+        self.max_chars_per_retrieval = max_chars_per_retrieval
+        self.ttl_seconds = ttl_seconds
+        self._cache = Cache(default_ttl_seconds=ttl_seconds)
+    
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        return self._cache.get(key)
+    
+    def record(self, key: Tuple, query: str, answer: str, retrievals: List[Tuple[str, str]]):
+        """Remember this turn's answer and any (query, context) retrievals it made"""
+        memory = self._cache.get(key) or {"retrievals": [], "last_query": None, "last_answer": None}
+        compact = [
+            (retrieval_query, context[:self.max_chars_per_retrieval])
+            for retrieval_query, context in retrievals
+            if context and not context.startswith("Error retrieving documents")
+        ]
+        memory = {
+            "retrievals": (memory["retrievals"] + compact)[-self.max_retrievals:],
+            "last_query": query,
+            "last_answer": answer,
+        }
+        self._cache.set(key, memory)
+    
+    def summary(self, key: Tuple, include_last_turn: bool = True) -> Optional[str]:
+        """
+        Render the session memory as system prompt text, or None if there is nothing to add.
+        
+        Pass include_last_turn=False when the chat history is sent as well; it already
+        holds the previous question and answer.
+        """
+        memory = self._cache.get(key)
+        if not memory:
+            return None
+        parts = [
+            f"Documents previously retrieved for \"{retrieval_query}\":\n{context}"
+            for retrieval_query, context in memory["retrievals"]
+        ]
+        if include_last_turn and memory["last_answer"]:
+            parts.append(f"Previous question: {memory['last_query']}\nPrevious answer: {memory['last_answer']}")
+        if not parts:
+            return None
+        parts.insert(0, "Context from earlier in this conversation (reuse it instead of retrieving again when it answers the question):")
+        return "\n\n".join(parts)
+    
+    def clear(self, key: Optional[Tuple] = None):
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.delete(key)
+
+
+react_session_memory = SessionMemory()
+
+
+# Names available to the calculate tool: everything public in math plus a few builtins.
+# Read-only so nothing evaluated by the tool (or elsewhere) can mutate the shared table.
+_CALC_NAMES = MappingProxyType({
+    **{k: v for k, v in math.__dict__.items() if not k.startswith("__")},
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    "sum": sum,
+})
+
+_CALC_BINARY_OPS = MappingProxyType({
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+})
+_CALC_UNARY_OPS = MappingProxyType({
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+})
+# Guard against expressions like 9**9**9 that would hang the worker
+_CALC_MAX_EXPONENT = 10000
+
+
+@lru_cache(maxsize=512)
+def _parse_math_expression(expression: str) -> ast.expr:
+    """Parse an expression once; repeated expressions reuse the cached tree"""
+    return ast.parse(expression.strip(), mode="eval").body
+
+
+def _eval_math_node(node: ast.expr) -> Any:
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, complex)) and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _CALC_BINARY_OPS:
+        left = _eval_math_node(node.left)
+        right = _eval_math_node(node.right)
+        if isinstance(node.op, ast.Pow) and isinstance(right, (int, float)) and abs(right) > _CALC_MAX_EXPONENT:
+            raise ValueError("Exponent too large")
+        return _CALC_BINARY_OPS[type(node.op)](left, right)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _CALC_UNARY_OPS:
+        return _CALC_UNARY_OPS[type(node.op)](_eval_math_node(node.operand))
+    if isinstance(node, ast.Name):
+        if node.id not in _CALC_NAMES:
+            raise NameError(f"name '{node.id}' is not defined")
+        return _CALC_NAMES[node.id]
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        func = _eval_math_node(node.func)
+        if not callable(func):
+            raise TypeError(f"'{node.func.id}' is not callable")
+        return func(*[_eval_math_node(arg) for arg in node.args])
+    if isinstance(node, (ast.Tuple, ast.List)):
+        return [_eval_math_node(element) for element in node.elts]
+    raise ValueError(f"Unsupported expression element: {type(node).__name__}")
+
+
+def evaluate_math_expression(expression: str) -> Any:
+    """
+    Evaluate a math expression by walking its AST (no eval()).
+    
+    Supports numbers, + - * / // % **, unary +/-, math functions/constants and
+    abs/round/min/max/sum. Raises on anything else.
+    """
+    return _eval_math_node(_parse_math_expression(expression))
+
+
+def _format_retrieved_documents(results: List[Dict[str, Any]]) -> str:
+    """Format retrieval results as the retrieve_documents tool output"""
+    if not results:
+        return "No relevant documents found."
+    # Write straight into one buffer instead of building a string per document and joining
+    buffer = io.StringIO()
+    write = buffer.write
+    for i, result in enumerate(results, 1):
+        if i > 1:
+            write("\n")
+        source = result.get("metadata", {}).get("original_filename", "Unknown")
+        write(f"[Document {i} - {source}]\n")
+        write(result["content"])
+        write("\n")
+    return buffer.getvalue()
+
+
+def retrieve_documents_text(user_id: int, collection_id: Optional[int], query: str) -> str:
+    """Retrieve and format document context for the retrieve_documents tool (cached)"""
+    rag = _rag()
+    cache_key = rag.retrieval_cache_key("retrieve_documents", user_id, collection_id, query)
+    cached = rag.retrieval_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        results = rag.advanced_rag_system.retrieve(
+            query=query,
+            user_id=user_id,
+            k=5,
+            use_reranking=True,
+            use_hybrid=True,
+            collection_id=collection_id
+        )
+        context = _format_retrieved_documents(results)
+        rag.retrieval_cache.set(cache_key, context)
+        return context
+    except Exception as e:
+        return f"Error retrieving documents: {str(e)}"
+
+
+async def _aretrieve_documents_uncached(user_id: int, collection_id: Optional[int], query: str, cache_key: tuple) -> str:
+    """Run advanced_rag_system.aretrieve() and cache the formatted result"""
+    rag = _rag()
+    try:
+        results = await rag.advanced_rag_system.aretrieve(
+            query=query,
+            user_id=user_id,
+            k=5,
+            use_reranking=True,
+            use_hybrid=True,
+            collection_id=collection_id
+        )
+        context = _format_retrieved_documents(results)
+        rag.retrieval_cache.set(cache_key, context)
+        return context
+    except Exception as e:
+        return f"Error retrieving documents: {str(e)}"
+
+
+# Retrievals currently running on the event loop, keyed by retrieval_cache_key()
+_inflight_retrievals: Dict[tuple, "asyncio.Future"] = {}
+
+
+async def aretrieve_documents_text(user_id: int, collection_id: Optional[int], query: str) -> str:
+    """
+    Async retrieve_documents: serves from the cache, joins an identical in-flight
+    retrieval, or awaits advanced_rag_system.aretrieve().
+    """
+    rag = _rag()
+    cache_key = rag.retrieval_cache_key("retrieve_documents", user_id, collection_id, query)
+    cached = rag.retrieval_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    task = _inflight_retrievals.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(_aretrieve_documents_uncached(user_id, collection_id, query, cache_key))
+        _inflight_retrievals[cache_key] = task
+        task.add_done_callback(lambda _: _inflight_retrievals.pop(cache_key, None))
+    return await asyncio.shield(task)
+
+
+# Wording that points at the user's own documents rather than general knowledge
+_DOCUMENT_QUERY_RE = re.compile(
+    r"\b(?:documents?|docs?|files?|pdfs?|uploads?|uploaded|attach(?:ed|ment|ments)?|"
+    r"reports?|manuals?|notes|papers?|knowledge base|according to|mentioned in|sources?)\b",
+    re.IGNORECASE
+)
+
+
+def _should_prefetch_documents(query: str, collection_id: Optional[int]) -> bool:
+    """
+    Heuristic: prefetch only when retrieval is very likely - a collection was
+    selected for the run, or the query refers to the user's documents
+    """
+    if not any(ch.isalpha() for ch in query):
+        return False
+    return collection_id is not None or _DOCUMENT_QUERY_RE.search(query) is not None
+
+
+_TOOL_CALL_NAME_ARGS = operator.itemgetter("name", "args")
+
+
+def _chat_history_key(chat_history: Optional[List]) -> Optional[str]:
+    """Digest of a chat history's message types and contents (None for no history)"""
+    if not chat_history:
+        return None
+    digest = hashlib.sha256()
+    for message in chat_history:
+        digest.update(getattr(message, "type", type(message).__name__).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(str(getattr(message, "content", message)).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _final_response(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Strip the event type from a "final" stream event, leaving the run() result"""
+    return {key: value for key, value in event.items() if key != "type"}
+
+
+@lru_cache(maxsize=1)
+def _session_context_middleware():
+    """
+    Agent middleware appending the run's session memory ("session_context" in the
+    RunnableConfig) to the system prompt. Built once; imports langchain.agents on first use.
+    """
+    from langchain.agents.middleware import ModelRequest, dynamic_prompt
+    from langgraph.config import get_config
+    
+    @dynamic_prompt
+    def session_context_prompt(request: ModelRequest) -> SystemMessage:
+        system_message = request.system_message
+        session_context = get_config().get("configurable", {}).get("session_context")
+        if not session_context or system_message is None:
+            return system_message
+        # Appended after the fixed prompt so the cacheable prefix is unchanged
+        return SystemMessage(
+            content=f"{system_message.content}\n\n{session_context}",
+            additional_kwargs=system_message.additional_kwargs,
+        )
+    
+    return session_context_prompt
+
+
+def _react_scope(config: Optional[RunnableConfig]) -> Tuple[Optional[int], Optional[int]]:
+    """(user_id, collection_id) for the current agent run, from the RunnableConfig"""
+    configurable = (config or {}).get("configurable", {})
+    return configurable.get("user_id"), configurable.get("collection_id")
+
+
+# The ReAct tools are built once at import and shared by every request; the user and
+# collection for a run are passed in the RunnableConfig ("configurable") instead of
+# being captured in per-request closures, so the tool schemas are generated only once.
+@tool
+def retrieve_documents(query: str, config: RunnableConfig) -> str:
+    """Retrieve relevant documents from the knowledge base.
+    
+    Args:
+        query: Search query to find relevant documents
+    
+    Returns:
+        Relevant document chunks with context
+    """
+    user_id, collection_id = _react_scope(config)
+    return retrieve_documents_text(user_id, collection_id, query)
+
+
+async def _aretrieve_documents(query: str, config: RunnableConfig) -> str:
+    user_id, collection_id = _react_scope(config)
+    return await aretrieve_documents_text(user_id, collection_id, query)
+
+
+# Async runs join any in-flight (e.g. speculative) retrieval for the same query
+retrieve_documents.coroutine = _aretrieve_documents
+
+
+@tool
+def calculate(expression: str) -> str:
+    """Perform mathematical calculations.
+    
+    Args:
+        expression: Mathematical expression to evaluate (e.g., "2 + 2", "sqrt(16)")
+    
+    Returns:
+        Calculation result
+    """
+    try:
+        return str(evaluate_math_expression(expression))
+    except Exception as e:
+        return f"Calculation error: {str(e)}"
+
+
+REACT_TOOLS: Tuple[BaseTool, ...] = (retrieve_documents, calculate)
 
 
 class ReActAgent:
@@ -30,112 +423,211 @@ class ReActAgent:
             llm_config = Config.load_llm_config()
         
         self.llm_config = llm_config
+        from src.services.llm_factory import create_llm_from_config
         self.llm = create_llm_from_config(llm_config, streaming=False, temperature=0.1)
+        # Opt-in via the same config flag as the LLM-level response cache (or LLM_RESPONSE_CACHE)
+        from src.services.llm_factory import response_cache_enabled
+        self.response_cache = react_response_cache if response_cache_enabled(llm_config) else None
+        # Compiled agent for the default system prompt; the graph holds no per-run state
+        self._default_agent = None
     
-    def create_react_prompt(self) -> ChatPromptTemplate:
+    # The ReAct template has no per-instance inputs, so it is built once with the class
+    _REACT_PROMPT: ClassVar[ChatPromptTemplate] = ChatPromptTemplate.from_messages([
+        SystemMessage(content=_DOSIBRIDGE_PREAMBLE + (
+            "You use a ReAct (Reasoning and Acting) approach:\n"
+            "1. **Thought**: Think about what you need to do and what information you need\n"
+            "2. **Action**: Use available tools to gather information or perform actions\n"
+            "3. **Observation**: Analyze the results from tools\n"
+            "4. **Final Answer**: Provide a clear, comprehensive answer based on your reasoning\n\n"
+            "If a question is outside DOSIBridge's scope, respond professionally and redirect when appropriate.\n"
+            "Do not claim affiliation with any external AI vendor unless explicitly instructed.\n\n"
+            "Available tools:\n"
+            "- retrieve_documents: Search through uploaded documents\n"
+            "- calculate: Perform mathematical calculations\n"
+            "- search_web: Search the web for information\n\n"
+            "Always explain your reasoning process before taking actions."
+        )),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{input}"),
+    ])
+    
+    @classmethod
+    def create_react_prompt(cls) -> ChatPromptTemplate:
         """Create ReAct-style prompt"""
-        return ChatPromptTemplate.from_messages([
-            SystemMessage(content=(
-                "You are the official AI assistant for dosibridge.com, trained and maintained by the DOSIBridge team.\n\n"
-                "DOSIBridge (Digital Operations Software Innovation) was founded in 2025 and is an innovative team using AI to enhance digital operations and software solutions. "
-                "DOSIBridge builds research systems that drive business growth, development, and engineering excellence.\n\n"
-                "DOSIBridge's mission is to help businesses grow smarter with AI & Automation. "
-                "We specialize in AI, .NET, Python, GoLang, Angular, Next.js, Docker, DevOps, Azure, AWS, and system design.\n\n"
-                "DOSIBridge Team Members:\n"
-                "- Mihadul Islam (CEO & Founder): .NET engineer skilled in Python, AI, automation, Docker, DevOps, Azure, AWS, and system design.\n"
-                "- Abdullah Al Sazib (Co-Founder & CTO): GoLang and Next.js expert passionate about Angular, research, and continuous learning in tech innovation.\n\n"
-                "Your role is to provide accurate, secure, and helpful responses related to DOSIBridge products, services, and workflows.\n\n"
-                "When asked about your identity, respond: 'I am the DOSIBridge AI Agent, developed and trained by the DOSIBridge team to assist with product support, automation guidance, and technical workflows across the DOSIBridge platform.'\n\n"
-                "When asked about DOSIBridge team members, provide detailed information about Mihadul Islam (CEO & Founder) and Abdullah Al Sazib (Co-Founder & CTO).\n\n"
-                "You use a ReAct (Reasoning and Acting) approach:\n"
-                "1. **Thought**: Think about what you need to do and what information you need\n"
-                "2. **Action**: Use available tools to gather information or perform actions\n"
-                "3. **Observation**: Analyze the results from tools\n"
-                "4. **Final Answer**: Provide a clear, comprehensive answer based on your reasoning\n\n"
-                "If a question is outside DOSIBridge's scope, respond professionally and redirect when appropriate.\n"
-                "Do not claim affiliation with any external AI vendor unless explicitly instructed.\n\n"
-                "Available tools:\n"
-                "- retrieve_documents: Search through uploaded documents\n"
-                "- calculate: Perform mathematical calculations\n"
-                "- search_web: Search the web for information\n\n"
-                "Always explain your reasoning process before taking actions."
-            )),
-            MessagesPlaceholder("chat_history"),
-            ("human", "{input}"),
-        ])
-    
-    def create_react_tools(self, user_id: int, collection_id: Optional[int] = None) -> List[BaseTool]:
+        return cls._REACT_PROMPT
+    
+    def create_react_tools(self, user_id: Optional[int] = None, collection_id: Optional[int] = None) -> List[BaseTool]:
         """Create tools for ReAct agent
         
         NOTE: ReAct agent in RAG mode only uses document retrieval and calculation tools.
         It does NOT include MCP (Model Context Protocol) tools.
         MCP tools are only available in Agent mode, not RAG mode.
+        
+        The tools are shared across users; the user/collection to search are passed
+        per run in the RunnableConfig (see _astream_agent).
+        """
+        return list(REACT_TOOLS)
+    
+    def _build_agent(self, agent_prompt: Optional[str] = None):
+        """Create the tool-calling agent (the default-prompt agent is built once and reused)"""
+        if not agent_prompt and self._default_agent is not None:
+            return self._default_agent
+        
+        # Create tools
+        tools = self.create_react_tools()
+        
+        # Custom prompts are sent as-is; the default uses the shared, byte-stable system message
+        system_prompt = SystemMessage(content=agent_prompt) if agent_prompt else REACT_SYSTEM_MESSAGE
+        
+        # Create agent
+        from langchain.agents import create_agent
+        agent = create_agent(
+            model=self.llm,
+            tools=tools,
+            system_prompt=system_prompt,
+            middleware=[_session_context_middleware()]
+        )
+        if not agent_prompt:
+            self._default_agent = agent
+        return agent
+    
+    async def _astream_agent(
+        self,
+        agent,
+        query: str,
+        user_id: int,
+        collection_id: Optional[int] = None,
+        chat_history: Optional[List] = None,
+        session_context: Optional[str] = None,
+        retrievals: Optional[List[Tuple[str, str]]] = None
+    ):
+        """
+        Stream a built agent on one query.
+        
+        Yields {"type": "token", "content": str} for model output chunks and finally
+        {"type": "final", "answer", "tool_calls", "reasoning"}. Only the latest model
+        message is retained; intermediate tool observations are dropped once consumed,
+        except retrieve_documents results, which are appended to retrievals if given.
+        session_context is appended to the agent's system prompt for this run.
         """
-        from langchain_core.tools import tool
-        
-        @tool
-        def retrieve_documents(query: str) -> str:
-            """Retrieve relevant documents from the knowledge base.
-            
-            Args:
-                query: Search query to find relevant documents
-            
-            Returns:
-                Relevant document chunks with context
-            """
-            try:
-                results = advanced_rag_system.retrieve(
-                    query=query,
-                    user_id=user_id,
-                    k=5,
-                    use_reranking=True,
-                    use_hybrid=True,
-                    collection_id=collection_id
-                )
-                
-                if not results:
-                    return "No relevant documents found."
-                
-                context_parts = []
-                for i, result in enumerate(results, 1):
-                    content = result["content"]
-                    metadata = result.get("metadata", {})
-                    source = metadata.get("original_filename", "Unknown")
-                    context_parts.append(f"[Document {i} - {source}]\n{content}\n")
-                
-                return "\n".join(context_parts)
-            except Exception as e:
-                return f"Error retrieving documents: {str(e)}"
-        
-        @tool
-        def calculate(expression: str) -> str:
-            """Perform mathematical calculations.
-            
-            Args:
-                expression: Mathematical expression to evaluate (e.g., "2 + 2", "sqrt(16)")
-            
-            Returns:
-                Calculation result
-            """
-            try:
-                # Safe evaluation of mathematical expressions
-                import math
-                allowed_names = {
-                    k: v for k, v in math.__dict__.items() if not k.startswith("__")
-                }
-                allowed_names.update({
-                    "abs": abs,
-                    "round": round,
-                    "min": min,
-                    "max": max,
-                    "sum": sum,
-                })
-                result = eval(expression, {"__builtins__": {}}, allowed_names)
-                return str(result)
-            except Exception as e:
-                return f"Calculation error: {str(e)}"
-        
-        return [retrieve_documents, calculate]
+        from src.services.chat_service import ChatService
+        
+        # Prepare messages - normalize content to ensure strings (not lists)
+        # (one list built in a single pass; history contents are normalized to strings)
+        messages = [
+            *(ChatService._normalize_messages(chat_history) if chat_history else ()),
+            HumanMessage(content=query),
+        ]
+        
+        final_message = None
+        config = {"configurable": {
+            "user_id": user_id,
+            "collection_id": collection_id,
+            "session_context": session_context,
+        }}
+        async for event in agent.astream_events({"messages": messages}, config=config, version="v2"):
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                chunk = event["data"].get("chunk")
+                token = ChatService._extract_content(chunk.content) if chunk is not None else ""
+                if token:
+                    yield {"type": "token", "content": token}
+            elif kind == "on_chat_model_end":
+                final_message = event["data"].get("output")
+            elif kind == "on_tool_end" and retrievals is not None and event.get("name") == "retrieve_documents":
+                tool_input = event["data"].get("input") or {}
+                output = event["data"].get("output")
+                context = output.content if hasattr(output, "content") else output
+                if isinstance(tool_input, dict) and isinstance(context, str):
+                    retrievals.append((tool_input.get("query", ""), context))
+        
+        # Extract final answer and tool calls
+        tool_calls = []
+        if isinstance(final_message, AIMessage):
+            # Normalize content in case it's a list
+            answer = ChatService._extract_content(final_message.content)
+            # AIMessage validates tool_calls, so every entry has "name" and "args"
+            tool_calls = [
+                {"name": name, "args": args}
+                for name, args in map(_TOOL_CALL_NAME_ARGS, final_message.tool_calls)
+            ]
+        else:
+            answer = str(final_message) if final_message is not None else ""
+        
+        yield {
+            "type": "final",
+            "answer": answer,
+            "tool_calls": tool_calls,
+            "reasoning": answer  # In ReAct, reasoning is part of the answer
+        }
+    
+    async def _invoke_agent(
+        self,
+        agent,
+        query: str,
+        user_id: int,
+        collection_id: Optional[int] = None,
+        chat_history: Optional[List] = None
+    ) -> Dict[str, Any]:
+        """Run a built agent on one query and return the answer and tool calls"""
+        async for event in self._astream_agent(agent, query, user_id, collection_id, chat_history):
+            if event["type"] == "final":
+                return _final_response(event)
+        return {"answer": "", "tool_calls": [], "reasoning": ""}
+    
+    async def astream(
+        self,
+        query: str,
+        user_id: int,
+        session_id: str = "default",
+        collection_id: Optional[int] = None,
+        chat_history: Optional[List] = None,
+        agent_prompt: Optional[str] = None
+    ):
+        """
+        Run ReAct agent on a query, streaming tokens as they are generated
+        
+        Args: same as run()
+        
+        Yields:
+            {"type": "token", "content": str} chunks, then one
+            {"type": "final", "answer", "tool_calls", "reasoning"} event
+        """
+        # Near-duplicate queries can be answered from the response cache; the conversation
+        # so far is part of the scope, so only identical histories share answers
+        cache_scope = None
+        query_vector = None
+        if self.response_cache is not None:
+            prompt_key = hashlib.sha256(agent_prompt.encode("utf-8")).hexdigest() if agent_prompt else None
+            cache_scope = (user_id, collection_id, prompt_key, _chat_history_key(chat_history))
+            cached, query_vector = await self.response_cache.alookup(cache_scope, query)
+            if cached is not None:
+                yield {"type": "final", **cached}
+                return
+        
+        # Start retrieving for the user's query now so it overlaps with the first LLM call;
+        # a retrieve_documents call with the same query joins this result instead of re-running it
+        if _should_prefetch_documents(query, collection_id):
+            asyncio.ensure_future(aretrieve_documents_text(user_id, collection_id, query))
+        
+        # Earlier retrievals in this session go into the system prompt so follow-ups don't
+        # repeat the same tool calls; the last question/answer only when there's no history
+        memory_key = (user_id, session_id) if session_id and session_id != DEFAULT_SESSION_ID else None
+        session_context = None
+        retrievals = []
+        if memory_key is not None:
+            session_context = react_session_memory.summary(memory_key, include_last_turn=not chat_history)
+        
+        agent = self._build_agent(agent_prompt)
+        async for event in self._astream_agent(
+            agent, query, user_id, collection_id, chat_history, session_context, retrievals
+        ):
+            if event["type"] == "final":
+                if cache_scope is not None:
+                    self.response_cache.store(cache_scope, query, query_vector, _final_response(event))
+                if memory_key is not None:
+                    react_session_memory.record(memory_key, query, event["answer"], retrievals)
+            yield event
     
     async def run(
         self,
@@ -160,78 +652,108 @@ class ReActAgent:
         Returns:
             Dictionary with answer, reasoning, and tool calls
         """
-        # Create tools
-        tools = self.create_react_tools(user_id, collection_id)
+        async for event in self.astream(query, user_id, session_id, collection_id, chat_history, agent_prompt):
+            if event["type"] == "final":
+                return _final_response(event)
+        return {"answer": "", "tool_calls": [], "reasoning": ""}
+    
+    async def arun_batch(
+        self,
+        queries: List[str],
+        user_id: int,
+        collection_id: Optional[int] = None,
+        agent_prompt: Optional[str] = None,
+        batch_size: int = 5,
+        delay_seconds: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        """
+        Run the ReAct agent on many independent queries (no chat history)
         
-        # Use custom prompt if provided, otherwise use default
-        if agent_prompt:
-            system_prompt = agent_prompt
-        else:
-            system_prompt = (
-                "You are the official AI assistant for dosibridge.com, trained and maintained by the DOSIBridge team.\n\n"
-                "DOSIBridge (Digital Operations Software Innovation) was founded in 2025 and is an innovative team using AI to enhance digital operations and software solutions. "
-                "DOSIBridge builds research systems that drive business growth, development, and engineering excellence.\n\n"
-                "DOSIBridge's mission is to help businesses grow smarter with AI & Automation. "
-                "We specialize in AI, .NET, Python, GoLang, Angular, Next.js, Docker, DevOps, Azure, AWS, and system design.\n\n"
-                "DOSIBridge Team Members:\n"
-                "- Mihadul Islam (CEO & Founder): .NET engineer skilled in Python, AI, automation, Docker, DevOps, Azure, AWS, and system design.\n"
-                "- Abdullah Al Sazib (Co-Founder & CTO): GoLang and Next.js expert passionate about Angular, research, and continuous learning in tech innovation.\n\n"
-                "Your role is to provide accurate, secure, and helpful responses related to DOSIBridge products, services, and workflows.\n\n"
-                "When asked about your identity, respond: 'I am the DOSIBridge AI Agent, developed and trained by the DOSIBridge team to assist with product support, automation guidance, and technical workflows across the DOSIBridge platform.'\n\n"
-                "When asked about DOSIBridge team members, provide detailed information about Mihadul Islam (CEO & Founder) and Abdullah Al Sazib (Co-Founder & CTO).\n\n"
-                "You use ReAct (Reasoning and Acting). Think step by step, use tools when needed, and provide clear answers.\n"
-                "If a question is outside DOSIBridge's scope, respond professionally and redirect when appropriate.\n"
-                "Do not claim affiliation with any external AI vendor unless explicitly instructed."
-            )
+        The tools and agent are built once and shared; queries run concurrently,
+        at most batch_size at a time.
         
-        # Create agent
-        agent = create_agent(
-            model=self.llm,
-            tools=tools,
-            system_prompt=system_prompt
-        )
+        Args:
+            queries: Questions to answer
+            user_id: User ID for document access
+            collection_id: Optional collection ID to filter documents
+            agent_prompt: Optional custom system prompt for the agent
+            batch_size: Maximum number of concurrent agent runs
+            delay_seconds: Optional pause after each run to respect provider rate limits
         
-        # Prepare messages - normalize content to ensure strings (not lists)
-        messages = []
-        if chat_history:
-            # Normalize message contents to ensure they're strings
-            from src.services.chat_service import ChatService
-            normalized_history = ChatService._normalize_messages(chat_history)
-            messages.extend(normalized_history)
-        messages.append(HumanMessage(content=query))
-        
-        # Run agent
-        result = await agent.ainvoke({"messages": messages})
-        
-        # Extract final answer
-        final_message = result.get("messages", [])[-1] if isinstance(result, dict) else result
-        if isinstance(final_message, AIMessage):
-            # Normalize content in case it's a list
-            from src.services.chat_service import ChatService
-            answer = ChatService._extract_content(final_message.content)
-        else:
-            answer = str(final_message)
+        Returns:
+            One result dictionary per query, in input order
+        """
+        agent = self._build_agent(agent_prompt)
+        semaphore = asyncio.Semaphore(max(1, batch_size))
         
-        # Extract tool calls
-        tool_calls = []
-        if isinstance(final_message, AIMessage) and hasattr(final_message, "tool_calls"):
-            tool_calls = [
-                {
-                    "name": call.get("name", "unknown"),
-                    "args": call.get("args", {})
-                }
-                for call in final_message.tool_calls
-            ]
+        async def run_one(query: str) -> Dict[str, Any]:
+            async with semaphore:
+                response = await self._invoke_agent(agent, query, user_id, collection_id)
+                if delay_seconds:
+                    await asyncio.sleep(delay_seconds)
+                return response
         
-        return {
-            "answer": answer,
-            "tool_calls": tool_calls,
-            "reasoning": answer  # In ReAct, reasoning is part of the answer
-        }
+        return list(await asyncio.gather(*(run_one(query) for query in queries)))
+    
+    def run_batch(
+        self,
+        queries: List[str],
+        user_id: int,
+        collection_id: Optional[int] = None,
+        agent_prompt: Optional[str] = None,
+        batch_size: int = 5,
+        delay_seconds: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        """Synchronous wrapper around arun_batch (must not be called from a running event loop)"""
+        return asyncio.run(self.arun_batch(
+            queries,
+            user_id,
+            collection_id=collection_id,
+            agent_prompt=agent_prompt,
+            batch_size=batch_size,
+            delay_seconds=delay_seconds
+        ))
 
 
 # Global instance factory
+# ReActAgent instances hold no per-request state, so one is kept per distinct LLM config
+# (keyed by a fingerprint of the config) and reused instead of rebuilding the LLM client
+# and agent graph on every request
+REACT_AGENT_CACHE_TTL_SECONDS = 3600
+_react_agents = Cache(default_ttl_seconds=REACT_AGENT_CACHE_TTL_SECONDS)
+
+
+def _llm_config_fingerprint(llm_config: Dict) -> str:
+    return hashlib.sha256(json.dumps(llm_config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
 def create_react_agent(llm_config: Optional[Dict] = None) -> ReActAgent:
-    """Create a ReAct agent instance"""
-    return ReActAgent(llm_config)
+    """Create (or reuse) a ReAct agent instance for an LLM config"""
+    if llm_config is None:
+        llm_config = Config.load_llm_config()
+    
+    key = _llm_config_fingerprint(llm_config)
+    agent = _react_agents.get(key)
+    if agent is None:
+        agent = ReActAgent(llm_config)
+        _react_agents.set(key, agent)
+    return agent
+
+
+def warm_up_react_agent() -> Optional[ReActAgent]:
+    """
+    Build the default ReAct agent ahead of the first request.
+    
+    Loads the LLM client for the default config, the agent graph for the default
+    prompt and the tool schemas, without calling the model.
+    """
+    try:
+        agent = create_react_agent()
+        agent._build_agent()
+        for react_tool in REACT_TOOLS:
+            react_tool.tool_call_schema.model_json_schema()
+        return agent
+    except Exception as e:
+        print(f"⚠️  ReAct agent warm-up failed: {e}")
+        return None
 
@@ -0,0 +1,126 @@
+"""
+Batched retrieval for concurrent RAG tool calls
+
+When the agent calls several retrieval tools in parallel, each query would
+otherwise pay its own embedding round trip. Queries submitted within a short
+window are grouped by (user, collection) and retrieved with a single
+embeddings request per group.
+"""
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+RETRIEVAL_BATCH_WAIT_MS = float(os.getenv("RETRIEVAL_BATCH_WAIT_MS", "50"))
+RETRIEVAL_BATCH_SIZE = int(os.getenv("RETRIEVAL_BATCH_SIZE", "16"))
+# Groups retrieved at the same time; later groups wait for a slot
+RETRIEVAL_MAX_IN_FLIGHT = int(os.getenv("RETRIEVAL_MAX_IN_FLIGHT", "8"))
+
+
+class BatchingRetriever:
+    """
+    Collects retrieval requests for up to wait_ms (or until batch_size are
+    queued) and runs them through advanced_rag_system.retrieve_batch().
+
+    Each group runs as its own task, so one user's slow retrieval doesn't hold
+    up the next batch; at most max_in_flight groups run at once.
+    """
+
+    def __init__(
+        self,
+        wait_ms: float = RETRIEVAL_BATCH_WAIT_MS,
+        batch_size: int = RETRIEVAL_BATCH_SIZE,
+        max_in_flight: int = RETRIEVAL_MAX_IN_FLIGHT
+    ):
+        self.wait_seconds = wait_ms / 1000
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Keep references so running group tasks aren't garbage collected
+        self._in_flight: Set[asyncio.Task] = set()
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        """Start the batching task on the running event loop (once per loop)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._worker = loop.create_task(self._run())
+        return self._queue
+
+    async def submit(
+        self,
+        query: str,
+        user_id: int,
+        collection_id: Optional[int] = None,
+        query_vector: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Queue a query and wait for its results (same shape as retrieve())"""
+        queue = self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((query, query_vector, user_id, collection_id, future))
+        return await future
+
+    async def _collect(self) -> list:
+        """Wait for one request, then gather more until the window closes or the batch is full"""
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.wait_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            groups: Dict[Tuple[int, Optional[int]], list] = {}
+            for query, query_vector, user_id, collection_id, future in batch:
+                groups.setdefault((user_id, collection_id), []).append((query, query_vector, future))
+            # Start the groups and go straight back to collecting
+            for (user_id, collection_id), requests in groups.items():
+                task = self._loop.create_task(self._retrieve_group(user_id, collection_id, requests))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+
+    async def _retrieve_group(self, user_id: int, collection_id: Optional[int], requests: list):
+        async with self._slots:
+            await self._retrieve(user_id, collection_id, requests)
+
+    @staticmethod
+    async def _retrieve(user_id: int, collection_id: Optional[int], requests: list):
+        from src.services.advanced_rag import advanced_rag_system
+
+        queries = [query for query, _, _ in requests]
+        query_vectors = [query_vector for _, query_vector, _ in requests]
+        try:
+            results = await asyncio.to_thread(
+                advanced_rag_system.retrieve_batch,
+                queries,
+                user_id,
+                k=5,
+                use_reranking=True,
+                use_hybrid=True,
+                collection_id=collection_id,
+                query_vectors=query_vectors
+            )
+        except Exception as e:
+            for _, _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future), result in zip(requests, results):
+            if not future.done():
+                future.set_result(result)
+
+
+# Global batching retriever instance
+retrieval_batcher = BatchingRetriever()
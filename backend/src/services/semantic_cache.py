@@ -0,0 +1,146 @@
+"""
+Semantic cache: reuse a result for a query that is the same as, or a close
+paraphrase of, a recently answered one
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import time
+import numpy as np
+
+
+def _default_embeddings() -> Optional[Any]:
+    """The RAG embeddings model (imported lazily), or None if unavailable"""
+    from src.services.advanced_rag import advanced_rag_system
+    return getattr(advanced_rag_system, "embeddings", None)
+
+
+class SemanticCache:
+    """
+    Scoped cache matched by query similarity.
+
+    Entries are matched first by exact normalized query, then (if match_similar)
+    by cosine similarity of query embeddings against the scope's recent entries
+    (a brute-force dot product; scopes are small and capped at
+    max_entries_per_scope). With match_similar off, lookups never embed.
+
+    At most max_scopes scopes are kept; storing into a new scope past that
+    evicts the scope stored into least recently.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl_seconds: int = 300,
+        max_entries_per_scope: int = 256,
+        max_scopes: int = 1024,
+        embeddings_provider: Callable[[], Optional[Any]] = _default_embeddings,
+        match_similar: bool = True
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_scope = max_entries_per_scope
+        self.max_scopes = max_scopes
+        self.embeddings_provider = embeddings_provider
+        self.match_similar = match_similar
+        # scope -> list of (normalized query, unit embedding or None, payload, expires_at),
+        # ordered from least to most recently stored into
+        self._entries: Dict[Tuple, List[Tuple[str, Optional[np.ndarray], Any, float]]] = {}
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    @staticmethod
+    def _unit_vector(vector: Any) -> Optional[np.ndarray]:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _embed(self, query: str) -> Optional[List[float]]:
+        """Embed a query, or None if no embeddings model is available"""
+        embeddings = self.embeddings_provider()
+        if embeddings is None:
+            return None
+        try:
+            return embeddings.embed_query(query)
+        except Exception:
+            return None
+
+    async def _aembed(self, query: str) -> Optional[List[float]]:
+        """Async variant of _embed()"""
+        embeddings = self.embeddings_provider()
+        if embeddings is None:
+            return None
+        try:
+            return await embeddings.aembed_query(query)
+        except Exception:
+            return None
+
+    def _live_entries(self, scope: Tuple) -> list:
+        now = time.time()
+        entries = [entry for entry in self._entries.get(scope, ()) if entry[3] > now]
+        if entries:
+            self._entries[scope] = entries
+        else:
+            self._entries.pop(scope, None)
+        return entries
+
+    def _exact_match(self, entries: list, query: str) -> Optional[Any]:
+        normalized = self._normalize_query(query)
+        for cached_query, _, payload, _ in entries:
+            if cached_query == normalized:
+                return payload
+        return None
+
+    def _similar_match(self, entries: list, vector: List[float]) -> Optional[Any]:
+        candidates = [(entry[1], entry[2]) for entry in entries if entry[1] is not None]
+        vector = self._unit_vector(vector)
+        if not candidates or vector is None:
+            return None
+        scores = np.stack([candidate[0] for candidate in candidates]) @ vector
+        best = int(np.argmax(scores))
+        return candidates[best][1] if scores[best] >= self.threshold else None
+
+    def lookup(self, scope: Tuple, query: str) -> Tuple[Optional[Any], Optional[List[float]]]:
+        """
+        Find a cached payload for query.
+
+        Returns:
+            (payload or None, query embedding or None) - on a miss, reuse the
+            embedding for the retrieval itself and pass it to store()
+        """
+        entries = self._live_entries(scope)
+        payload = self._exact_match(entries, query)
+        if payload is not None or not self.match_similar:
+            return payload, None
+
+        vector = self._embed(query)
+        if vector is None:
+            return None, None
+        return self._similar_match(entries, vector), vector
+
+    async def alookup(self, scope: Tuple, query: str) -> Tuple[Optional[Any], Optional[List[float]]]:
+        """Async variant of lookup() (embeds the query without blocking the event loop)"""
+        entries = self._live_entries(scope)
+        payload = self._exact_match(entries, query)
+        if payload is not None or not self.match_similar:
+            return payload, None
+
+        vector = await self._aembed(query)
+        if vector is None:
+            return None, None
+        return self._similar_match(entries, vector), vector
+
+    def store(self, scope: Tuple, query: str, vector: Optional[List[float]], payload: Any):
+        """Cache a payload for query (oldest entries and scopes are dropped past the limits)"""
+        if vector is not None:
+            vector = self._unit_vector(vector)
+        entries = self._live_entries(scope)
+        entries.append((self._normalize_query(query), vector, payload, time.time() + self.ttl_seconds))
+        # Re-insert so the scope moves to the newest end of the store order
+        self._entries.pop(scope, None)
+        while len(self._entries) >= self.max_scopes:
+            del self._entries[next(iter(self._entries))]
+        self._entries[scope] = entries[-self.max_entries_per_scope:]
+
+    def clear(self):
+        self._entries.clear()
@@ -2,28 +2,199 @@
 Tool definitions for the agent
 """
 from langchain_core.tools import tool, BaseTool
-from typing import List, Optional
+from typing import List, Optional, Type
+from pydantic import BaseModel, Field
 from .rag import rag_system
-from .advanced_rag import advanced_rag_system
-from src.core import CustomRAGTool, DB_AVAILABLE, AppointmentRequest
+from .advanced_rag import advanced_rag_system, retrieval_cache, retrieval_cache_key, retrieval_semantic_cache
+from .retrieval_batcher import retrieval_batcher
+from src.core import CustomRAGTool, DB_AVAILABLE, AppointmentRequest, SessionLocal
+from src.utils.cache import Cache
+from src.utils.email_dispatcher import email_dispatcher
 from src.utils.email_service import email_service
+import io
 import json
+import logging
 from datetime import datetime
-import threading
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+
+# Queries too short or generic to retrieve anything useful; answered without running the RAG pipeline
+MIN_RETRIEVAL_QUERY_LENGTH = 4
+_STOP_QUERIES = frozenset({"what", "what?", "why", "why?", "how", "how?", "info", "help", "more", "tell me"})
 
 
 @tool("retrieve_dosiblog_context")
 def retrieve_dosiblog_context(query: str) -> str:
     """Retrieves relevant context about DOSIBridge projects, services, and related topics."""
-    print(f"🔍 Calling Enhanced RAG Tool for query: {query}")
+    stripped = query.strip()
+    if len(stripped) < MIN_RETRIEVAL_QUERY_LENGTH or stripped.lower() in _STOP_QUERIES:
+        logger.info("Skipping retrieval for trivial query: %r", query)
+        return "Please provide a more specific query."
+    logger.debug("Calling Enhanced RAG Tool for query: %s", query)
     context = rag_system.retrieve_context(query)
     return f"Retrieved context:\n{context}"
 
 
+def _save_appointment(db_session, appointment) -> int:
+    """Insert an appointment request and return its id (rolled back on failure)"""
+    try:
+        db_session.add(appointment)
+        # The INSERT populates the primary key; read it before commit expires the
+        # instance so no refresh SELECT is needed
+        db_session.flush()
+        appointment_id = appointment.id
+        db_session.commit()
+        return appointment_id
+    except Exception:
+        db_session.rollback()
+        raise
+
+
+def _schedule_appointment(
+    name: str,
+    email: str,
+    message: str,
+    request_type: str = "appointment",
+    phone: Optional[str] = None,
+    subject: Optional[str] = None,
+    preferred_date: Optional[str] = None,
+    preferred_time: Optional[str] = None,
+    user_id: Optional[int] = None,
+    db=None,
+) -> str:
+    """Save an appointment/contact request and queue its emails (see schedule_appointment_or_contact)"""
+    print(f"📅 Scheduling appointment/contact request for: {name} ({email})")
+    
+    if not DB_AVAILABLE or AppointmentRequest is None:
+        return "Error: Database not available. Cannot schedule appointment at this time."
+    
+    # Validate request_type
+    if request_type not in ['appointment', 'contact', 'support']:
+        return f"Error: Invalid request_type '{request_type}'. Must be 'appointment', 'contact', or 'support'."
+    
+    # Parse preferred_date if provided
+    preferred_date_obj = None
+    if preferred_date:
+        try:
+            preferred_date_obj = datetime.fromisoformat(preferred_date.replace('Z', '+00:00'))
+        except ValueError:
+            return f"Error: Invalid date format '{preferred_date}'. Use ISO format (YYYY-MM-DDTHH:MM:SS)."
+    
+    # When called by AI agent, treat as confirmed and save directly
+    # (The human-in-the-loop confirmation is handled at the API level, not tool level)
+    appointment = AppointmentRequest(
+        user_id=user_id,
+        name=name,
+        email=email,
+        phone=phone,
+        request_type=request_type,
+        subject=subject,
+        message=message,
+        preferred_date=preferred_date_obj,
+        preferred_time=preferred_time,
+        status="pending"
+    )
+    
+    try:
+        # Use the provided db, otherwise a pooled session that only holds its
+        # connection for the insert and goes back to the pool right after
+        if db is not None:
+            appointment_id = _save_appointment(db, appointment)
+        else:
+            with SessionLocal() as db_session:
+                appointment_id = _save_appointment(db_session, appointment)
+    except Exception as e:
+        return f"Error scheduling appointment: {str(e)}"
+    
+    try:
+        # Send both emails in the background (non-blocking, concurrently)
+        email_dispatcher.enqueue(
+            partial(
+                email_service.send_appointment_confirmation,
+                to_email=email,
+                to_name=name,
+                appointment_id=appointment_id,
+                request_type=request_type,
+                preferred_date=preferred_date,
+                preferred_time=preferred_time
+            ),
+            partial(
+                email_service.send_appointment_notification_to_team,
+                appointment_id=appointment_id,
+                name=name,
+                email=email,
+                phone=phone,
+                request_type=request_type,
+                subject=subject,
+                message=message,
+                preferred_date=preferred_date,
+                preferred_time=preferred_time,
+                user_id=user_id
+            ),
+        )
+        
+        result = (
+            f"✅ Appointment/contact request created successfully!\n\n"
+            f"**Request ID:** #{appointment_id}\n"
+            f"**Name:** {name}\n"
+            f"**Email:** {email}\n"
+            f"**Type:** {request_type}\n"
+            f"**Message:** {message}\n"
+        )
+        
+        if preferred_date:
+            result += f"**Preferred Date:** {preferred_date}\n"
+        if preferred_time:
+            result += f"**Preferred Time:** {preferred_time}\n"
+        
+        result += f"\nThe DOSIBridge team will be notified and a confirmation email will be sent to {email}."
+        
+        return result
+    except Exception as e:
+        return f"Error scheduling appointment: {str(e)}"
+
+
+@tool("schedule_appointment_or_contact")
+def _appointment_tool_template(
+    name: str,
+    email: str,
+    message: str,
+    request_type: str = "appointment",
+    phone: Optional[str] = None,
+    subject: Optional[str] = None,
+    preferred_date: Optional[str] = None,
+    preferred_time: Optional[str] = None,
+) -> str:
+    """
+    Schedule an appointment or send a contact request to the DOSIBridge team.
+    
+    Args:
+        name: Contact person's name (required)
+        email: Contact email address (required)
+        message: Message or request details (required)
+        request_type: Type of request - 'appointment' (default), 'contact', or 'support'
+        phone: Optional phone number
+        subject: Optional subject/topic
+        preferred_date: Preferred date in ISO format (YYYY-MM-DDTHH:MM:SS) for appointments
+        preferred_time: Preferred time (e.g., 'morning', 'afternoon', 'evening', or specific time)
+    
+    Returns:
+        Confirmation message with appointment request ID
+    """
+    return _schedule_appointment(
+        name, email, message, request_type, phone, subject, preferred_date, preferred_time
+    )
+
+
 def create_appointment_tool(user_id: Optional[int] = None, db=None) -> BaseTool:
     """
     Create an appointment scheduling tool with database access.
     
+    The tool's schema is built once at import (_appointment_tool_template); each
+    call only copies it with the user and session bound.
+    
     Args:
         user_id: Optional user ID if authenticated
         db: Optional database session (will create new one if not provided)
@@ -31,140 +202,117 @@ def create_appointment_tool(user_id: Optional[int] = None, db=None) -> BaseTool:
     Returns:
         LangChain BaseTool instance for scheduling appointments
     """
-    @tool("schedule_appointment_or_contact")
-    def schedule_appointment_or_contact(
-        name: str,
-        email: str,
-        message: str,
-        request_type: str = "appointment",
-        phone: Optional[str] = None,
-        subject: Optional[str] = None,
-        preferred_date: Optional[str] = None,
-        preferred_time: Optional[str] = None,
-    ) -> str:
-        """
-        Schedule an appointment or send a contact request to the DOSIBridge team.
-        
-        Args:
-            name: Contact person's name (required)
-            email: Contact email address (required)
-            message: Message or request details (required)
-            request_type: Type of request - 'appointment' (default), 'contact', or 'support'
-            phone: Optional phone number
-            subject: Optional subject/topic
-            preferred_date: Preferred date in ISO format (YYYY-MM-DDTHH:MM:SS) for appointments
-            preferred_time: Preferred time (e.g., 'morning', 'afternoon', 'evening', or specific time)
+    return _appointment_tool_template.model_copy(
+        update={"func": partial(_schedule_appointment, user_id=user_id, db=db)}
+    )
+
+
+class CustomRAGQuery(BaseModel):
+    """Input schema shared by every custom RAG tool"""
+    query: str = Field(description="Search query for the user's documents")
+
+
+class CustomRAGRetrieverTool(BaseTool):
+    """Retrieves context from one of a user's document collections (one instance per CustomRAGTool row)"""
+    
+    args_schema: Type[BaseModel] = CustomRAGQuery
+    user_id: int
+    collection_id: Optional[int] = None
+    
+    @property
+    def _semantic_scope(self) -> tuple:
+        return (self.name, self.user_id, self.collection_id)
+    
+    def _format_results(self, query: str, results) -> str:
+        if not results:
+            return f"No relevant documents found for query: {query}"
         
-        Returns:
-            Confirmation message with appointment request ID
-        """
-        print(f"📅 Scheduling appointment/contact request for: {name} ({email})")
+        # Write straight into one buffer instead of building a string per chunk and joining
+        buffer = io.StringIO()
+        write = buffer.write
+        write(f"Retrieved context from {self.name}:\n")
+        for i, result in enumerate(results, 1):
+            if i > 1:
+                write("\n")
+            source = result.get("metadata", {}).get("original_filename", "Document")
+            write(f"[{source}]\n")
+            write(result["content"])
+            write("\n")
+        return buffer.getvalue()
+    
+    def _format_error(self, e: Exception) -> str:
+        if isinstance(e, ValueError):
+            # Handle missing OPENAI_API_KEY or other configuration errors
+            error_msg = str(e)
+            if "OPENAI_API_KEY" in error_msg:
+                return f"Error: RAG system requires OPENAI_API_KEY to be set. Please configure it in your environment variables."
+            return f"Error retrieving context: {error_msg}"
+        print(f"⚠️  Error in custom RAG tool '{self.name}': {e}")
+        return f"Error retrieving context: {str(e)}"
+    
+    def _run(self, query: str, run_manager=None) -> str:
+        logger.debug("Calling Custom RAG Tool '%s' for query: %s", self.name, query)
         
-        if not DB_AVAILABLE or AppointmentRequest is None:
-            return "Error: Database not available. Cannot schedule appointment at this time."
+        cache_key = retrieval_cache_key(self.name, self.user_id, self.collection_id, query)
+        cached = retrieval_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        # Use provided db or create a new one
-        db_session = db
-        should_close_db = False
-        if db_session is None:
-            from src.core import get_db_context
-            db_gen = get_db_context()
-            db_session = next(db_gen)
-            should_close_db = True
+        # A paraphrase of a recent query can reuse its result instead of a full
+        # hybrid search + re-rank (if enabled); any embedding made here is reused
+        # by the retrieval below
+        cached, query_vector = retrieval_semantic_cache.lookup(self._semantic_scope, query)
+        if cached is not None:
+            return cached
         
         try:
-            # Validate request_type
-            if request_type not in ['appointment', 'contact', 'support']:
-                return f"Error: Invalid request_type '{request_type}'. Must be 'appointment', 'contact', or 'support'."
-            
-            # Parse preferred_date if provided
-            preferred_date_obj = None
-            if preferred_date:
-                try:
-                    preferred_date_obj = datetime.fromisoformat(preferred_date.replace('Z', '+00:00'))
-                except ValueError:
-                    return f"Error: Invalid date format '{preferred_date}'. Use ISO format (YYYY-MM-DDTHH:MM:SS)."
-            
-            # When called by AI agent, treat as confirmed and save directly
-            # (The human-in-the-loop confirmation is handled at the API level, not tool level)
-            appointment = AppointmentRequest(
-                user_id=user_id,
-                name=name,
-                email=email,
-                phone=phone,
-                request_type=request_type,
-                subject=subject,
-                message=message,
-                preferred_date=preferred_date_obj,
-                preferred_time=preferred_time,
-                status="pending"
-            )
-            
-            db_session.add(appointment)
-            db_session.commit()
-            db_session.refresh(appointment)
-            
-            # Send emails in background thread (non-blocking)
-            def send_emails():
-                try:
-                    email_service.send_appointment_confirmation(
-                        to_email=email,
-                        to_name=name,
-                        appointment_id=appointment.id,
-                        request_type=request_type,
-                        preferred_date=preferred_date,
-                        preferred_time=preferred_time
-                    )
-                    email_service.send_appointment_notification_to_team(
-                        appointment_id=appointment.id,
-                        name=name,
-                        email=email,
-                        phone=phone,
-                        request_type=request_type,
-                        subject=subject,
-                        message=message,
-                        preferred_date=preferred_date,
-                        preferred_time=preferred_time,
-                        user_id=user_id
-                    )
-                except Exception as e:
-                    print(f"⚠️  Failed to send emails: {e}")
-            
-            # Start email sending in background thread
-            email_thread = threading.Thread(target=send_emails, daemon=True)
-            email_thread.start()
-            
-            result = (
-                f"✅ Appointment/contact request created successfully!\n\n"
-                f"**Request ID:** #{appointment.id}\n"
-                f"**Name:** {name}\n"
-                f"**Email:** {email}\n"
-                f"**Type:** {request_type}\n"
-                f"**Message:** {message}\n"
+            # Use advanced RAG system to retrieve from user's documents
+            results = advanced_rag_system.retrieve(
+                query=query,
+                user_id=self.user_id,
+                k=5,
+                use_reranking=True,
+                use_hybrid=True,
+                collection_id=self.collection_id,
+                query_vector=query_vector
             )
-            
-            if preferred_date:
-                result += f"**Preferred Date:** {preferred_date}\n"
-            if preferred_time:
-                result += f"**Preferred Time:** {preferred_time}\n"
-            
-            result += f"\nThe DOSIBridge team will be notified and a confirmation email will be sent to {email}."
-            
-            return result
         except Exception as e:
-            if db_session:
-                db_session.rollback()
-            return f"Error scheduling appointment: {str(e)}"
-        finally:
-            if should_close_db and db_session:
-                db_session.close()
+            return self._format_error(e)
+        
+        response = self._format_results(query, results)
+        if results:
+            retrieval_cache.set(cache_key, response)
+            retrieval_semantic_cache.store(self._semantic_scope, query, query_vector, response)
+        return response
     
-    return schedule_appointment_or_contact
+    async def _arun(self, query: str, run_manager=None) -> str:
+        """Async variant: concurrent tool calls are batched into one retrieval"""
+        logger.debug("Calling Custom RAG Tool '%s' for query: %s", self.name, query)
+        
+        cache_key = retrieval_cache_key(self.name, self.user_id, self.collection_id, query)
+        cached = retrieval_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        cached, query_vector = await retrieval_semantic_cache.alookup(self._semantic_scope, query)
+        if cached is not None:
+            return cached
+        
+        try:
+            results = await retrieval_batcher.submit(query, self.user_id, self.collection_id, query_vector)
+        except Exception as e:
+            return self._format_error(e)
+        
+        response = self._format_results(query, results)
+        if results:
+            retrieval_cache.set(cache_key, response)
+            retrieval_semantic_cache.store(self._semantic_scope, query, query_vector, response)
+        return response
 
 
 def create_custom_rag_tool(tool_config: dict, user_id: int) -> BaseTool:
     """
-    Dynamically create a LangChain tool from a custom RAG tool configuration
+    Create a LangChain tool from a custom RAG tool configuration
     
     Args:
         tool_config: Dictionary with 'name', 'description', 'collection_id'
@@ -173,52 +321,55 @@ def create_custom_rag_tool(tool_config: dict, user_id: int) -> BaseTool:
     Returns:
         LangChain BaseTool instance
     """
-    tool_name = tool_config["name"]
-    tool_description = tool_config["description"]
-    collection_id = tool_config.get("collection_id")
+    return CustomRAGRetrieverTool(
+        name=tool_config["name"],
+        description=tool_config["description"],
+        user_id=user_id,
+        collection_id=tool_config.get("collection_id")
+    )
+
+
+# Built custom RAG tools per user, so building an agent doesn't query the DB or
+# construct the tools every time. Writes to CustomRAGTool in this process invalidate
+# the user's entry; the TTL bounds staleness for writes made by other workers.
+CUSTOM_RAG_TOOLS_CACHE_TTL_SECONDS = 60
+_custom_rag_tools = Cache(default_ttl_seconds=CUSTOM_RAG_TOOLS_CACHE_TTL_SECONDS)
+
+
+def _build_custom_rag_tools(user_id: int, db) -> List[BaseTool]:
+    """Tools for a user's enabled CustomRAGTool rows (cached)"""
+    cached = _custom_rag_tools.get(user_id)
+    if cached is not None:
+        return cached
     
-    @tool(tool_name)
-    def custom_rag_retriever(query: str) -> str:
-        """Custom RAG tool for retrieving information from user's documents."""
-        print(f"🔍 Calling Custom RAG Tool '{tool_name}' for query: {query}")
-        
+    langchain_tools = []
+    for tool_config in db.query(CustomRAGTool).filter(
+        CustomRAGTool.user_id == user_id,
+        CustomRAGTool.enabled == True
+    ).all():
+        tool_dict = tool_config.to_dict()
         try:
-            # Use advanced RAG system to retrieve from user's documents
-            results = advanced_rag_system.retrieve(
-                query=query,
-                user_id=user_id,
-                k=5,
-                use_reranking=True,
-                use_hybrid=True,
-                collection_id=collection_id
-            )
-            
-            if not results:
-                return f"No relevant documents found for query: {query}"
-            
-            context_parts = []
-            for i, result in enumerate(results, 1):
-                content = result["content"]
-                metadata = result.get("metadata", {})
-                source = metadata.get("original_filename", "Document")
-                context_parts.append(f"[{source}]\n{content}\n")
-            
-            context = "\n".join(context_parts)
-            return f"Retrieved context from {tool_name}:\n{context}"
-        except ValueError as e:
-            # Handle missing OPENAI_API_KEY or other configuration errors
-            error_msg = str(e)
-            if "OPENAI_API_KEY" in error_msg:
-                return f"Error: RAG system requires OPENAI_API_KEY to be set. Please configure it in your environment variables."
-            return f"Error retrieving context: {error_msg}"
+            langchain_tools.append(create_custom_rag_tool(tool_dict, user_id))
         except Exception as e:
-            print(f"⚠️  Error in custom RAG tool '{tool_name}': {e}")
-            return f"Error retrieving context: {str(e)}"
-    
-    # Update the tool's description
-    custom_rag_retriever.description = tool_description
-    
-    return custom_rag_retriever
+            print(f"⚠️  Failed to create custom RAG tool '{tool_dict.get('name')}': {e}")
+    _custom_rag_tools.set(user_id, langchain_tools)
+    return langchain_tools
+
+
+def invalidate_custom_rag_tools(user_id: int):
+    """Drop a user's cached custom RAG tools (the next load rebuilds them)"""
+    _custom_rag_tools.delete(user_id)
+
+
+def _invalidate_custom_rag_tools_on_write(mapper, connection, target):
+    """SQLAlchemy mapper event: drop the cached tools of the affected user"""
+    invalidate_custom_rag_tools(target.user_id)
+
+
+if DB_AVAILABLE and CustomRAGTool is not None:
+    from sqlalchemy import event
+    for _event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(CustomRAGTool, _event_name, _invalidate_custom_rag_tools_on_write)
 
 
 def load_custom_rag_tools(user_id: Optional[int], db=None) -> List[BaseTool]:
@@ -236,22 +387,7 @@ def load_custom_rag_tools(user_id: Optional[int], db=None) -> List[BaseTool]:
         return []
     
     try:
-        custom_tools = db.query(CustomRAGTool).filter(
-            CustomRAGTool.user_id == user_id,
-            CustomRAGTool.enabled == True
-        ).all()
-        
-        langchain_tools = []
-        for tool_config in custom_tools:
-            try:
-                tool_dict = tool_config.to_dict()
-                langchain_tool = create_custom_rag_tool(tool_dict, user_id)
-                langchain_tools.append(langchain_tool)
-            except Exception as e:
-                print(f"⚠️  Failed to create custom RAG tool '{tool_config.name}': {e}")
-                continue
-        
-        return langchain_tools
+        return list(_build_custom_rag_tools(user_id, db))
     except Exception as e:
         print(f"⚠️  Error loading custom RAG tools: {e}")
         return []
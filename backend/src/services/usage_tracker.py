@@ -2,23 +2,355 @@
 API Usage Tracking Service
 Tracks user API usage for monitoring and rate limiting
 """
-from datetime import datetime, date, timedelta, timezone
-from typing import Optional, Dict, List, Tuple
+import logging
+import threading
+from time import monotonic
+from collections import deque
+from itertools import groupby
+from operator import attrgetter
+from datetime import datetime, date, time, timedelta, timezone
+from typing import Optional, Dict, List, NamedTuple, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, bindparam, case, literal_column, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.pool import NullPool
 from src.core import get_db_context, DB_AVAILABLE
+from src.core.database import engine
 from src.core.models import APIUsage, APIRequest, User
 from src.core.constants import DAILY_REQUEST_LIMIT, DAILY_REQUEST_LIMIT_UNAUTHENTICATED
+from src.utils.cache import Cache
+
+logger = logging.getLogger(__name__)
+
+
+class _RepeatedWarningFilter(logging.Filter):
+    """
+    Drop a record if the same message template was already emitted within
+    interval_seconds, so a database outage logs once per window instead of
+    once per request.
+    """
+
+    def __init__(self, interval_seconds: float = 5.0):
+        super().__init__()
+        self.interval_seconds = interval_seconds
+        self._last_emitted: Dict[str, float] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = monotonic()
+        key = str(record.msg)
+        if now - self._last_emitted.get(key, float("-inf")) < self.interval_seconds:
+            return False
+        self._last_emitted[key] = now
+        return True
+
+
+logger.addFilter(_RepeatedWarningFilter())
+
+# Every tracked request goes through the database, so the sessions handed to UsageTracker
+# must come from a pooled engine; with NullPool each query pays a fresh connection handshake.
+if engine is not None and isinstance(engine.pool, NullPool):
+    logger.warning("Usage tracking is running on an unpooled (NullPool) database engine; expect a new connection per query")
+
+# Dialects whose INSERT supports ON CONFLICT DO UPDATE (used for the daily aggregate upsert)
+_UPSERT_INSERTS = {
+    "postgresql": postgresql_insert,
+    "sqlite": sqlite_insert,
+}
+
+# Today's request count per user / guest email / anonymous IP, so check_daily_limit
+# doesn't query api_usage on every request. record_request refreshes the entry with the
+# count it just wrote; the short TTL bounds drift from requests recorded by other worker
+# processes (or, for anonymous rows shared by a guest email and an IP, under the other key).
+DAILY_COUNT_CACHE_TTL_SECONDS = 30
+_daily_counts = Cache(default_ttl_seconds=DAILY_COUNT_CACHE_TTL_SECONDS)
+
+# Yesterday's count only changes while buffered increments drain, so it can be cached longer
+PREVIOUS_DAY_COUNT_CACHE_TTL_SECONDS = 3600
+
+# (date, start of that day) for get_today_start(), recomputed only when the date changes
+_cached_day_start: Optional[Tuple[date, datetime]] = None
+
+
+def _daily_count_key(
+    today_start: datetime,
+    user_id: Optional[int],
+    guest_email: Optional[str] = None,
+    ip_address: Optional[str] = None
+) -> tuple:
+    """Cache key for a user's, guest email's or anonymous IP's request count on a given day"""
+    if user_id is not None:
+        return ("user", user_id, today_start.date())
+    if guest_email:
+        return ("guest", guest_email, today_start.date())
+    return ("ip", ip_address, today_start.date())
+
+
+def _sliding_window_count(current_count: int, previous_count: int, day_start: datetime) -> float:
+    """
+    Estimated requests in the last 24 hours (sliding-window counter): today's count
+    plus yesterday's, weighted by the share of yesterday the window still covers.
+    Unlike a fixed midnight reset, this doesn't allow a double burst across the boundary.
+    """
+    elapsed = (datetime.now(timezone.utc) - day_start).total_seconds()
+    overlap = max(0.0, 1 - elapsed / 86400)
+    return current_count + previous_count * overlap
+
+
+def _within_day(column, day_start: datetime):
+    """Filter a timestamp column to one day as a range, so an index on the column is usable"""
+    return and_(column >= day_start, column < day_start + timedelta(days=1))
+
+
+def _usage_day_dict(row) -> Dict:
+    """Serialize an api_usage Core row like APIUsage.to_dict(), without loading an ORM object"""
+    usage = dict(row._mapping)
+    for column in ("usage_date", "created_at", "updated_at"):
+        if usage[column]:
+            usage[column] = usage[column].isoformat()
+    usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"] + usage["embedding_tokens"]
+    return usage
+
+
+# (total_requests, total_tokens) aggregates over a set of APIUsage rows
+_USAGE_TOTALS = (
+    func.coalesce(func.sum(APIUsage.request_count), 0).label("total_requests"),
+    func.coalesce(
+        func.sum(APIUsage.input_tokens + APIUsage.output_tokens + APIUsage.embedding_tokens), 0
+    ).label("total_tokens"),
+) if APIUsage is not None else ()
+
+
+def _today_count_stmt(*owner):
+    """SELECT today's request_count for one owner; the day bounds are bound per call"""
+    return select(APIUsage.request_count).where(
+        *owner,
+        APIUsage.usage_date >= bindparam("day_start"),
+        APIUsage.usage_date < bindparam("day_end")
+    ).limit(1)
+
+
+# Daily-limit lookups, built once instead of on every check_daily_limit cache miss
+if APIUsage is not None:
+    _TODAY_COUNT_BY_USER = _today_count_stmt(APIUsage.user_id == bindparam("user_id"))
+    _TODAY_COUNT_BY_GUEST = _today_count_stmt(
+        APIUsage.user_id.is_(None), APIUsage.guest_email == bindparam("guest_email")
+    )
+    # Don't filter by guest_email is None here, to match any record for this IP
+    _TODAY_COUNT_BY_IP = _today_count_stmt(
+        APIUsage.user_id.is_(None), APIUsage.ip_address == bindparam("ip_address")
+    )
+
+
+# Display format of each stats time bucket ("hour", "day", "minute")
+_BUCKET_FORMATS = {
+    "minute": "%Y-%m-%d %H:%M",
+    "hour": "%Y-%m-%d %H:00",
+    "day": "%Y-%m-%d",
+}
+
+
+class _EmptyHistoryDay(NamedTuple):
+    """Zero-usage stand-in for a day with no api_requests rows"""
+    bucket: str
+    requests: int = 0
+    tokens: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    embedding_tokens: int = 0
+    errors: int = 0
+
+
+def _time_bucket(db: Session, column, group_by: str):
+    """SQL expression truncating a timestamp column to the group_by period"""
+    if group_by not in _BUCKET_FORMATS:
+        group_by = "day"
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite has no date_trunc; bucket by the formatted string instead
+        return func.strftime(_BUCKET_FORMATS[group_by], column)
+    # Inline the (whitelisted) unit so SELECT and GROUP BY render the identical expression
+    return func.date_trunc(literal_column(f"'{group_by}'"), column)
 
 
 class UsageTracker:
-    """Service for tracking API usage and enforcing daily limits"""
+    """
+    Service for tracking API usage and enforcing daily limits.
+
+    Methods taking a Session expect one from src.core's pooled engine
+    (SessionLocal / get_db_context), not a per-call engine.
+    """
+    
+    # APIRequest rows are only read for analytics, so they are buffered in memory and
+    # inserted in batches: as soon as REQUEST_BUFFER_MAX_ROWS are waiting, otherwise
+    # REQUEST_BUFFER_FLUSH_SECONDS after the first buffered row. Daily APIUsage increments
+    # that can be written with an UPSERT are coalesced per owner and flushed with them;
+    # check_daily_limit adds the pending increments, so rate limiting still sees every hit.
+    # A failed flush puts everything back and retries after REQUEST_BUFFER_RETRY_SECONDS;
+    # during a long outage only the newest REQUEST_BUFFER_MAX_RETAINED_ROWS rows are kept
+    # (the per-owner increments are small and always kept, so quotas stay enforced).
+    REQUEST_BUFFER_MAX_ROWS = 100
+    REQUEST_BUFFER_FLUSH_SECONDS = 2.0
+    REQUEST_BUFFER_RETRY_SECONDS = 10.0
+    REQUEST_BUFFER_MAX_RETAINED_ROWS = 10_000
+    _request_buffer: deque = deque()
+    # _daily_count_key() -> pending APIUsage increment for that owner and day
+    _usage_deltas: Dict[tuple, Dict] = {}
+    _buffer_lock = threading.Lock()
+    _flush_timer: Optional[threading.Timer] = None
+    # Monotonic time before which a full buffer doesn't trigger an immediate flush (after a failure)
+    _retry_after: float = 0.0
+    
+    @classmethod
+    def _buffer_request(cls, row: dict):
+        """Queue an APIRequest row and make sure a flush is scheduled"""
+        with cls._buffer_lock:
+            cls._request_buffer.append(row)
+            if len(cls._request_buffer) >= cls.REQUEST_BUFFER_MAX_ROWS and monotonic() >= cls._retry_after:
+                cls._schedule_flush(0)
+            elif cls._flush_timer is None:
+                cls._schedule_flush(cls.REQUEST_BUFFER_FLUSH_SECONDS)
+    
+    @classmethod
+    def _buffer_usage_delta(
+        cls,
+        count_key: tuple,
+        owner: Dict,
+        usage_date: datetime,
+        llm_provider: Optional[str],
+        llm_model: Optional[str],
+        input_tokens: int,
+        output_tokens: int,
+        embedding_tokens: int,
+        mode: Optional[str]
+    ):
+        """Add one request to an owner's pending daily aggregate and make sure a flush is scheduled"""
+        with cls._buffer_lock:
+            delta = cls._usage_deltas.get(count_key)
+            if delta is None:
+                delta = cls._usage_deltas[count_key] = {
+                    "key": owner,
+                    "usage_date": usage_date,
+                    "request_count": 0,
+                    "input_tokens": 0,
+                    "output_tokens": 0,
+                    "embedding_tokens": 0,
+                    "llm_provider": None,
+                    "llm_model": None,
+                    "mode": None,
+                }
+            delta["request_count"] += 1
+            delta["input_tokens"] += input_tokens
+            delta["output_tokens"] += output_tokens
+            delta["embedding_tokens"] += embedding_tokens
+            # Latest non-empty provider/model/mode wins, as with per-request updates
+            if llm_provider:
+                delta["llm_provider"] = llm_provider
+            if llm_model:
+                delta["llm_model"] = llm_model
+            if mode:
+                delta["mode"] = mode
+            if cls._flush_timer is None:
+                cls._schedule_flush(cls.REQUEST_BUFFER_FLUSH_SECONDS)
+    
+    @classmethod
+    def _pending_request_count(cls, count_key: tuple) -> int:
+        """Requests recorded for an owner/day that haven't been flushed to api_usage yet"""
+        delta = cls._usage_deltas.get(count_key)
+        return delta["request_count"] if delta else 0
+    
+    @classmethod
+    def _flush_pending_ip_usage(cls, today_start: datetime, ip_address: Optional[str]):
+        """
+        Write an IP's buffered increments now, before a guest-email request looks up
+        (and may upgrade) that IP's row
+        """
+        if ip_address and cls._pending_request_count(_daily_count_key(today_start, None, None, ip_address)):
+            cls.flush_request_buffer()
+    
+    @classmethod
+    def _schedule_flush(cls, delay_seconds: float):
+        """(Re)arm the background flush timer; caller holds _buffer_lock"""
+        if cls._flush_timer is not None:
+            cls._flush_timer.cancel()
+        cls._flush_timer = threading.Timer(delay_seconds, cls.flush_request_buffer)
+        cls._flush_timer.daemon = True
+        cls._flush_timer.start()
+    
+    @classmethod
+    def flush_request_buffer(cls) -> int:
+        """
+        Insert all buffered APIRequest rows in one executemany and apply the pending
+        daily aggregates (one UPSERT per owner), in a single transaction
+        
+        Returns:
+            Number of APIRequest rows written
+        """
+        with cls._buffer_lock:
+            rows = list(cls._request_buffer)
+            cls._request_buffer.clear()
+            # Upsert in a fixed (owner, day) order: every worker then locks shared
+            # api_usage rows in the same order, so concurrent flushes can't deadlock
+            delta_keys = sorted(cls._usage_deltas)
+            deltas = [cls._usage_deltas[key] for key in delta_keys]
+            cls._usage_deltas.clear()
+            if cls._flush_timer is not None:
+                cls._flush_timer.cancel()
+                cls._flush_timer = None
+        
+        if (not rows and not deltas) or not DB_AVAILABLE:
+            return 0
+        
+        try:
+            with get_db_context() as db:
+                if rows and APIRequest:
+                    db.execute(APIRequest.__table__.insert(), rows)
+                for delta in deltas:
+                    UsageTracker._upsert_usage(db, **delta)
+            return len(rows)
+        except Exception as e:
+            logger.warning("Error writing %d buffered API request(s) / %d usage aggregate(s), will retry: %s", len(rows), len(deltas), e, exc_info=True)
+            cls._restore_unflushed(rows, dict(zip(delta_keys, deltas)))
+            return 0
+    
+    @classmethod
+    def _restore_unflushed(cls, rows: List[dict], deltas: Dict[tuple, Dict]):
+        """Put the rows and increments of a failed flush back in front of anything buffered since, and retry later"""
+        with cls._buffer_lock:
+            cls._request_buffer.extendleft(reversed(rows))
+            dropped = 0
+            while len(cls._request_buffer) > cls.REQUEST_BUFFER_MAX_RETAINED_ROWS:
+                cls._request_buffer.popleft()
+                dropped += 1
+            if dropped:
+                logger.warning("Dropped %d oldest buffered API request row(s) while the database is unavailable", dropped)
+            
+            for key, old in deltas.items():
+                delta = cls._usage_deltas.get(key)
+                if delta is None:
+                    cls._usage_deltas[key] = old
+                    continue
+                for field in ("request_count", "input_tokens", "output_tokens", "embedding_tokens"):
+                    delta[field] += old[field]
+                # Values recorded since the failed flush are newer and win
+                for field in ("llm_provider", "llm_model", "mode"):
+                    if not delta[field]:
+                        delta[field] = old[field]
+            
+            cls._retry_after = monotonic() + cls.REQUEST_BUFFER_RETRY_SECONDS
+            cls._schedule_flush(cls.REQUEST_BUFFER_RETRY_SECONDS)
     
     @staticmethod
     def get_today_start() -> datetime:
         """Get start of today in UTC"""
+        global _cached_day_start
         today = date.today()
-        return datetime.combine(today, datetime.min.time()).replace(tzinfo=timezone.utc)
+        cached = _cached_day_start
+        if cached is not None and cached[0] == today:
+            return cached[1]
+        today_start = datetime.combine(today, time.min, tzinfo=timezone.utc)
+        # Swapping the whole tuple is atomic, so concurrent callers never see a mixed pair
+        _cached_day_start = (today, today_start)
+        return today_start
     
     @staticmethod
     def get_client_ip(request) -> Optional[str]:
@@ -44,6 +376,9 @@ class UsageTracker:
         """
         Check if user has exceeded daily request limit
         
+        The limit applies to a sliding 24-hour window (see _sliding_window_count()),
+        so current_count is the request count in that window rather than since midnight.
+        
         Args:
             user_id: User ID (None for anonymous users)
             db: Database session
@@ -75,53 +410,80 @@ class UsageTracker:
                 # And "when a user without login to chat then for monetoing get a dialog box to get email"
                 
                 limit = 10 # Explicit 10/day limit for unauthenticated users
-                
-                if guest_email:
-                     # First try to find by email
-                    usage = db.query(APIUsage).filter(
-                        APIUsage.user_id.is_(None),
-                        APIUsage.guest_email == guest_email,
-                        func.date(APIUsage.usage_date) == today_start.date()
-                    ).first()
-                    
-                    # If not found by email, try to find by IP and merge/upgrade
-                    if not usage and ip_address:
-                        usage = db.query(APIUsage).filter(
-                            APIUsage.user_id.is_(None),
-                            APIUsage.ip_address == ip_address,
-                            func.date(APIUsage.usage_date) == today_start.date()
-                        ).first()
-                elif ip_address:
-                    # Query by IP address for anonymous users without email
-                    usage = db.query(APIUsage).filter(
-                        APIUsage.user_id.is_(None),
-                         # Don't filter by guest_email is None here, to match any record for this IP
-                        APIUsage.ip_address == ip_address,
-                        func.date(APIUsage.usage_date) == today_start.date()
-                    ).first()
-                else:
+                if not guest_email and not ip_address:
                     # If no IP and no email, allow but warn (shouldn't happen)
                     return True, 0, limit
             else:
                 # Authenticated user - 100 requests per day
                 limit = DAILY_REQUEST_LIMIT
-                # Query by user_id for authenticated users
-                usage = db.query(APIUsage).filter(
-                    APIUsage.user_id == user_id,
-                    func.date(APIUsage.usage_date) == today_start.date()
-                ).first()
             
-            current_count = usage.request_count if usage else 0
-            is_allowed = current_count < limit
-            remaining = max(0, limit - current_count)
+            count_key = _daily_count_key(today_start, user_id, guest_email, ip_address)
+            current_count = _daily_counts.get(count_key)
+            if current_count is None:
+                current_count = (
+                    UsageTracker._query_today_count(db, today_start, user_id, guest_email, ip_address)
+                    + UsageTracker._pending_request_count(count_key)
+                )
+                _daily_counts.set(count_key, current_count)
+            
+            previous_count = UsageTracker._previous_day_count(db, today_start, user_id, guest_email, ip_address)
+            window_count = int(_sliding_window_count(current_count, previous_count, today_start))
+            is_allowed = window_count < limit
+            remaining = max(0, limit - window_count)
             
-            return is_allowed, current_count, remaining
+            return is_allowed, window_count, remaining
         except Exception as e:
-            print(f"⚠️  Error checking daily limit: {e}")
+            logger.warning("Error checking daily limit: %s", e, exc_info=True)
             # On error, allow the request
             limit = 10 if user_id is None else DAILY_REQUEST_LIMIT
             return True, 0, limit
     
+    @staticmethod
+    def _previous_day_count(
+        db: Session,
+        today_start: datetime,
+        user_id: Optional[int],
+        guest_email: Optional[str],
+        ip_address: Optional[str]
+    ) -> int:
+        """Yesterday's request count for a user, guest email or IP (cached)"""
+        yesterday_start = today_start - timedelta(days=1)
+        count_key = _daily_count_key(yesterday_start, user_id, guest_email, ip_address)
+        previous_count = _daily_counts.get(count_key)
+        if previous_count is None:
+            previous_count = (
+                UsageTracker._query_today_count(db, yesterday_start, user_id, guest_email, ip_address)
+                + UsageTracker._pending_request_count(count_key)
+            )
+            _daily_counts.set(count_key, previous_count, ttl_seconds=PREVIOUS_DAY_COUNT_CACHE_TTL_SECONDS)
+        return previous_count
+    
+    @staticmethod
+    def _query_today_count(
+        db: Session,
+        today_start: datetime,
+        user_id: Optional[int],
+        guest_email: Optional[str],
+        ip_address: Optional[str]
+    ) -> int:
+        """Request count stored for the day starting at today_start, for a user, guest email or IP"""
+        day = {"day_start": today_start, "day_end": today_start + timedelta(days=1)}
+        if user_id is not None:
+            # Query by user_id for authenticated users
+            count = db.execute(_TODAY_COUNT_BY_USER, {"user_id": user_id, **day}).scalar()
+        elif guest_email:
+            UsageTracker._flush_pending_ip_usage(today_start, ip_address)
+            # First try to find by email
+            count = db.execute(_TODAY_COUNT_BY_GUEST, {"guest_email": guest_email, **day}).scalar()
+            
+            # If not found by email, try to find by IP and merge/upgrade
+            if count is None and ip_address:
+                count = db.execute(_TODAY_COUNT_BY_IP, {"ip_address": ip_address, **day}).scalar()
+        else:
+            # Query by IP address for anonymous users without email
+            count = db.execute(_TODAY_COUNT_BY_IP, {"ip_address": ip_address, **day}).scalar()
+        return count or 0
+    
     @staticmethod
     def record_request(
         user_id: Optional[int],
@@ -161,39 +523,57 @@ class UsageTracker:
             return False
         
         try:
-            from datetime import datetime, timezone
             request_timestamp = datetime.now(timezone.utc)
             today_start = UsageTracker.get_today_start()
             total_tokens = input_tokens + output_tokens + embedding_tokens
             
-            # Record individual request
+            # Record individual request (buffered; written in batches off the request path)
             if APIRequest:
-                api_request = APIRequest(
-                    user_id=user_id,
-                    request_timestamp=request_timestamp,
-                    llm_provider=llm_provider,
-                    llm_model=llm_model,
-                    input_tokens=input_tokens,
-                    output_tokens=output_tokens,
-                    embedding_tokens=embedding_tokens,
-                    total_tokens=total_tokens,
-                    mode=mode,
-                    session_id=session_id,
-                    success=success,
-                    guest_email=guest_email if user_id is None else None
+                UsageTracker._buffer_request({
+                    "user_id": user_id,
+                    "request_timestamp": request_timestamp,
+                    "llm_provider": llm_provider,
+                    "llm_model": llm_model,
+                    "input_tokens": input_tokens,
+                    "output_tokens": output_tokens,
+                    "embedding_tokens": embedding_tokens,
+                    "total_tokens": total_tokens,
+                    "mode": mode,
+                    "session_id": session_id,
+                    "success": success,
+                    "guest_email": guest_email if user_id is None else None,
+                })
+            
+            # Increment today's aggregate in one UPSERT statement instead of SELECT + UPDATE/INSERT:
+            # authenticated users by the user_id + usage_date unique constraint, anonymous
+            # requests without a guest email by ip_address + usage_date. (Guest emails can
+            # upgrade an existing IP row, which needs the lookup below.)
+            # The UPSERT is buffered and applied with the next flush instead of committing on
+            # the request path; the cached daily count is bumped right away.
+            if db.bind.dialect.name in _UPSERT_INSERTS and (user_id is not None or (ip_address and not guest_email)):
+                if user_id is not None:
+                    owner = {"user_id": user_id}
+                else:
+                    owner = {"ip_address": ip_address}
+                count_key = _daily_count_key(today_start, user_id, guest_email, ip_address)
+                UsageTracker._buffer_usage_delta(
+                    count_key, owner, today_start, llm_provider, llm_model,
+                    input_tokens, output_tokens, embedding_tokens, mode
                 )
-                db.add(api_request)
+                _daily_counts.incr(count_key)
+                return True
             
             # Get or create today's usage record (for daily aggregates)
             if user_id is None:
                 # For unauthenticated users
                 # For unauthenticated users
                 if guest_email:
+                    UsageTracker._flush_pending_ip_usage(today_start, ip_address)
                     # First try to find by email
                     usage = db.query(APIUsage).filter(
                         APIUsage.user_id.is_(None),
                         APIUsage.guest_email == guest_email,
-                        func.date(APIUsage.usage_date) == today_start.date()
+                        _within_day(APIUsage.usage_date, today_start)
                     ).first()
                     
                     # If not found by email, try to find by IP and upgrade it
@@ -201,7 +581,7 @@ class UsageTracker:
                         usage = db.query(APIUsage).filter(
                             APIUsage.user_id.is_(None),
                             APIUsage.ip_address == ip_address,
-                            func.date(APIUsage.usage_date) == today_start.date()
+                            _within_day(APIUsage.usage_date, today_start)
                         ).first()
                         
                         # If found by IP but no email, update it with the email
@@ -213,7 +593,7 @@ class UsageTracker:
                         # Don't filter by guest_email here, find any record for this IP
                         # This covers cases where they might have added email previously
                         APIUsage.ip_address == ip_address,
-                        func.date(APIUsage.usage_date) == today_start.date()
+                        _within_day(APIUsage.usage_date, today_start)
                     ).first()
                 else:
                     return False
@@ -221,15 +601,16 @@ class UsageTracker:
                 # For authenticated users, query by user_id
                 usage = db.query(APIUsage).filter(
                     APIUsage.user_id == user_id,
-                    func.date(APIUsage.usage_date) == today_start.date()
+                    _within_day(APIUsage.usage_date, today_start)
                 ).first()
             
             if usage:
-                # Update existing record
-                usage.request_count += 1
-                usage.input_tokens += input_tokens
-                usage.output_tokens += output_tokens
-                usage.embedding_tokens += embedding_tokens
+                # Update existing record. Increment in SQL (SET request_count = request_count + 1)
+                # so concurrent workers updating the same row can't overwrite each other's counts
+                usage.request_count = APIUsage.request_count + 1
+                usage.input_tokens = APIUsage.input_tokens + input_tokens
+                usage.output_tokens = APIUsage.output_tokens + output_tokens
+                usage.embedding_tokens = APIUsage.embedding_tokens + embedding_tokens
                 if llm_provider:
                     usage.llm_provider = llm_provider
                 if llm_model:
@@ -254,12 +635,65 @@ class UsageTracker:
                 db.add(usage)
             
             db.commit()
+            _daily_counts.set(_daily_count_key(today_start, user_id, guest_email, ip_address), usage.request_count)
             return True
         except Exception as e:
-            print(f"⚠️  Error recording usage: {e}")
+            logger.warning("Error recording usage: %s", e, exc_info=True)
             db.rollback()
             return False
     
+    @staticmethod
+    def _upsert_usage(
+        db: Session,
+        key: Dict,
+        usage_date: datetime,
+        llm_provider: Optional[str],
+        llm_model: Optional[str],
+        input_tokens: int,
+        output_tokens: int,
+        embedding_tokens: int,
+        mode: Optional[str],
+        request_count: int = 1
+    ):
+        """
+        INSERT today's APIUsage row, or add to it if it already exists
+        
+        Args:
+            key: The row's owner - {"user_id": ...} or {"ip_address": ...}; together with
+                usage_date it must match one of APIUsage's unique constraints
+            request_count: Number of requests being added (more than 1 for a coalesced flush)
+        
+        Returns:
+            The row's request_count after the update
+        """
+        stmt = _UPSERT_INSERTS[db.bind.dialect.name](APIUsage).values(
+            **key,
+            usage_date=usage_date,
+            request_count=request_count,
+            llm_provider=llm_provider,
+            llm_model=llm_model,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            embedding_tokens=embedding_tokens,
+            mode=mode
+        )
+        updates = {
+            "request_count": APIUsage.request_count + stmt.excluded.request_count,
+            "input_tokens": APIUsage.input_tokens + stmt.excluded.input_tokens,
+            "output_tokens": APIUsage.output_tokens + stmt.excluded.output_tokens,
+            "embedding_tokens": APIUsage.embedding_tokens + stmt.excluded.embedding_tokens,
+            "updated_at": func.now(),
+        }
+        # Like the ORM path, only overwrite provider/model/mode when given
+        if llm_provider:
+            updates["llm_provider"] = stmt.excluded.llm_provider
+        if llm_model:
+            updates["llm_model"] = stmt.excluded.llm_model
+        if mode:
+            updates["mode"] = stmt.excluded.mode
+        stmt = stmt.on_conflict_do_update(index_elements=[*key, "usage_date"], set_=updates)
+        return db.execute(stmt.returning(APIUsage.request_count)).scalar_one()
+    
     @staticmethod
     def get_user_usage_stats(
         user_id: Optional[int],
@@ -297,36 +731,19 @@ class UsageTracker:
             start_date = today_start - timedelta(days=days - 1)
             limit = DAILY_REQUEST_LIMIT_UNAUTHENTICATED if user_id is None else DAILY_REQUEST_LIMIT
             
-            # Get today's usage
-            # Get today's usage
+            # Rows belonging to this user / guest / anonymous IP
             if user_id is None:
                 if guest_email:
-                    today_usage = db.query(APIUsage).filter(
+                    scope = (
                         APIUsage.user_id.is_(None),
                         APIUsage.guest_email == guest_email,
-                        func.date(APIUsage.usage_date) == today_start.date()
-                    ).first()
-                    
-                    recent_usage = db.query(APIUsage).filter(
-                        APIUsage.user_id.is_(None),
-                        APIUsage.guest_email == guest_email,
-                        APIUsage.usage_date >= start_date
-                    ).order_by(APIUsage.usage_date.desc()).all()
-                    
+                    )
                 elif ip_address:
-                    today_usage = db.query(APIUsage).filter(
-                        APIUsage.user_id.is_(None),
-                        APIUsage.guest_email.is_(None),
-                        APIUsage.ip_address == ip_address,
-                        func.date(APIUsage.usage_date) == today_start.date()
-                    ).first()
-                    
-                    recent_usage = db.query(APIUsage).filter(
+                    scope = (
                         APIUsage.user_id.is_(None),
                         APIUsage.guest_email.is_(None),
                         APIUsage.ip_address == ip_address,
-                        APIUsage.usage_date >= start_date
-                    ).order_by(APIUsage.usage_date.desc()).all()
+                    )
                 else:
                     return {
                         "today": {"request_count": 0, "remaining": limit},
@@ -335,47 +752,31 @@ class UsageTracker:
                         "total_tokens": 0
                     }
             else:
-                today_usage = db.query(APIUsage).filter(
-                    APIUsage.user_id == user_id,
-                    func.date(APIUsage.usage_date) == today_start.date()
-                ).first()
-                
-                # Get recent days usage
-                recent_usage = db.query(APIUsage).filter(
-                    APIUsage.user_id == user_id,
-                    APIUsage.usage_date >= start_date
-                ).order_by(APIUsage.usage_date.desc()).all()
+                scope = (APIUsage.user_id == user_id,)
             
-            today_count = today_usage.request_count if today_usage else 0
-            today_remaining = max(0, limit - today_count)
+            # Get today's usage
+            today_usage = db.query(APIUsage).filter(
+                *scope,
+                _within_day(APIUsage.usage_date, today_start)
+            ).first()
             
-            recent_days = [usage.to_dict() for usage in recent_usage]
+            # Get recent days usage (plain rows - no ORM object per day)
+            recent_usage = db.execute(
+                select(APIUsage.__table__).where(
+                    *scope,
+                    APIUsage.usage_date >= start_date
+                ).order_by(APIUsage.usage_date.desc())
+            ).all()
             
-            # Calculate totals
-            total_requests = sum(u.request_count for u in recent_usage)
-            total_tokens = sum(
-                u.input_tokens + u.output_tokens + u.embedding_tokens
-                for u in recent_usage
-            )
+            # Totals are summed by the database
+            totals = db.query(*_USAGE_TOTALS).filter(
+                *scope,
+                APIUsage.usage_date >= start_date
+            ).one()
             
-            return {
-                "today": {
-                    "request_count": today_count,
-                    "remaining": today_remaining,
-                    "limit": limit,
-                    "input_tokens": today_usage.input_tokens if today_usage else 0,
-                    "output_tokens": today_usage.output_tokens if today_usage else 0,
-                    "embedding_tokens": today_usage.embedding_tokens if today_usage else 0,
-                    "llm_provider": today_usage.llm_provider if today_usage else None,
-                    "llm_model": today_usage.llm_model if today_usage else None,
-                },
-                "recent_days": recent_days,
-                "total_requests": total_requests,
-                "total_tokens": total_tokens,
-                "days_analyzed": days
-            }
+            return UsageTracker._usage_stats(today_usage, recent_usage, totals, limit, days)
         except Exception as e:
-            print(f"⚠️  Error getting usage stats: {e}")
+            logger.warning("Error getting usage stats: %s", e, exc_info=True)
             limit = DAILY_REQUEST_LIMIT_UNAUTHENTICATED if user_id is None else DAILY_REQUEST_LIMIT
             return {
                 "today": {"request_count": 0, "remaining": limit},
@@ -385,6 +786,35 @@ class UsageTracker:
                 "days_analyzed": days
             }
     
+    @staticmethod
+    def _usage_stats(today_usage, recent_usage: List, totals, limit: int, days: int) -> Dict:
+        """
+        Build the usage statistics dict from today's APIUsage row, the recent api_usage
+        rows (newest first) and their (total_requests, total_tokens) sums
+        """
+        today_count = today_usage.request_count if today_usage else 0
+        today_remaining = max(0, limit - today_count)
+        
+        recent_days = [_usage_day_dict(usage) for usage in recent_usage]
+        total_requests, total_tokens = totals
+        
+        return {
+            "today": {
+                "request_count": today_count,
+                "remaining": today_remaining,
+                "limit": limit,
+                "input_tokens": today_usage.input_tokens if today_usage else 0,
+                "output_tokens": today_usage.output_tokens if today_usage else 0,
+                "embedding_tokens": today_usage.embedding_tokens if today_usage else 0,
+                "llm_provider": today_usage.llm_provider if today_usage else None,
+                "llm_model": today_usage.llm_model if today_usage else None,
+            },
+            "recent_days": recent_days,
+            "total_requests": total_requests,
+            "total_tokens": total_tokens,
+            "days_analyzed": days
+        }
+    
     @staticmethod
     def get_all_users_usage_stats(db: Session, days: int = 7) -> List[Dict]:
         """
@@ -404,20 +834,40 @@ class UsageTracker:
             today_start = UsageTracker.get_today_start()
             start_date = today_start - timedelta(days=days - 1)
             
-            # Get all users with usage in the period
-            users_with_usage = db.query(User).join(APIUsage).filter(
-                APIUsage.usage_date >= start_date
-            ).distinct().all()
+            in_period = (APIUsage.user_id.isnot(None), APIUsage.usage_date >= start_date)
+            
+            # Per-user totals, summed by the database (also tells which users have usage)
+            totals = {
+                row.user_id: (row.total_requests, row.total_tokens)
+                for row in db.query(APIUsage.user_id, *_USAGE_TOTALS).filter(*in_period).group_by(APIUsage.user_id)
+            }
+            if not totals:
+                return []
+            
+            users = {user.id: user.to_dict() for user in db.query(User).filter(User.id.in_(totals)).all()}
+            
+            # All users' usage rows in the period in one query, streamed in batches rather
+            # than materialized at once (one row per user per day)
+            recent_usage = db.execute(
+                select(APIUsage.__table__).where(*in_period).order_by(
+                    APIUsage.user_id, APIUsage.usage_date.desc()
+                ).execution_options(yield_per=1000)
+            )
             
+            today = today_start.date()
             stats = []
-            for user in users_with_usage:
-                user_stats = UsageTracker.get_user_usage_stats(user.id, db, days)
-                user_stats["user"] = user.to_dict()
+            for user_id, user_usage in groupby(recent_usage, key=attrgetter("user_id")):
+                if user_id not in users:
+                    continue
+                user_usage = list(user_usage)
+                today_usage = next((u for u in user_usage if u.usage_date.date() == today), None)
+                user_stats = UsageTracker._usage_stats(today_usage, user_usage, totals[user_id], DAILY_REQUEST_LIMIT, days)
+                user_stats["user"] = users[user_id]
                 stats.append(user_stats)
             
             return stats
         except Exception as e:
-            print(f"⚠️  Error getting all users usage stats: {e}")
+            logger.warning("Error getting all users usage stats: %s", e, exc_info=True)
             return []
     
     @staticmethod
@@ -449,11 +899,10 @@ class UsageTracker:
             }
         
         try:
-            from datetime import datetime, timedelta, timezone
             today_start = UsageTracker.get_today_start()
             start_date = today_start - timedelta(days=days - 1)
             
-            # Get all individual requests
+            # Filter individual requests
             if user_id is None:
                 if not ip_address:
                     return {
@@ -465,73 +914,52 @@ class UsageTracker:
                 # For anonymous users, we need to track by IP - but APIRequest doesn't have IP field
                 # For now, query all anonymous requests (user_id is None)
                 # In future, we might add ip_address to APIRequest as well
-                requests = db.query(APIRequest).filter(
-                    APIRequest.user_id.is_(None),
-                    APIRequest.request_timestamp >= start_date
-                ).order_by(APIRequest.request_timestamp.asc()).all()
+                user_filter = APIRequest.user_id.is_(None)
             else:
-                requests = db.query(APIRequest).filter(
-                    APIRequest.user_id == user_id,
-                    APIRequest.request_timestamp >= start_date
-                ).order_by(APIRequest.request_timestamp.asc()).all()
-            
-            # Group requests by time period
-            grouped_requests = {}
-            for req in requests:
-                timestamp = req.request_timestamp
-                
-                # Group by selected period
-                if group_by == "hour":
-                    key = timestamp.strftime("%Y-%m-%d %H:00")
-                elif group_by == "day":
-                    key = timestamp.strftime("%Y-%m-%d")
-                elif group_by == "minute":
-                    key = timestamp.strftime("%Y-%m-%d %H:%M")
-                else:
-                    key = timestamp.strftime("%Y-%m-%d")
-                
-                if key not in grouped_requests:
-                    grouped_requests[key] = {
-                        "timestamp": key,
-                        "request_count": 0,
-                        "total_tokens": 0,
-                        "input_tokens": 0,
-                        "output_tokens": 0,
-                        "embedding_tokens": 0,
-                        "valid_requests": 0,
-                        "invalid_requests": 0,
-                        "avg_tokens_per_request": 0,
-                    }
-                
-                grouped_requests[key]["request_count"] += 1
-                grouped_requests[key]["total_tokens"] += req.total_tokens
-                grouped_requests[key]["input_tokens"] += req.input_tokens
-                grouped_requests[key]["output_tokens"] += req.output_tokens
-                grouped_requests[key]["embedding_tokens"] += req.embedding_tokens
-                
-                if req.success and req.total_tokens > 0:
-                    grouped_requests[key]["valid_requests"] += 1
-                else:
-                    grouped_requests[key]["invalid_requests"] += 1
-            
-            # Calculate averages and format
-            requests_list = []
-            for key in sorted(grouped_requests.keys()):
-                group = grouped_requests[key]
-                if group["request_count"] > 0:
-                    group["avg_tokens_per_request"] = round(
-                        group["total_tokens"] / group["request_count"]
-                    )
-                requests_list.append(group)
+                user_filter = APIRequest.user_id == user_id
+            
+            # Group and aggregate in the database: one row per time bucket
+            bucket_format = _BUCKET_FORMATS.get(group_by, _BUCKET_FORMATS["day"])
+            bucket = _time_bucket(db, APIRequest.request_timestamp, group_by).label("bucket")
+            rows = db.query(
+                bucket,
+                func.count(APIRequest.id).label("request_count"),
+                func.sum(APIRequest.total_tokens).label("total_tokens"),
+                func.sum(APIRequest.input_tokens).label("input_tokens"),
+                func.sum(APIRequest.output_tokens).label("output_tokens"),
+                func.sum(APIRequest.embedding_tokens).label("embedding_tokens"),
+                func.sum(case(
+                    (and_(APIRequest.success.is_(True), APIRequest.total_tokens > 0), 1),
+                    else_=0
+                )).label("valid_requests"),
+            ).filter(
+                user_filter,
+                APIRequest.request_timestamp >= start_date
+            ).group_by(bucket).order_by(bucket).all()
+            
+            requests_list = [
+                {
+                    "timestamp": row.bucket if isinstance(row.bucket, str) else row.bucket.strftime(bucket_format),
+                    "request_count": row.request_count,
+                    "total_tokens": row.total_tokens,
+                    "input_tokens": row.input_tokens,
+                    "output_tokens": row.output_tokens,
+                    "embedding_tokens": row.embedding_tokens,
+                    "valid_requests": row.valid_requests,
+                    "invalid_requests": row.request_count - row.valid_requests,
+                    "avg_tokens_per_request": round(row.total_tokens / row.request_count),
+                }
+                for row in rows
+            ]
             
             return {
                 "requests": requests_list,
-                "total_requests": len(requests),
+                "total_requests": sum(row.request_count for row in rows),
                 "group_by": group_by,
                 "days": days
             }
         except Exception as e:
-            print(f"⚠️  Error getting per-request stats: {e}")
+            logger.warning("Error getting per-request stats: %s", e, exc_info=True)
             return {
                 "requests": [],
                 "total_requests": 0,
@@ -565,49 +993,61 @@ class UsageTracker:
             }
         
         try:
-            from datetime import datetime, timedelta
             today_start = UsageTracker.get_today_start()
             start_date = today_start - timedelta(days=days - 1)
             
-            # Query all requests within the time range
-            requests = db.query(APIRequest).filter(
-                APIRequest.request_timestamp >= start_date
-            ).order_by(APIRequest.request_timestamp.asc()).all()
-            
-            # Group requests by time period
-            grouped_data = {}
-            
-            # Initialize all days in range with 0 to ensure continuous chart
-            for i in range(days):
-                current_date = start_date + timedelta(days=i)
-                date_key = current_date.strftime("%Y-%m-%d")
-                grouped_data[date_key] = {
-                    "date": date_key,
-                    "requests": 0,
-                    "tokens": 0,
-                    "input_tokens": 0,
-                    "output_tokens": 0,
-                    "embedding_tokens": 0,
-                    "errors": 0
+            # Group and aggregate by day in the database
+            # (for now we only support daily grouping for the main chart)
+            totals = (
+                func.count(APIRequest.id).label("requests"),
+                func.coalesce(func.sum(APIRequest.total_tokens), 0).label("tokens"),
+                func.coalesce(func.sum(APIRequest.input_tokens), 0).label("input_tokens"),
+                func.coalesce(func.sum(APIRequest.output_tokens), 0).label("output_tokens"),
+                func.coalesce(func.sum(APIRequest.embedding_tokens), 0).label("embedding_tokens"),
+                func.coalesce(func.sum(case((APIRequest.success.is_(False), 1), else_=0)), 0).label("errors"),
+            )
+            
+            if db.get_bind().dialect.name == "postgresql":
+                # Outer-join against a generated day series so the database returns
+                # exactly one row per day, with empty days already zero-filled
+                one_day = literal_column("interval '1 day'")
+                days_series = func.generate_series(start_date, today_start, one_day).table_valued("day").render_derived()
+                day = days_series.c.day
+                rows = db.execute(
+                    select(day.label("bucket"), *totals)
+                    .select_from(days_series.outerjoin(APIRequest, and_(
+                        APIRequest.request_timestamp >= day,
+                        APIRequest.request_timestamp < day + one_day
+                    )))
+                    .group_by(day)
+                    .order_by(day)
+                ).all()
+            else:
+                bucket = _time_bucket(db, APIRequest.request_timestamp, "day").label("bucket")
+                rows_by_day = {
+                    row.bucket if isinstance(row.bucket, str) else row.bucket.strftime(_BUCKET_FORMATS["day"]): row
+                    for row in db.query(bucket, *totals).filter(
+                        APIRequest.request_timestamp >= start_date
+                    ).group_by(bucket).all()
                 }
-
-            for req in requests:
-                timestamp = req.request_timestamp
-                # For now we only support daily grouping for the main chart
-                key = timestamp.strftime("%Y-%m-%d")
-                
-                if key in grouped_data:
-                    grouped_data[key]["requests"] += 1
-                    grouped_data[key]["tokens"] += req.total_tokens
-                    grouped_data[key]["input_tokens"] += req.input_tokens
-                    grouped_data[key]["output_tokens"] += req.output_tokens
-                    grouped_data[key]["embedding_tokens"] += req.embedding_tokens
-                    
-                    if not req.success:
-                        grouped_data[key]["errors"] += 1
+                # Fill in days without requests to ensure a continuous chart
+                rows = []
+                for i in range(days):
+                    date_key = (start_date + timedelta(days=i)).strftime(_BUCKET_FORMATS["day"])
+                    rows.append(rows_by_day.get(date_key) or _EmptyHistoryDay(date_key))
             
-            # Convert to list and sort
-            history_list = sorted(grouped_data.values(), key=lambda x: x["date"])
+            history_list = [
+                {
+                    "date": row.bucket if isinstance(row.bucket, str) else row.bucket.strftime(_BUCKET_FORMATS["day"]),
+                    "requests": row.requests,
+                    "tokens": row.tokens,
+                    "input_tokens": row.input_tokens,
+                    "output_tokens": row.output_tokens,
+                    "embedding_tokens": row.embedding_tokens,
+                    "errors": row.errors
+                }
+                for row in rows
+            ]
             
             total_requests = sum(item["requests"] for item in history_list)
             
@@ -617,7 +1057,7 @@ class UsageTracker:
                 "days": days
             }
         except Exception as e:
-            print(f"⚠️  Error getting system usage history: {e}")
+            logger.warning("Error getting system usage history: %s", e, exc_info=True)
             return {
                 "history": [],
                 "total_requests": 0,
@@ -625,6 +1065,23 @@ class UsageTracker:
             }
 
 
+def _record_request_without_db(*args, **kwargs) -> bool:
+    return False
+
+
+def _check_daily_limit_without_db(user_id: Optional[int], *args, **kwargs) -> Tuple[bool, int, int]:
+    # If database not available, allow all requests
+    limit = DAILY_REQUEST_LIMIT_UNAUTHENTICATED if user_id is None else DAILY_REQUEST_LIMIT
+    return True, 0, limit
+
+
+if not DB_AVAILABLE:
+    # Called on every chat request: bind the no-database results directly instead of
+    # branching on DB_AVAILABLE each time
+    UsageTracker.record_request = staticmethod(_record_request_without_db)
+    UsageTracker.check_daily_limit = staticmethod(_check_daily_limit_without_db)
+
+
 # Global instance
 usage_tracker = UsageTracker()
 
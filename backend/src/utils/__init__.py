@@ -3,11 +3,14 @@ Shared utilities
 """
 from .utils import sanitize_tools_for_gemini, suppress_mcp_cleanup_errors
 from .email_service import email_service, EmailService
+from .email_dispatcher import email_dispatcher, EmailDispatcher
 
 __all__ = [
     "sanitize_tools_for_gemini",
     "suppress_mcp_cleanup_errors",
     "email_service",
     "EmailService",
+    "email_dispatcher",
+    "EmailDispatcher",
 ]
 
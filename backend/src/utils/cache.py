@@ -3,46 +3,90 @@ Simple in-memory cache with TTL
 """
 from typing import Optional, TypeVar, Callable
 from datetime import datetime, timedelta
+import threading
 import time
 
 T = TypeVar('T')
 
 
 class Cache:
-    """Simple in-memory cache with expiration"""
+    """
+    Simple in-memory cache with expiration.
+
+    Holds at most max_entries keys: when full, expired entries are purged first,
+    then the least recently written ones are evicted, so keys that are written
+    once and never read again can't grow the cache without bound.
+
+    Safe to share between threads (sync endpoints run in a threadpool); incr()
+    is an atomic read-modify-write for counters.
+    """
     
-    def __init__(self, default_ttl_seconds: int = 300):
+    def __init__(self, default_ttl_seconds: int = 300, max_entries: int = 10_000):
+        # key -> (value, expires_at on the monotonic clock), in write order
         self._cache: dict = {}
         self.default_ttl = default_ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
     
     def get(self, key: str) -> Optional[any]:
         """Get value from cache"""
-        if key not in self._cache:
+        with self._lock:
+            return self._get(key)
+    
+    def _get(self, key: str) -> Optional[any]:
+        entry = self._cache.get(key)
+        if entry is None:
             return None
         
-        entry = self._cache[key]
-        if time.time() > entry['expires_at']:
+        value, expires_at = entry
+        if time.monotonic() > expires_at:
             del self._cache[key]
             return None
         
-        return entry['value']
+        return value
     
     def set(self, key: str, value: any, ttl_seconds: Optional[int] = None):
         """Set value in cache"""
         ttl = ttl_seconds or self.default_ttl
-        self._cache[key] = {
-            'value': value,
-            'expires_at': time.time() + ttl
-        }
+        with self._lock:
+            # Re-insert so the key moves to the newest end of the write order
+            self._cache.pop(key, None)
+            if len(self._cache) >= self.max_entries:
+                self._evict()
+            self._cache[key] = (value, time.monotonic() + ttl)
+    
+    def incr(self, key: str, delta: int = 1) -> Optional[int]:
+        """
+        Add delta to a cached number, keeping its expiry.
+        
+        Returns:
+            The new value, or None if the key isn't cached (nothing is stored then)
+        """
+        with self._lock:
+            value = self._get(key)
+            if value is None:
+                return None
+            value += delta
+            self._cache[key] = (value, self._cache[key][1])
+            return value
+    
+    def _evict(self):
+        """Drop expired entries, then the oldest ones until there is room for one more"""
+        now = time.monotonic()
+        for expired_key in [k for k, (_, expires_at) in self._cache.items() if now > expires_at]:
+            del self._cache[expired_key]
+        while len(self._cache) >= self.max_entries:
+            del self._cache[next(iter(self._cache))]
     
     def delete(self, key: str):
         """Delete key from cache"""
-        if key in self._cache:
-            del self._cache[key]
+        with self._lock:
+            self._cache.pop(key, None)
     
     def clear(self):
         """Clear all cache"""
-        self._cache.clear()
+        with self._lock:
+            self._cache.clear()
     
     def has(self, key: str) -> bool:
         """Check if key exists and is not expired"""
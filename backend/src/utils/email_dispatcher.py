@@ -0,0 +1,82 @@
+"""
+Background email dispatch
+
+Email sends are queued to a small shared pool of worker threads instead of
+starting a new thread per request. Sends belonging to one job (e.g. the user
+confirmation and the team notification for an appointment) run concurrently.
+A failed send is retried with exponential backoff, and the number of queued
+sends is capped so an SMTP outage can't pile up work without bound.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List
+from src.utils.email_service import email_service
+from src.utils.logger import app_logger
+
+
+class EmailDispatcher:
+    """Runs email sends on a bounded, reusable worker pool"""
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_pending: int = 500,
+        max_attempts: int = 3,
+        retry_backoff_seconds: float = 2.0
+    ):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="email")
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+
+    def enqueue(self, *sends: Callable[[], Any]) -> List[Future]:
+        """
+        Queue one or more sends (zero-argument callables) and return immediately
+
+        A send that raises or returns False is retried; when the queue is full
+        the send is dropped (its Future resolves to False).
+
+        Returns:
+            One Future per send; failures are logged, not raised
+        """
+        futures = []
+        for send in sends:
+            if not self._pending.acquire(blocking=False):
+                app_logger.warning("Email queue full, dropping send")
+                future = Future()
+                future.set_result(False)
+            else:
+                future = self._executor.submit(self._send_with_retry, send)
+                future.add_done_callback(self._finish)
+            futures.append(future)
+        return futures
+
+    def _send_with_retry(self, send: Callable[[], Any]) -> Any:
+        attempts = self.max_attempts if email_service.enabled else 1
+        for attempt in range(1, attempts + 1):
+            try:
+                result = send()
+                if result is not False or attempt == attempts:
+                    return result
+            except Exception:
+                if attempt == attempts:
+                    raise
+            time.sleep(self.retry_backoff_seconds * 2 ** (attempt - 1))
+
+    def _finish(self, future: Future):
+        self._pending.release()
+        error = future.exception()
+        if error is not None:
+            app_logger.error(
+                "Failed to send email",
+                {"error": str(error), "error_type": type(error).__name__}
+            )
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting sends; optionally wait for queued ones to finish"""
+        self._executor.shutdown(wait=wait)
+
+
+# Global email dispatcher instance
+email_dispatcher = EmailDispatcher()
@@ -23,7 +23,13 @@ Note: For Gmail, you need to:
     3. Use the app password as SMTP_PASSWORD
 """
 import os
+import queue
 import smtplib
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from html import escape
+from string import Template
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Optional, List
@@ -36,25 +42,158 @@ try:
 except ImportError:
     pass  # dotenv not available, use environment variables directly
 
+# Idle SMTP sessions kept open for reuse (matches the email dispatcher's worker count)
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+# Sessions idle longer than this are checked with NOOP before reuse
+SMTP_IDLE_CHECK_SECONDS = 60
+
+
+@dataclass(frozen=True, slots=True)
+class SMTPConfig:
+    """SMTP settings read from the environment"""
+    host: str
+    port: int
+    user: str
+    password: str
+    from_email: str
+    admin_email: str
+
+
+@lru_cache(maxsize=1)
+def load_smtp_config() -> SMTPConfig:
+    """Read the SMTP settings once (EmailService instances share the result)"""
+    # Support both SMTP_* and EMAIL_* prefixes for flexibility
+    user = os.getenv("SMTP_USER") or os.getenv("EMAIL_USER", "")
+    return SMTPConfig(
+        host=os.getenv("SMTP_HOST") or os.getenv("EMAIL_HOST", "smtp.gmail.com"),
+        port=int(os.getenv("SMTP_PORT") or os.getenv("EMAIL_PORT", "587")),
+        user=user,
+        password=os.getenv("SMTP_PASSWORD") or os.getenv("EMAIL_PASSWORD", ""),
+        from_email=os.getenv("SMTP_FROM_EMAIL") or os.getenv("EMAIL_FROM") or user,
+        # Support CONTACT_EMAIL, ADMIN_EMAIL, or EMAIL_ADMIN for admin notifications
+        admin_email=(
+            os.getenv("CONTACT_EMAIL") or
+            os.getenv("ADMIN_EMAIL") or
+            os.getenv("EMAIL_ADMIN", "admin@dosibridge.com")
+        ),
+    )
+
+
+_REQUEST_TYPE_LABELS = {
+    "appointment": "Appointment",
+    "contact": "Contact Request",
+    "support": "Support Request"
+}
+
+# HTML bodies of the appointment emails, parsed once at import
+_CONFIRMATION_HTML = Template("""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <style>
+                body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+                .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+                .header { background-color: #4F46E5; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }
+                .content { background-color: #f9fafb; padding: 30px; border-radius: 0 0 5px 5px; }
+                .info-box { background-color: white; padding: 15px; margin: 15px 0; border-left: 4px solid #4F46E5; border-radius: 4px; }
+                .footer { text-align: center; margin-top: 20px; color: #6b7280; font-size: 12px; }
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>DOSIBridge</h1>
+                </div>
+                <div class="content">
+                    <h2>Thank you, ${to_name}!</h2>
+                    <p>We've received your ${request_type_label_lower} and will get back to you soon.</p>
+                    
+                    <div class="info-box">
+                        <strong>Request ID:</strong> #${appointment_id}<br>
+                        <strong>Type:</strong> ${request_type_label}
+                        ${preferred_date}
+                        ${preferred_time}
+                    </div>
+                    
+                    <p>Our team will review your request and contact you at <strong>${to_email}</strong> within 24-48 hours.</p>
+                    
+                    <p>If you have any urgent questions, please don't hesitate to reach out to us directly.</p>
+                </div>
+                <div class="footer">
+                    <p>© 2025 DOSIBridge. All rights reserved.</p>
+                    <p>This is an automated confirmation email.</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """)
+
+_TEAM_NOTIFICATION_HTML = Template("""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <style>
+                body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+                .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+                .header { background-color: #DC2626; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }
+                .content { background-color: #f9fafb; padding: 30px; border-radius: 0 0 5px 5px; }
+                .info-box { background-color: white; padding: 15px; margin: 15px 0; border-left: 4px solid #DC2626; border-radius: 4px; }
+                .message-box { background-color: #fef2f2; padding: 15px; margin: 15px 0; border-radius: 4px; }
+                .footer { text-align: center; margin-top: 20px; color: #6b7280; font-size: 12px; }
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>New ${request_type_label}</h1>
+                </div>
+                <div class="content">
+                    <h2>Request #${appointment_id}</h2>
+                    
+                    <div class="info-box">
+                        <strong>Name:</strong> ${name}<br>
+                        <strong>Email:</strong> <a href="mailto:${email}">${email}</a><br>
+                        ${phone}
+                        <strong>Type:</strong> ${request_type_label}
+                        ${preferred_date}
+                        ${preferred_time}
+                        ${user}
+                    </div>
+                    
+                    ${subject}
+                    
+                    <div class="message-box">
+                        <strong>Message:</strong><br>
+                        ${message}
+                    </div>
+                    
+                    <p><a href="mailto:${email}">Reply to ${name}</a></p>
+                </div>
+                <div class="footer">
+                    <p>DOSIBridge Appointment System</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """)
+
 
 class EmailService:
     """Service for sending emails via SMTP"""
     
     def __init__(self):
-        # Load SMTP configuration from environment variables
-        # Support both SMTP_* and EMAIL_* prefixes for flexibility
-        self.smtp_host = os.getenv("SMTP_HOST") or os.getenv("EMAIL_HOST", "smtp.gmail.com")
-        self.smtp_port = int(os.getenv("SMTP_PORT") or os.getenv("EMAIL_PORT", "587"))
-        self.smtp_user = os.getenv("SMTP_USER") or os.getenv("EMAIL_USER", "")
-        self.smtp_password = os.getenv("SMTP_PASSWORD") or os.getenv("EMAIL_PASSWORD", "")
-        # Set from_email after smtp_user is defined
-        self.from_email = os.getenv("SMTP_FROM_EMAIL") or os.getenv("EMAIL_FROM") or self.smtp_user
-        # Support CONTACT_EMAIL, ADMIN_EMAIL, or EMAIL_ADMIN for admin notifications
-        self.admin_email = (
-            os.getenv("CONTACT_EMAIL") or 
-            os.getenv("ADMIN_EMAIL") or 
-            os.getenv("EMAIL_ADMIN", "admin@dosibridge.com")
-        )
+        config = load_smtp_config()
+        self.smtp_host = config.host
+        self.smtp_port = config.port
+        self.smtp_user = config.user
+        self.smtp_password = config.password
+        self.from_email = config.from_email
+        self.admin_email = config.admin_email
+        
+        # Idle authenticated SMTP sessions, reused across sends
+        self._connections: "queue.LifoQueue" = queue.LifoQueue(maxsize=SMTP_POOL_SIZE)
         
         # Check if email service is enabled
         self.enabled = bool(self.smtp_user and self.smtp_password)
@@ -82,6 +221,72 @@ class EmailService:
                 }
             )
     
+    def _connect(self) -> smtplib.SMTP:
+        """Open an authenticated SMTP session - handle both TLS (587) and SSL (465) connections"""
+        if self.smtp_port == 465:
+            # SSL connection for port 465
+            server = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port)
+        else:
+            # TLS connection for port 587 or others
+            server = smtplib.SMTP(self.smtp_host, self.smtp_port)
+            server.starttls()
+        try:
+            server.login(self.smtp_user, self.smtp_password)
+        except Exception:
+            self._close(server)
+            raise
+        return server
+    
+    @staticmethod
+    def _close(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+    
+    def _checkout(self) -> smtplib.SMTP:
+        """Reuse a pooled session (NOOP-checked if it sat idle), or open a new one"""
+        while True:
+            try:
+                server, last_used = self._connections.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < SMTP_IDLE_CHECK_SECONDS:
+                return server
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except smtplib.SMTPException:
+                pass
+            self._close(server)
+    
+    def _checkin(self, server: smtplib.SMTP):
+        try:
+            self._connections.put_nowait((server, time.monotonic()))
+        except queue.Full:
+            self._close(server)
+    
+    def _send_pooled(self, msg: MIMEMultipart, recipients: List[str]):
+        """
+        Send over a pooled SMTP session, so only the first sends pay the
+        connect + TLS + login handshake
+        """
+        server = self._checkout()
+        try:
+            server.send_message(msg, to_addrs=recipients)
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped an idle session; retry once on a fresh one
+            server = self._connect()
+            try:
+                server.send_message(msg, to_addrs=recipients)
+            except Exception:
+                self._close(server)
+                raise
+        except Exception:
+            self._close(server)
+            raise
+        self._checkin(server)
+    
     def send_email(
         self,
         to_email: str,
@@ -127,24 +332,10 @@ class EmailService:
             html_part = MIMEText(html_body, "html")
             msg.attach(html_part)
             
-            # Send email - handle both TLS (587) and SSL (465) connections
-            if self.smtp_port == 465:
-                # SSL connection for port 465
-                with smtplib.SMTP_SSL(self.smtp_host, self.smtp_port) as server:
-                    server.login(self.smtp_user, self.smtp_password)
-                    recipients = [to_email]
-                    if cc:
-                        recipients.extend(cc)
-                    server.send_message(msg, to_addrs=recipients)
-            else:
-                # TLS connection for port 587 or others
-                with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                    server.starttls()
-                    server.login(self.smtp_user, self.smtp_password)
-                    recipients = [to_email]
-                    if cc:
-                        recipients.extend(cc)
-                    server.send_message(msg, to_addrs=recipients)
+            recipients = [to_email]
+            if cc:
+                recipients.extend(cc)
+            self._send_pooled(msg, recipients)
             
             app_logger.info(
                 "Email sent successfully",
@@ -217,57 +408,20 @@ class EmailService:
         Returns:
             True if email sent successfully, False otherwise
         """
-        request_type_label = {
-            "appointment": "Appointment",
-            "contact": "Contact Request",
-            "support": "Support Request"
-        }.get(request_type, "Request")
+        request_type_label = _REQUEST_TYPE_LABELS.get(request_type, "Request")
         
         subject = f"✅ {request_type_label} Confirmation - DOSIBridge"
         
-        # Build HTML body
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #4F46E5; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
-                .content {{ background-color: #f9fafb; padding: 30px; border-radius: 0 0 5px 5px; }}
-                .info-box {{ background-color: white; padding: 15px; margin: 15px 0; border-left: 4px solid #4F46E5; border-radius: 4px; }}
-                .footer {{ text-align: center; margin-top: 20px; color: #6b7280; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>DOSIBridge</h1>
-                </div>
-                <div class="content">
-                    <h2>Thank you, {to_name}!</h2>
-                    <p>We've received your {request_type_label.lower()} and will get back to you soon.</p>
-                    
-                    <div class="info-box">
-                        <strong>Request ID:</strong> #{appointment_id}<br>
-                        <strong>Type:</strong> {request_type_label}
-                        {f'<br><strong>Preferred Date:</strong> {preferred_date}' if preferred_date else ''}
-                        {f'<br><strong>Preferred Time:</strong> {preferred_time}' if preferred_time else ''}
-                    </div>
-                    
-                    <p>Our team will review your request and contact you at <strong>{to_email}</strong> within 24-48 hours.</p>
-                    
-                    <p>If you have any urgent questions, please don't hesitate to reach out to us directly.</p>
-                </div>
-                <div class="footer">
-                    <p>© 2025 DOSIBridge. All rights reserved.</p>
-                    <p>This is an automated confirmation email.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        # Build HTML body (user-supplied values are escaped)
+        html_body = _CONFIRMATION_HTML.substitute(
+            to_name=escape(to_name),
+            to_email=escape(to_email),
+            appointment_id=appointment_id,
+            request_type_label=request_type_label,
+            request_type_label_lower=request_type_label.lower(),
+            preferred_date=f'<br><strong>Preferred Date:</strong> {escape(preferred_date)}' if preferred_date else '',
+            preferred_time=f'<br><strong>Preferred Time:</strong> {escape(preferred_time)}' if preferred_time else '',
+        )
         
         # Plain text version
         text_body = f"""
@@ -321,64 +475,23 @@ This is an automated confirmation email.
         Returns:
             True if email sent successfully, False otherwise
         """
-        request_type_label = {
-            "appointment": "Appointment",
-            "contact": "Contact Request",
-            "support": "Support Request"
-        }.get(request_type, "Request")
+        request_type_label = _REQUEST_TYPE_LABELS.get(request_type, "Request")
         
         subject_line = f"🔔 New {request_type_label}: {name} - Request #{appointment_id}"
         
-        # Build HTML body
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #DC2626; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
-                .content {{ background-color: #f9fafb; padding: 30px; border-radius: 0 0 5px 5px; }}
-                .info-box {{ background-color: white; padding: 15px; margin: 15px 0; border-left: 4px solid #DC2626; border-radius: 4px; }}
-                .message-box {{ background-color: #fef2f2; padding: 15px; margin: 15px 0; border-radius: 4px; }}
-                .footer {{ text-align: center; margin-top: 20px; color: #6b7280; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>New {request_type_label}</h1>
-                </div>
-                <div class="content">
-                    <h2>Request #{appointment_id}</h2>
-                    
-                    <div class="info-box">
-                        <strong>Name:</strong> {name}<br>
-                        <strong>Email:</strong> <a href="mailto:{email}">{email}</a><br>
-                        {f'<strong>Phone:</strong> {phone}<br>' if phone else ''}
-                        <strong>Type:</strong> {request_type_label}
-                        {f'<br><strong>Preferred Date:</strong> {preferred_date}' if preferred_date else ''}
-                        {f'<br><strong>Preferred Time:</strong> {preferred_time}' if preferred_time else ''}
-                        {f'<br><strong>User ID:</strong> {user_id}' if user_id else '<br><strong>User:</strong> Anonymous'}
-                    </div>
-                    
-                    {f'<div class="info-box"><strong>Subject:</strong> {subject}</div>' if subject else ''}
-                    
-                    <div class="message-box">
-                        <strong>Message:</strong><br>
-                        {message.replace(chr(10), '<br>')}
-                    </div>
-                    
-                    <p><a href="mailto:{email}">Reply to {name}</a></p>
-                </div>
-                <div class="footer">
-                    <p>DOSIBridge Appointment System</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        # Build HTML body (user-supplied values are escaped)
+        html_body = _TEAM_NOTIFICATION_HTML.substitute(
+            name=escape(name),
+            email=escape(email),
+            appointment_id=appointment_id,
+            request_type_label=request_type_label,
+            phone=f'<strong>Phone:</strong> {escape(phone)}<br>' if phone else '',
+            preferred_date=f'<br><strong>Preferred Date:</strong> {escape(preferred_date)}' if preferred_date else '',
+            preferred_time=f'<br><strong>Preferred Time:</strong> {escape(preferred_time)}' if preferred_time else '',
+            user=f'<br><strong>User ID:</strong> {user_id}' if user_id else '<br><strong>User:</strong> Anonymous',
+            subject=f'<div class="info-box"><strong>Subject:</strong> {escape(subject)}</div>' if subject else '',
+            message=escape(message).replace(chr(10), '<br>'),
+        )
         
         # Plain text version
         text_body = f"""
@@ -1,14 +1,29 @@
 """
 Encryption utilities for sensitive data (e.g., MCP API keys)
-Uses Fernet symmetric encryption from cryptography library
+
+New values are encrypted with AES-256-GCM and stored as "v2:<nonce>:<ciphertext>"
+(URL-safe base64). Fernet tokens written by earlier versions ("gAAAAAB...") are
+still decrypted. Both ciphers use keys derived from the same configured key.
 """
 import os
 import base64
-from typing import Optional
+import logging
+from functools import lru_cache
+from typing import NamedTuple, Optional
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
+logger = logging.getLogger(__name__)
+
+# Prefix of AES-GCM tokens; Fernet tokens always start with FERNET_TOKEN_PREFIX
+AESGCM_TOKEN_PREFIX = "v2:"
+FERNET_TOKEN_PREFIX = "gAAAAAB"
+_AESGCM_TOKEN_PREFIX_BYTES = AESGCM_TOKEN_PREFIX.encode()
+_AESGCM_NONCE_BYTES = 12
+
 
 class EncryptionError(Exception):
     """Raised when encryption/decryption fails"""
@@ -57,7 +72,7 @@ def get_encryption_key() -> bytes:
                 return _derive_key_from_password(encryption_key_env)
         except Exception as e:
             # If any error occurs, use it as password and derive key
-            print(f"⚠️  Warning: Error processing MCP_APIKEY_ENCRYPTION_KEY: {e}. Deriving key from password.")
+            logger.warning(f"Error processing MCP_APIKEY_ENCRYPTION_KEY: {e}. Deriving key from password.")
             return _derive_key_from_password(encryption_key_env)
     
     # Fallback: derive from JWT_SECRET_KEY
@@ -66,12 +81,20 @@ def get_encryption_key() -> bytes:
         return _derive_key_from_password(jwt_secret)
     
     # Last resort: generate a key (not recommended for production)
-    print("⚠️  Warning: No encryption key found. Generating a temporary key.")
-    print("   This key will change on restart - encrypted data will be lost!")
-    print("   Set MCP_APIKEY_ENCRYPTION_KEY environment variable for persistent encryption.")
+    _warn_temporary_key()
     return Fernet.generate_key()
 
 
+@lru_cache(maxsize=1)
+def _warn_temporary_key() -> None:
+    """Log the missing-key warning once per process rather than on every call"""
+    logger.warning(
+        "No encryption key found. Generating a temporary key. "
+        "This key will change on restart - encrypted data will be lost! "
+        "Set MCP_APIKEY_ENCRYPTION_KEY environment variable for persistent encryption."
+    )
+
+
 def _derive_key_from_password(password: str) -> bytes:
     """
     Derive a Fernet key from a password using PBKDF2.
@@ -97,30 +120,81 @@ def _derive_key_from_password(password: str) -> bytes:
     return key
 
 
+class _Ciphers(NamedTuple):
+    fernet: Fernet
+    aesgcm: AESGCM
+
+
+@lru_cache(maxsize=1)
+def _ciphers_for(encryption_key_env: Optional[str], jwt_secret: Optional[str]) -> _Ciphers:
+    """Build the ciphers for one combination of key settings (cache key only; values are read by get_encryption_key)"""
+    key = get_encryption_key()
+    # Ensure key is bytes (Fernet accepts both str and bytes)
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+    fernet = Fernet(key)
+    # Separate AES-GCM key, so the Fernet key material isn't reused by another cipher
+    aesgcm_key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"mcp_apikey_aesgcm_v2",
+    ).derive(base64.urlsafe_b64decode(key))
+    return _Ciphers(fernet, AESGCM(aesgcm_key))
+
+
+def _get_ciphers() -> _Ciphers:
+    """
+    Ciphers for the current key settings.
+    
+    Cached so the PBKDF2 derivation (100,000 iterations) runs once rather than on every
+    encrypt/decrypt, and a generated fallback key stays the same for the whole process.
+    Changing either environment variable builds new instances.
+    """
+    return _ciphers_for(os.getenv("MCP_APIKEY_ENCRYPTION_KEY"), os.getenv("JWT_SECRET_KEY"))
+
+
 def encrypt_value(value: str) -> Optional[str]:
     """
-    Encrypt a string value using Fernet.
+    Encrypt a string value using AES-256-GCM.
     
     Args:
         value: String to encrypt
         
     Returns:
-        Encrypted string (base64-encoded), or None if value is None/empty
+        Encrypted string ("v2:<nonce>:<ciphertext>", base64-encoded), or None if value is None/empty
         
     Raises:
         EncryptionError: If encryption fails
     """
     if not value:
         return None
+    return encrypt_value_bytes(value.encode()).decode()
+
+
+def encrypt_value_bytes(value: bytes) -> bytes:
+    """
+    Encrypt raw bytes using AES-256-GCM, for callers that already hold bytes.
     
+    Args:
+        value: Bytes to encrypt
+        
+    Returns:
+        Encrypted token as ASCII bytes (same format as encrypt_value)
+        
+    Raises:
+        EncryptionError: If encryption fails
+    """
     try:
-        key = get_encryption_key()
-        # Ensure key is bytes (Fernet accepts both str and bytes)
-        if isinstance(key, str):
-            key = key.encode('utf-8')
-        fernet = Fernet(key)
-        encrypted = fernet.encrypt(value.encode())
-        return encrypted.decode()
+        aesgcm = _get_ciphers().aesgcm
+        nonce = os.urandom(_AESGCM_NONCE_BYTES)
+        encrypted = aesgcm.encrypt(nonce, value, None)
+        return b"".join((
+            _AESGCM_TOKEN_PREFIX_BYTES,
+            base64.urlsafe_b64encode(nonce),
+            b":",
+            base64.urlsafe_b64encode(encrypted),
+        ))
     except ValueError as e:
         # Fernet key validation error - provide helpful message
         error_msg = str(e)
@@ -136,7 +210,7 @@ def encrypt_value(value: str) -> Optional[str]:
 
 def decrypt_value(encrypted_value: Optional[str]) -> Optional[str]:
     """
-    Decrypt a string value using Fernet.
+    Decrypt a value produced by encrypt_value (AES-GCM or legacy Fernet token).
     
     Args:
         encrypted_value: Encrypted string (base64-encoded)
@@ -150,11 +224,13 @@ def decrypt_value(encrypted_value: Optional[str]) -> Optional[str]:
     if not encrypted_value:
         return None
     
+    # Legacy values stored before encryption was added are returned as-is
+    # without building the key or attempting a decrypt
+    if not is_encrypted(encrypted_value):
+        return encrypted_value
+    
     try:
-        key = get_encryption_key()
-        fernet = Fernet(key)
-        decrypted = fernet.decrypt(encrypted_value.encode())
-        return decrypted.decode()
+        return decrypt_value_bytes(encrypted_value.encode()).decode()
     except Exception as e:
         # If decryption fails, it might be an old unencrypted value
         # Try to return as-is (for backward compatibility during migration)
@@ -162,13 +238,38 @@ def decrypt_value(encrypted_value: Optional[str]) -> Optional[str]:
         error_str = str(e).lower()
         if "invalid token" not in error_str and "incorrect padding" not in error_str:
             # Only log if it's an unexpected error
-            import logging
-            logger = logging.getLogger(__name__)
             logger.debug(f"Failed to decrypt value (might be unencrypted): {str(e)}")
         # Return the value as-is - might be unencrypted from before encryption was added
         return encrypted_value
 
 
+def decrypt_value_bytes(token: bytes) -> bytes:
+    """
+    Decrypt a token (AES-GCM or legacy Fernet) given as bytes, returning raw bytes.
+    
+    Unlike decrypt_value, there is no fallback for unencrypted input.
+    
+    Args:
+        token: Encrypted token as ASCII bytes
+        
+    Returns:
+        Decrypted bytes
+        
+    Raises:
+        Exception: From the cipher if the token is malformed, tampered with or
+            encrypted with another key
+    """
+    ciphers = _get_ciphers()
+    if token.startswith(_AESGCM_TOKEN_PREFIX_BYTES):
+        nonce, _, encrypted = token[len(_AESGCM_TOKEN_PREFIX_BYTES):].partition(b":")
+        return ciphers.aesgcm.decrypt(
+            base64.urlsafe_b64decode(nonce),
+            base64.urlsafe_b64decode(encrypted),
+            None
+        )
+    return ciphers.fernet.decrypt(token)
+
+
 def is_encrypted(value: Optional[str]) -> bool:
     """
     Check if a value appears to be encrypted.
@@ -179,13 +280,7 @@ def is_encrypted(value: Optional[str]) -> bool:
     Returns:
         True if value appears to be encrypted, False otherwise
     """
-    if not value:
-        return False
-    
-    # Fernet-encrypted values are base64-encoded and have a specific format
-    # They start with 'gAAAAAB' (Fernet token header)
-    try:
-        return value.startswith('gAAAAAB')
-    except Exception:
-        return False
+    # AES-GCM tokens carry the "v2:" prefix; legacy Fernet tokens start
+    # with 'gAAAAAB' (Fernet token header)
+    return isinstance(value, str) and value.startswith((AESGCM_TOKEN_PREFIX, FERNET_TOKEN_PREFIX))
 
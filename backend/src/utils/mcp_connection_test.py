@@ -2,37 +2,239 @@
 Utility function to test MCP server connections
 """
 import asyncio
+import hashlib
 import os
-from typing import Optional, Tuple
+import re
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import urlparse
+from typing import List, Optional, Tuple
 import logging
+import httpx
+from src.utils.cache import Cache
+from src.utils.validators import normalize_mcp_url
 
 logger = logging.getLogger(__name__)
 
+# Whether this process runs in a container (checked once; it can't change at runtime)
+_IN_DOCKER = bool(os.getenv('DOCKER_CONTAINER')) or os.path.exists('/.dockerenv')
+
+# How long a probe result is reused for the same server and credentials
+PROBE_CACHE_TTL_SECONDS = 30
+
+# Budget for the HEAD request that rejects unreachable http/sse servers early
+FAST_REJECT_TIMEOUT_SECONDS = 1.0
+
+_probe_cache = Cache(default_ttl_seconds=PROBE_CACHE_TTL_SECONDS, max_entries=512)
+
+try:
+    from mcp import ClientSession
+    from mcp.client.sse import sse_client
+    from mcp.client.stdio import stdio_client
+    from mcp.client.streamable_http import streamablehttp_client
+except ImportError as e:
+    logger.error(f"MCP library not available: {e}")
+    ClientSession = sse_client = stdio_client = streamablehttp_client = None
+
+_HTTP_STATUS_MESSAGES = {
+    401: "Authentication failed - check API key",
+    403: "Access forbidden - check API key permissions or CORS configuration",
+    404: "MCP endpoint not found - check URL and ensure it ends with /mcp",
+    406: "Server does not accept the connection format - may not be a valid MCP server",
+    502: "Bad Gateway - the server is unreachable or the reverse proxy cannot connect to it",
+    503: "Service Unavailable - the server may be down or overloaded",
+}
+
+# Status code or reason phrase to look for in errors that carry no response
+_ERROR_TEXT_STATUSES = (
+    (404, "Not Found"),
+    (401, "Unauthorized"),
+    (403, "Forbidden"),
+    (406, "Not Acceptable"),
+    (502, "Bad Gateway"),
+    (503, "Service Unavailable"),
+)
+
+# Regex group -> message, in priority order: "closed" (any case) first, then
+# the statuses above; one scan finds every marker in the error text
+_ERROR_TEXT_MESSAGES = {
+    "closed": "Connection closed - the server closed the connection. This may be due to: 1) Reverse proxy blocking the connection, 2) Server not accepting the MCP protocol, 3) Network/firewall issues. Try accessing the endpoint directly to verify it's reachable.",
+    **{f"http_{status}": _HTTP_STATUS_MESSAGES[status] for status, _ in _ERROR_TEXT_STATUSES},
+}
+_ERROR_TEXT_RE = re.compile("|".join(
+    ["(?P<closed>(?i:closed))"]
+    + [f"(?P<http_{status}>{status}|{re.escape(phrase)})" for status, phrase in _ERROR_TEXT_STATUSES]
+))
+
+# Message when the server closes the connection, by the step that was running
+_CLOSED_DURING_STAGE = {
+    "connect": "Connection closed immediately - server may be rejecting the connection. If testing your own backend, ensure the endpoint is accessible and not blocked by a reverse proxy.",
+    "session": "Connection closed during session creation - server may not support MCP protocol or is rejecting the connection.",
+    "initialize": "Connection closed during initialization - server may not be a valid MCP server or is rejecting the initialization request.",
+}
+
+
+def _describe_connection_error(error: Exception) -> str:
+    """Turn a failed connection attempt into a helpful message"""
+    error_msg = str(error)
+    if isinstance(error, ConnectionError):
+        if "closed" in error_msg.lower() or "Connection closed" in error_msg:
+            return "Connection closed - server may be behind a reverse proxy or firewall. Try checking if the endpoint is accessible directly."
+        return f"Connection failed - {error_msg}"
+    if isinstance(error, FileNotFoundError):
+        return f"Command not found for stdio connection: {error_msg}"
+    
+    # Prefer the real HTTP status when the client raised one
+    status_error = _find_http_status_error(error)
+    if status_error is not None:
+        return _HTTP_STATUS_MESSAGES.get(
+            status_error.response.status_code,
+            f"Connection failed: HTTP {status_error.response.status_code}"
+        )
+    
+    # Otherwise fall back to what the error text mentions
+    found = {match.lastgroup for match in _ERROR_TEXT_RE.finditer(error_msg)}
+    for group, message in _ERROR_TEXT_MESSAGES.items():
+        if group in found:
+            return message
+    return f"Connection failed: {error_msg}"
+
+
+def _find_http_status_error(error: BaseException) -> Optional[httpx.HTTPStatusError]:
+    """The HTTPStatusError behind error, looking inside exception groups from the client's task group"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error
+    if isinstance(error, BaseExceptionGroup):
+        for inner in error.exceptions:
+            found = _find_http_status_error(inner)
+            if found is not None:
+                return found
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _normalize_mcp_url(url: str, connection_type: str) -> str:
+    """
+    Endpoint URL to probe for an http/sse server (memoized: health checks and
+    refreshes probe the same few URLs over and over)
+    """
+    # For http/sse, normalize URL
+    normalized_url = url.rstrip('/')
+
+    # If testing a local server (same host), try using internal network URL
+    # This helps avoid reverse proxy issues when testing your own backend
+    try:
+        parsed = urlparse(normalized_url)
+        url_host = parsed.hostname
+
+        # Check if URL points to localhost, same host, or contains /api/mcp/ (likely our own backend)
+        is_local = (
+            url_host in ('localhost', '127.0.0.1', 'agent-backend', 'agent-backend.agent-dosi-network') or
+            '/api/mcp/' in normalized_url  # If URL contains /api/mcp/, it's likely our own backend
+        )
+
+        # Use internal container network URL if in Docker and testing local server
+        if is_local and _IN_DOCKER:
+            # Replace with internal network URL
+            if url_host not in ('agent-backend', 'agent-backend.agent-dosi-network', 'localhost', '127.0.0.1'):
+                # Extract the path from the original URL
+                path = parsed.path
+                normalized_url = f'http://agent-backend:8000{path}'
+                logger.info(f"Using internal network URL for local server: {normalized_url}")
+    except Exception as e:
+        # If detection fails, continue with original URL
+        logger.debug(f"Could not detect local server: {e}")
+        pass
+
+    return normalize_mcp_url(normalized_url, connection_type)
+
+
+async def _fast_reject(url: str, headers: dict) -> Optional[str]:
+    """
+    Send a HEAD request to an http/sse endpoint and return an error message if
+    the server clearly can't be reached (DNS failure or connection refused).
+    Anything else returns None so the full MCP handshake decides: a slow
+    connect may still complete within the handshake timeout, and servers that
+    only route POST/GET on the MCP path often answer HEAD with 404.
+    """
+    try:
+        async with httpx.AsyncClient(timeout=httpx.Timeout(FAST_REJECT_TIMEOUT_SECONDS)) as client:
+            await client.head(url, headers=headers)
+    except httpx.ConnectError as e:
+        return f"Connection failed - {e}"
+    except Exception:
+        pass
+    return None
+
+
+@lru_cache(maxsize=256)
+def _split_command(command: str) -> Tuple[str, ...]:
+    """shlex.split for stdio commands, memoized since the same commands are probed repeatedly"""
+    return tuple(shlex.split(command))
+
+
+def _probe_cache_key(url: str, connection_type: Optional[str], api_key: Optional[str], headers: Optional[dict]) -> tuple:
+    """Cache key for a probe; credentials are hashed so they aren't kept in memory as-is"""
+    credentials = hashlib.blake2s(digest_size=8)
+    credentials.update((api_key or '').encode())
+    for name, value in sorted((headers or {}).items()):
+        credentials.update(f"\0{name}\0{value}".encode())
+    return (url, connection_type, credentials.hexdigest())
+
 
 async def test_mcp_connection(
     url: str,
     connection_type: str = "http",
     api_key: Optional[str] = None,
     headers: Optional[dict] = None,
-    timeout: float = 5.0
+    timeout: float = 5.0,
+    force_refresh: bool = False
 ) -> Tuple[bool, str]:
     """
     Test if an MCP server is accessible and responding.
     Uses the actual MCP client to establish a real connection.
     
+    Successful results are cached for PROBE_CACHE_TTL_SECONDS, so repeated
+    tests of the same server (UI refreshes, health checks) don't reconnect
+    every time. Failures are not cached, so a server that was just started or
+    fixed passes on the next try.
+    
     Args:
         url: MCP server URL or command (for stdio)
         connection_type: Connection type - "stdio", "http", or "sse" (default: "http")
         api_key: Optional API key for authentication
         headers: Optional custom headers as key-value pairs
         timeout: Connection timeout in seconds (default: 5.0)
+        force_refresh: Skip the cache and probe the server again
         
     Returns:
         Tuple of (success: bool, message: str)
     """
+    cache_key = _probe_cache_key(url, connection_type, api_key, headers)
+    if not force_refresh:
+        cached = _probe_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
+    result = await _probe_mcp_server(url, connection_type, api_key, headers, timeout)
+    if result[0]:
+        _probe_cache.set(cache_key, result)
+    return result
+
+
+async def _probe_mcp_server(
+    url: str,
+    connection_type: str,
+    api_key: Optional[str],
+    headers: Optional[dict],
+    timeout: float
+) -> Tuple[bool, str]:
+    """Connect to the server and initialize an MCP session (uncached)"""
+    if ClientSession is None:
+        return False, "MCP library not available - cannot test connection"
+    
     try:
-        from mcp import ClientSession
-        
         # Normalize connection type
         connection_type = connection_type.lower() if connection_type else "http"
         if connection_type not in ("stdio", "http", "sse"):
@@ -45,195 +247,123 @@ async def test_mcp_connection(
             if not normalized_url:
                 return False, "Command is required for stdio connection type"
         else:
-            # For http/sse, normalize URL
-            normalized_url = url.rstrip('/')
-            
-            # If testing a local server (same host), try using internal network URL
-            # This helps avoid reverse proxy issues when testing your own backend
-            try:
-                from urllib.parse import urlparse
-                parsed = urlparse(normalized_url)
-                url_host = parsed.hostname
-                
-                # Check if URL points to localhost, same host, or contains /api/mcp/ (likely our own backend)
-                is_local = (
-                    url_host in ('localhost', '127.0.0.1', 'agent-backend', 'agent-backend.agent-dosi-network') or
-                    '/api/mcp/' in normalized_url  # If URL contains /api/mcp/, it's likely our own backend
-                )
-                
-                # Use internal container network URL if in Docker and testing local server
-                if is_local and (os.getenv('DOCKER_CONTAINER') or os.path.exists('/.dockerenv')):
-                    # Replace with internal network URL
-                    if url_host not in ('agent-backend', 'agent-backend.agent-dosi-network', 'localhost', '127.0.0.1'):
-                        # Extract the path from the original URL
-                        path = parsed.path
-                        normalized_url = f'http://agent-backend:8000{path}'
-                        logger.info(f"Using internal network URL for local server: {normalized_url}")
-            except Exception as e:
-                # If detection fails, continue with original URL
-                logger.debug(f"Could not detect local server: {e}")
-                pass
-            
-            if connection_type == "sse" and not normalized_url.endswith('/sse'):
-                if normalized_url.endswith('/mcp'):
-                    normalized_url = normalized_url[:-4] + '/sse'
-                else:
-                    normalized_url = normalized_url.rstrip('/') + '/sse'
-            elif connection_type == "http":
-                if normalized_url.endswith('/sse'):
-                    normalized_url = normalized_url[:-4]
-                if not normalized_url.endswith('/mcp'):
-                    normalized_url = normalized_url.rstrip('/') + '/mcp'
+            normalized_url = _normalize_mcp_url(url, connection_type)
         
         # Try to establish MCP connection based on type
-        client = None
-        session = None
+        stage = None
+        connected = False
         try:
             if connection_type == "stdio":
                 # For stdio, use stdio client
-                from mcp.client.stdio import stdio_client
-                import shlex
-                
                 # Parse command
-                command_parts = shlex.split(normalized_url)
+                command_parts = list(_split_command(normalized_url))
                 if not command_parts:
                     return False, "Invalid command for stdio connection"
                 
                 server_params = {"command": command_parts}
                 client = stdio_client(**server_params)
                 
-            elif connection_type == "sse":
-                # For SSE, use SSE client
-                from mcp.client.sse import sse_client
-                
-                server_params = {"url": normalized_url}
+            else:
                 # Start with custom headers if provided
                 header_dict = dict(headers) if headers else {}
                 # Add API key header if provided
                 if api_key:
                     header_dict["x-api-key"] = api_key
-                if header_dict:
-                    server_params["headers"] = header_dict
-                
-                client = sse_client(**server_params)
                 
-            else:  # http
-                # For HTTP, use streamable HTTP client
-                from mcp.client.streamable_http import streamablehttp_client
+                # Cheap HTTP request first: unreachable hosts and missing
+                # endpoints fail here without paying for the MCP handshake
+                rejection = await _fast_reject(normalized_url, header_dict)
+                if rejection:
+                    return False, rejection
                 
                 server_params = {"url": normalized_url}
-                # Start with custom headers if provided
-                header_dict = dict(headers) if headers else {}
-                # Add API key header if provided
-                if api_key:
-                    header_dict["x-api-key"] = api_key
                 if header_dict:
                     server_params["headers"] = header_dict
                 
-                client = streamablehttp_client(**server_params)
-            
-            # Try to connect with timeout
-            try:
-                read, write, _ = await asyncio.wait_for(
-                    client.__aenter__(),
-                    timeout=timeout
-                )
-            except Exception as e:
-                error_str = str(e)
-                if "closed" in error_str.lower() or "Connection closed" in error_str:
-                    return False, "Connection closed immediately - server may be rejecting the connection. If testing your own backend, ensure the endpoint is accessible and not blocked by a reverse proxy."
-                raise
-            
-            # Create session
-            try:
-                session = ClientSession(read, write)
-                await asyncio.wait_for(
-                    session.__aenter__(),
-                    timeout=3.0
-                )
-            except Exception as e:
-                error_str = str(e)
-                if "closed" in error_str.lower() or "Connection closed" in error_str:
-                    return False, "Connection closed during session creation - server may not support MCP protocol or is rejecting the connection."
-                raise
+                if connection_type == "sse":
+                    # For SSE, use SSE client
+                    client = sse_client(**server_params)
+                else:  # http
+                    # For HTTP, use streamable HTTP client
+                    client = streamablehttp_client(**server_params)
             
-            # Try to initialize (this is the real test)
-            try:
-                await asyncio.wait_for(
-                    session.initialize(),
-                    timeout=timeout
-                )
-            except Exception as e:
-                error_str = str(e)
-                if "closed" in error_str.lower() or "Connection closed" in error_str:
-                    return False, "Connection closed during initialization - server may not be a valid MCP server or is rejecting the initialization request."
-                raise
+            # Connect, open the session and initialize (the real test) under one
+            # timeout budget; the context managers close everything, even on timeout
+            async with asyncio.timeout(timeout):
+                stage = "connect"
+                async with client as streams:
+                    # stdio yields (read, write); http/sse add a session-id getter
+                    read, write = streams[0], streams[1]
+                    stage = "session"
+                    async with ClientSession(read, write) as session:
+                        stage = "initialize"
+                        await session.initialize()
+                        connected = True
             
             # Connection successful!
             return True, f"Connection successful ({connection_type}) - MCP server is reachable and responding"
             
-        except asyncio.TimeoutError:
-            return False, f"Connection timeout after {timeout}s - server may be unreachable or slow"
-        except ConnectionError as e:
-            error_str = str(e)
-            if "closed" in error_str.lower() or "Connection closed" in error_str:
-                return False, "Connection closed - server may be behind a reverse proxy or firewall. Try checking if the endpoint is accessible directly."
-            return False, f"Connection failed - {error_str}"
-        except FileNotFoundError as e:
-            return False, f"Command not found for stdio connection: {str(e)}"
         except Exception as e:
-            error_msg = str(e)
-            # Provide more helpful error messages
-            if "closed" in error_msg.lower() or "Connection closed" in error_msg:
-                return False, "Connection closed - the server closed the connection. This may be due to: 1) Reverse proxy blocking the connection, 2) Server not accepting the MCP protocol, 3) Network/firewall issues. Try accessing the endpoint directly to verify it's reachable."
-            elif "404" in error_msg or "Not Found" in error_msg:
-                return False, "MCP endpoint not found - check URL and ensure it ends with /mcp"
-            elif "401" in error_msg or "Unauthorized" in error_msg:
-                return False, "Authentication failed - check API key"
-            elif "403" in error_msg or "Forbidden" in error_msg:
-                return False, "Access forbidden - check API key permissions or CORS configuration"
-            elif "406" in error_msg or "Not Acceptable" in error_msg:
-                return False, "Server does not accept the connection format - may not be a valid MCP server"
-            elif "502" in error_msg or "Bad Gateway" in error_msg:
-                return False, "Bad Gateway - the server is unreachable or the reverse proxy cannot connect to it"
-            elif "503" in error_msg or "Service Unavailable" in error_msg:
-                return False, "Service Unavailable - the server may be down or overloaded"
-            else:
-                return False, f"Connection failed: {error_msg}"
-        finally:
-            # Clean up connections
-            try:
-                if session:
-                    await session.__aexit__(None, None, None)
-                if client:
-                    await client.__aexit__(None, None, None)
-            except Exception:
-                pass  # Ignore cleanup errors
+            if connected:
+                # Initialization succeeded; errors while closing the connection don't count
+                return True, f"Connection successful ({connection_type}) - MCP server is reachable and responding"
+            if isinstance(e, TimeoutError):
+                return False, f"Connection timeout after {timeout}s - server may be unreachable or slow"
+            error_str = str(e)
+            if stage and ("closed" in error_str.lower() or "Connection closed" in error_str):
+                return False, _CLOSED_DURING_STAGE[stage]
+            return False, _describe_connection_error(e)
                 
-    except ImportError as e:
-        logger.error(f"MCP library not available: {e}")
-        return False, "MCP library not available - cannot test connection"
     except Exception as e:
         logger.error(f"Error testing MCP connection: {e}")
         return False, f"Connection test failed: {str(e)}"
 
 
-async def test_mcp_connection_sync(
+async def test_mcp_connections(configs: List[dict], max_concurrency: int = 32) -> List[Tuple[bool, str]]:
+    """
+    Test several MCP servers concurrently.
+    
+    Args:
+        configs: One dict of test_mcp_connection keyword arguments per server
+        max_concurrency: Maximum number of probes with an open connection at once
+        
+    Returns:
+        One (success, message) tuple per config, in the same order
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def probe(config: dict) -> Tuple[bool, str]:
+        async with semaphore:
+            return await test_mcp_connection(**config)
+    
+    results = await asyncio.gather(*(probe(config) for config in configs), return_exceptions=True)
+    return [
+        (False, f"Connection test failed: {result}") if isinstance(result, Exception) else result
+        for result in results
+    ]
+
+
+def test_mcp_connection_sync(
     url: str,
     connection_type: str = "http",
     api_key: Optional[str] = None,
     headers: Optional[dict] = None,
-    timeout: float = 5.0
+    timeout: float = 5.0,
+    force_refresh: bool = False
 ) -> Tuple[bool, str]:
     """
     Synchronous wrapper for test_mcp_connection.
     Use this in non-async contexts.
+    
+    Each call runs on a fresh event loop that is closed afterwards, so the MCP
+    client's transports and async generators are cleaned up. If called from a
+    thread that already runs a loop, the test runs in a worker thread instead.
     """
+    args = (url, connection_type, api_key, headers, timeout, force_refresh)
     try:
-        loop = asyncio.get_event_loop()
+        asyncio.get_running_loop()
     except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        return asyncio.run(test_mcp_connection(*args))
     
-    return await test_mcp_connection(url, connection_type, api_key, headers, timeout)
-
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(lambda: asyncio.run(test_mcp_connection(*args))).result()
@@ -9,6 +9,7 @@ from pathlib import Path
 from sqlalchemy.orm import Session
 from .database import init_db, get_db_context, engine
 from .models import LLMConfig, MCPServer
+from .validators import normalize_mcp_url
 
 ROOT_DIR = Path(__file__).parent.parent
 
@@ -26,8 +27,7 @@ def migrate_llm_config(db: Session):
     # Try to migrate from JSON file if it exists
     if config_file.exists():
         try:
-            with open(config_file, 'r') as f:
-                config_data = json.load(f)
+            config_data = json.loads(config_file.read_bytes())
             
             # Create new config from JSON
             llm_config = LLMConfig(
@@ -68,31 +68,32 @@ def migrate_mcp_servers(db: Session):
         return
     
     try:
-        with open(config_file, 'r') as f:
-            servers_data = json.load(f)
+        servers_data = json.loads(config_file.read_bytes())
         
         if not isinstance(servers_data, list):
             print("⚠️  Invalid MCP servers file format, skipping migration")
             return
         
-        migrated_count = 0
+        # Look up which servers already exist in one query
+        names = [server_data.get("name") for server_data in servers_data if server_data.get("name")]
+        existing_names = {
+            name for (name,) in db.query(MCPServer.name).filter(MCPServer.name.in_(names)).all()
+        } if names else set()
+        
+        new_servers = []
         for server_data in servers_data:
             name = server_data.get("name")
             if not name:
                 continue
             
-            # Check if server already exists
-            existing = db.query(MCPServer).filter(MCPServer.name == name).first()
-            if existing:
+            # Check if server already exists (in the database or earlier in the file)
+            if name in existing_names:
                 print(f"  ⚠️  Server '{name}' already exists, skipping")
                 continue
+            existing_names.add(name)
             
             # Normalize URL
-            url = server_data.get("url", "").rstrip('/')
-            if url.endswith('/sse'):
-                url = url[:-4]
-            if not url.endswith('/mcp'):
-                url = url.rstrip('/') + '/mcp'
+            url = normalize_mcp_url(server_data.get("url", ""))
             
             # Create new server
             mcp_server = MCPServer(
@@ -101,11 +102,11 @@ def migrate_mcp_servers(db: Session):
                 api_key=server_data.get("api_key"),
                 enabled=server_data.get("enabled", True)
             )
-            db.add(mcp_server)
-            migrated_count += 1
+            new_servers.append(mcp_server)
         
+        db.add_all(new_servers)
         db.commit()
-        print(f"✓ Migrated {migrated_count} MCP server(s)")
+        print(f"✓ Migrated {len(new_servers)} MCP server(s)")
     except Exception as e:
         print(f"⚠️  Failed to migrate MCP servers: {e}")
         db.rollback()
@@ -2,9 +2,20 @@
 Replace print statements with logger calls
 This module provides a helper to migrate from print to logger
 """
+import re
 import sys
 from src.utils.logger import app_logger
 
+# Level tags, one named group per level; matched case-insensitively
+_LEVEL_RE = re.compile(
+    r'(?P<error>❌|ERROR|FAILED)'
+    r'|(?P<warning>⚠️|WARN)'
+    r'|(?P<info>✓|✅|SUCCESS|📝|📦|🔧)',
+    re.IGNORECASE
+)
+# When a message has several tags, the most severe one wins
+_LEVEL_PRIORITY = ("error", "warning", "info")
+
 
 class PrintToLogger:
     """Redirect print statements to logger"""
@@ -15,18 +26,17 @@ class PrintToLogger:
     
     def write(self, message: str):
         """Write to logger instead of stdout"""
-        if message.strip():
-            # Determine log level based on message content
-            if "❌" in message or "ERROR" in message.upper() or "FAILED" in message.upper():
-                app_logger.error(message.strip())
-            elif "⚠️" in message or "WARNING" in message.upper() or "WARN" in message.upper():
-                app_logger.warning(message.strip())
-            elif "✓" in message or "SUCCESS" in message.upper() or "✅" in message:
-                app_logger.info(message.strip())
-            elif "📝" in message or "📦" in message or "🔧" in message:
-                app_logger.info(message.strip())
-            else:
-                app_logger.debug(message.strip())
+        message = message.strip()
+        if not message:
+            return
+        
+        # Determine log level based on message content, in one scan
+        tags = {match.lastgroup for match in _LEVEL_RE.finditer(message)}
+        for level in _LEVEL_PRIORITY:
+            if level in tags:
+                getattr(app_logger, level)(message)
+                return
+        app_logger.debug(message)
     
     def flush(self):
         """Flush (no-op for logger)"""
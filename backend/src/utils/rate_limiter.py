@@ -1,18 +1,45 @@
 """
 Rate limiting utilities
 """
-from collections import defaultdict
-from datetime import datetime, timedelta
 from typing import Dict, Tuple
+import threading
 import time
 
+# Keys are spread over this many independently locked shards (power of two)
+SHARD_COUNT = 64
+
+# Drop a shard's keys whose bucket has refilled completely every this many checks on it
+SWEEP_INTERVAL = 1000
+
+
+class _Shard:
+    __slots__ = ("lock", "buckets", "checks")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> (tokens, last refill on the monotonic clock)
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+        self.checks = 0
+
 
 class RateLimiter:
-    """Simple in-memory rate limiter"""
-    
+    """
+    Simple in-memory rate limiter
+
+    Token bucket per key: a bucket holds up to max_requests tokens and refills
+    at max_requests per window_seconds, so each key costs two floats no matter
+    how much traffic it sees. Keys idle long enough to be full again are swept
+    periodically. Keys are sharded, each shard with its own lock, so threads
+    checking different keys rarely wait on each other.
+    """
+
     def __init__(self):
-        self.requests: Dict[str, list] = defaultdict(list)
-    
+        self._shards = [_Shard() for _ in range(SHARD_COUNT)]
+        self._max_window = 0
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) & (SHARD_COUNT - 1)]
+
     def is_allowed(
         self,
         key: str,
@@ -21,39 +48,53 @@ class RateLimiter:
     ) -> Tuple[bool, int]:
         """
         Check if request is allowed
-        
+
         Returns:
             Tuple of (is_allowed, remaining_requests)
         """
-        now = time.time()
-        window_start = now - window_seconds
-        
-        # Clean old requests
-        self.requests[key] = [
-            req_time for req_time in self.requests[key]
-            if req_time > window_start
-        ]
-        
-        # Check limit
-        if len(self.requests[key]) >= max_requests:
-            return False, 0
-        
-        # Add current request
-        self.requests[key].append(now)
-        
-        remaining = max_requests - len(self.requests[key])
-        return True, remaining
-    
+        now = time.monotonic()
+        rate = max_requests / window_seconds
+        if window_seconds > self._max_window:
+            self._max_window = window_seconds
+
+        shard = self._shard(key)
+        with shard.lock:
+            shard.checks += 1
+            if shard.checks % SWEEP_INTERVAL == 0:
+                self._sweep(shard, now)
+
+            tokens, last = shard.buckets.get(key, (max_requests, now))
+            tokens = min(max_requests, tokens + (now - last) * rate)
+
+            # Check limit
+            if tokens < 1:
+                shard.buckets[key] = (tokens, now)
+                return False, 0
+
+            # Take a token for the current request
+            tokens -= 1
+            shard.buckets[key] = (tokens, now)
+            return True, int(tokens)
+
+    def _sweep(self, shard: _Shard, now: float):
+        """Remove buckets idle for longer than any window in use (they are full again)"""
+        cutoff = now - self._max_window
+        stale = [key for key, (_, last) in shard.buckets.items() if last <= cutoff]
+        for key in stale:
+            del shard.buckets[key]
+
     def reset(self, key: str):
         """Reset rate limit for a key"""
-        if key in self.requests:
-            del self.requests[key]
-    
+        shard = self._shard(key)
+        with shard.lock:
+            shard.buckets.pop(key, None)
+
     def clear(self):
         """Clear all rate limits"""
-        self.requests.clear()
+        for shard in self._shards:
+            with shard.lock:
+                shard.buckets.clear()
 
 
 # Global rate limiter instance
 rate_limiter = RateLimiter()
-
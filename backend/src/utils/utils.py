@@ -1,11 +1,131 @@
 """
 Utility functions for API
 """
+import logging
+import weakref
 from langchain_core.tools import BaseTool, StructuredTool
 from pydantic import create_model
 from typing import Dict, Optional, Tuple
 from langchain_core.messages import BaseMessage
 
+logger = logging.getLogger(__name__)
+
+
+# args_schema model class -> (sanitized schema dict, sanitized model), or None when
+# it has no anyOf; tools share schema classes, so repeat calls skip the rebuild
+_gemini_args_cache: "weakref.WeakKeyDictionary[type, Optional[Tuple[dict, type]]]" = weakref.WeakKeyDictionary()
+
+
+def _sanitize_any_of(schema_dict: dict) -> Optional[dict]:
+    """
+    Copy of schema_dict with each anyOf/any_of reached through properties/items
+    replaced by a plain string schema, or None if the schema has no anyOf anywhere.
+    One iterative pass, so deeply nested schemas can't hit the recursion limit.
+    """
+    def shallow_copy(obj):
+        if isinstance(obj, dict):
+            return obj.copy()
+        if isinstance(obj, list):
+            return list(obj)
+        return obj
+    
+    root = shallow_copy(schema_dict)
+    found = False
+    # (node, rewrite): nodes reached through properties/items are copies owned by
+    # the result and are rewritten in place; anything else (e.g. $defs) is only
+    # checked for anyOf
+    stack = [(root, True)]
+    while stack:
+        obj, rewrite = stack.pop()
+        if isinstance(obj, list):
+            for i, item in enumerate(obj):
+                if rewrite:
+                    obj[i] = item = shallow_copy(item)
+                stack.append((item, rewrite))
+            continue
+        if not isinstance(obj, dict):
+            continue
+        
+        if 'anyOf' in obj or 'any_of' in obj:
+            found = True
+            if rewrite:
+                # Prefer string for flexibility (can accept numbers as strings)
+                new_schema = {'type': 'string'}
+                # Copy description if present
+                if 'description' in obj:
+                    new_schema['description'] = obj['description']
+                obj.clear()
+                obj.update(new_schema)
+                continue
+        
+        if rewrite:
+            if 'properties' in obj:
+                properties = obj['properties'] = dict(obj['properties'])
+                for k, v in properties.items():
+                    properties[k] = v = shallow_copy(v)
+                    stack.append((v, True))
+            if 'items' in obj:
+                obj['items'] = items = shallow_copy(obj['items'])
+                stack.append((items, True))
+        if not found:
+            stack.extend(
+                (v, False) for k, v in obj.items()
+                if not (rewrite and k in ('properties', 'items'))
+            )
+    
+    return root if found else None
+
+
+def _build_gemini_args(args_schema, tool_name: str) -> Optional[Tuple[dict, type]]:
+    """Sanitized schema dict and args model for args_schema, or None if it needs no changes"""
+    # Get the schema
+    if hasattr(args_schema, 'schema'):
+        schema_dict = args_schema.schema()
+    else:
+        schema_dict = args_schema
+    
+    sanitized_schema_dict = _sanitize_any_of(schema_dict)
+    if sanitized_schema_dict is None:
+        return None
+    
+    logger.info("Sanitizing tool '%s' schema for Gemini compatibility", tool_name)
+    
+    # Create a new Pydantic model with sanitized schema
+    # Extract properties from sanitized schema
+    properties = sanitized_schema_dict.get('properties', {})
+    
+    # Create field definitions for the new model
+    field_definitions = {}
+    for field_name, field_schema in properties.items():
+        field_type = str  # Default to string since we sanitized to string
+        if field_schema.get('type') == 'number':
+            field_type = float
+        elif field_schema.get('type') == 'integer':
+            field_type = int
+        elif field_schema.get('type') == 'boolean':
+            field_type = bool
+        
+        # Get default value if present
+        default = field_schema.get('default', ...)
+        if default is ...:
+            field_definitions[field_name] = (field_type, ...)
+        else:
+            field_definitions[field_name] = (field_type, default)
+    
+    # Create new model class - this will have NO any_of from the start
+    model_name = f"Sanitized{args_schema.__name__ if hasattr(args_schema, '__name__') else 'Args'}"
+    SanitizedArgsModel = create_model(
+        model_name,
+        **field_definitions
+    )
+    
+    # Fields are plain scalars, so the model can't produce any_of; only
+    # double-check that in development (skipped under python -O)
+    if __debug__ and _sanitize_any_of(SanitizedArgsModel.model_json_schema()) is not None:
+        raise ValueError(f"Sanitized model {model_name} still contains any_of")
+    
+    return sanitized_schema_dict, SanitizedArgsModel
+
 
 def sanitize_tools_for_gemini(tools: list, llm_type: str) -> list:
     """
@@ -25,114 +145,20 @@ def sanitize_tools_for_gemini(tools: list, llm_type: str) -> list:
         try:
             # Check if tool has args_schema that might contain any_of
             if hasattr(tool, 'args_schema') and tool.args_schema:
-                # Get the schema
-                if hasattr(tool.args_schema, 'schema'):
-                    schema_dict = tool.args_schema.schema()
-                else:
-                    schema_dict = tool.args_schema
-                
-                # Check if schema has any_of that needs sanitization
-                needs_sanitization = False
-                
-                def check_for_any_of(obj):
-                    nonlocal needs_sanitization
-                    if isinstance(obj, dict):
-                        if 'anyOf' in obj or 'any_of' in obj:
-                            needs_sanitization = True
-                        for v in obj.values():
-                            check_for_any_of(v)
-                    elif isinstance(obj, list):
-                        for item in obj:
-                            check_for_any_of(item)
+                args_schema = tool.args_schema
+                tool_name = getattr(tool, 'name', 'unknown')
                 
-                check_for_any_of(schema_dict)
+                # Model classes are cached; raw dict schemas are rebuilt each time
+                if isinstance(args_schema, type):
+                    try:
+                        sanitized = _gemini_args_cache[args_schema]
+                    except KeyError:
+                        sanitized = _gemini_args_cache[args_schema] = _build_gemini_args(args_schema, tool_name)
+                else:
+                    sanitized = _build_gemini_args(args_schema, tool_name)
                 
-                if needs_sanitization:
-                    print(f"🔧 Sanitizing tool '{getattr(tool, 'name', 'unknown')}' schema for Gemini compatibility...")
-                    
-                    def sanitize_schema_obj(obj):
-                        """Recursively sanitize schema objects to remove any_of"""
-                        if isinstance(obj, dict):
-                            # Create a deep copy to avoid modifying the original
-                            obj = obj.copy()
-                            
-                            # Replace any_of with simpler type
-                            if 'anyOf' in obj or 'any_of' in obj:
-                                any_of = obj.get('anyOf') or obj.get('any_of', [])
-                                type_set = set()
-                                for option in any_of:
-                                    if isinstance(option, dict):
-                                        opt_type = option.get('type')
-                                        if opt_type:
-                                            type_set.add(opt_type)
-                                
-                                # Prefer string for flexibility (can accept numbers as strings)
-                                new_schema = {'type': 'string'}
-                                # Copy description if present
-                                if 'description' in obj:
-                                    new_schema['description'] = obj['description']
-                                return new_schema
-                            
-                            # Recursively sanitize nested objects
-                            if 'properties' in obj:
-                                obj['properties'] = {
-                                    k: sanitize_schema_obj(v) for k, v in obj['properties'].items()
-                                }
-                            if 'items' in obj:
-                                obj['items'] = sanitize_schema_obj(obj['items'])
-                            
-                            return obj
-                        elif isinstance(obj, list):
-                            return [sanitize_schema_obj(item) for item in obj]
-                        return obj
-                    
-                    # Get sanitized schema
-                    sanitized_schema_dict = sanitize_schema_obj(schema_dict)
-                    
-                    # Get the original model for reference
-                    original_model = tool.args_schema
-                    
-                    # Create a new Pydantic model with sanitized schema
-                    # Extract properties from sanitized schema
-                    properties = sanitized_schema_dict.get('properties', {})
-                    
-                    # Create field definitions for the new model
-                    field_definitions = {}
-                    for field_name, field_schema in properties.items():
-                        field_type = str  # Default to string since we sanitized to string
-                        if field_schema.get('type') == 'number':
-                            field_type = float
-                        elif field_schema.get('type') == 'integer':
-                            field_type = int
-                        elif field_schema.get('type') == 'boolean':
-                            field_type = bool
-                        
-                        # Get default value if present
-                        default = field_schema.get('default', ...)
-                        if default is ...:
-                            field_definitions[field_name] = (field_type, ...)
-                        else:
-                            field_definitions[field_name] = (field_type, default)
-                    
-                    # Create new model class - this will have NO any_of from the start
-                    model_name = f"Sanitized{original_model.__name__ if hasattr(original_model, '__name__') else 'Args'}"
-                    SanitizedArgsModel = create_model(
-                        model_name,
-                        **field_definitions
-                    )
-                    
-                    # Verify the new model's schema doesn't have any_of
-                    new_schema = SanitizedArgsModel.model_json_schema()
-                    def verify_no_any_of(obj):
-                        if isinstance(obj, dict):
-                            if 'anyOf' in obj or 'any_of' in obj:
-                                raise ValueError(f"Sanitized model still contains any_of: {obj}")
-                            for v in obj.values():
-                                verify_no_any_of(v)
-                        elif isinstance(obj, list):
-                            for item in obj:
-                                verify_no_any_of(item)
-                    verify_no_any_of(new_schema)
+                if sanitized is not None:
+                    sanitized_schema_dict, SanitizedArgsModel = sanitized
                     
                     # Replace the tool's args_schema with the new sanitized model
                     # This ensures LangChain will see the sanitized schema
@@ -152,14 +178,12 @@ def sanitize_tools_for_gemini(tools: list, llm_type: str) -> list:
                     if hasattr(tool, '_input_schema'):
                         tool._input_schema = sanitized_schema_dict
                     
-                    print(f"✓ Tool '{getattr(tool, 'name', 'unknown')}' schema sanitized")
+                    logger.debug("Tool '%s' schema sanitized", tool_name)
             
             sanitized_tools.append(tool)
         except Exception as e:
             # If sanitization fails, use original tool
-            import traceback
-            print(f"⚠️  Warning: Failed to sanitize tool {getattr(tool, 'name', 'unknown')}: {e}")
-            print(f"   Traceback: {traceback.format_exc()[:200]}")
+            logger.warning("Failed to sanitize tool %s: %s", getattr(tool, 'name', 'unknown'), e, exc_info=True)
             sanitized_tools.append(tool)
     
     return sanitized_tools
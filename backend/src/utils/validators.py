@@ -2,32 +2,51 @@
 Additional validation utilities
 """
 import re
+from functools import lru_cache
 from typing import Optional
-from urllib.parse import urlparse
+
+# Drops NUL and the other C0 control characters except tab, LF and CR
+_SANITIZE_TABLE = str.maketrans(dict.fromkeys(
+    (code for code in range(0x20) if chr(code) not in '\t\n\r'), None
+))
+
+_EMAIL_RE = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+# scheme://host with a non-empty host
+_URL_RE = re.compile(r'[a-zA-Z][a-zA-Z0-9+.\-]*://[^\s/?#]+')
+# Alphanumeric, hyphens, underscores, and dots
+_SESSION_ID_RE = re.compile(r'[a-zA-Z0-9._-]+')
 
 
 def validate_email(email: str) -> bool:
     """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email))
+    return _EMAIL_RE.fullmatch(email) is not None
 
 
 def validate_url(url: str) -> bool:
-    """Validate URL format"""
-    try:
-        result = urlparse(url)
-        return all([result.scheme, result.netloc])
-    except Exception:
-        return False
+    """Validate URL format (has a scheme and a host)"""
+    return isinstance(url, str) and _URL_RE.match(url) is not None
+
+
+@lru_cache(maxsize=1024)
+def normalize_mcp_url(url: str, connection_type: str = "http") -> str:
+    """
+    Endpoint URL for an http/sse MCP server: ends with /sse for "sse" and
+    with /mcp otherwise (a trailing /sse is swapped for /mcp and vice versa)
+    """
+    url = url.rstrip('/')
+    if connection_type == "sse":
+        if url.endswith('/mcp'):
+            return url[:-4] + '/sse'
+        return url if url.endswith('/sse') else url + '/sse'
+    if url.endswith('/sse'):
+        url = url[:-4]
+    return url if url.endswith('/mcp') else url.rstrip('/') + '/mcp'
 
 
 def sanitize_input(text: str, max_length: Optional[int] = None) -> str:
     """Sanitize user input"""
-    # Remove null bytes
-    text = text.replace('\x00', '')
-    
-    # Trim whitespace
-    text = text.strip()
+    # Remove null bytes and other control characters, then trim whitespace
+    text = text.translate(_SANITIZE_TABLE).strip()
     
     # Limit length
     if max_length:
@@ -38,7 +57,6 @@ def sanitize_input(text: str, max_length: Optional[int] = None) -> str:
 
 def validate_session_id(session_id: str) -> bool:
     """Validate session ID format"""
-    # Allow alphanumeric, hyphens, underscores, and dots
-    pattern = r'^[a-zA-Z0-9._-]+$'
-    return bool(re.match(pattern, session_id)) and len(session_id) <= 255
+    # Length first, so oversized input never reaches the regex
+    return len(session_id) <= 255 and _SESSION_ID_RE.fullmatch(session_id) is not None
 